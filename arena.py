@@ -0,0 +1,398 @@
+import dataclasses
+import gc
+from array import array
+
+import parser
+from common import UnaryOperator, BinaryOperator
+
+# An arena stores a whole AST in three parallel arrays instead of one object per node.
+#
+# Nodes are laid out in post-order: every subtree occupies a contiguous range of indexes
+# ending at its root, and starts[i] is the first index of the subtree rooted at i. The
+# children of a node are therefore found by stepping back from the node through these
+# ranges, and no child indexes need to be stored. kinds holds the node kind in its low bits
+# and a mask of absent (None) children in the high bits. values holds the node's one scalar
+# field: a symbol id, a constant pool id or an operator code, or -1 for none.
+#
+# Nodes are read through views, which subclass the parser node classes and read their
+# fields from the arrays, so passes written against parser classes work on an arena
+# unchanged. Names must be symbol ids, see symbols.SymbolTable.
+
+SYMBOL, CONSTANT, UNARY_OPERATOR, BINARY_OPERATOR = range(4)
+
+value_fields = {
+    parser.Function: ('name', SYMBOL),
+    parser.VarDecl: ('name', SYMBOL),
+    parser.Goto: ('label', SYMBOL),
+    parser.Label: ('label', SYMBOL),
+    parser.Break: ('label', SYMBOL),
+    parser.Continue: ('label', SYMBOL),
+    parser.While: ('label', SYMBOL),
+    parser.DoWhile: ('label', SYMBOL),
+    parser.For: ('label', SYMBOL),
+    parser.Switch: ('label', SYMBOL),
+    parser.Constant: ('value', CONSTANT),
+    parser.Var: ('identifier', SYMBOL),
+    parser.Unary: ('operator', UNARY_OPERATOR),
+    parser.Binary: ('operator', BINARY_OPERATOR),
+}
+
+list_fields = {
+    parser.Program: 'functions',
+    parser.Block: 'block_items',
+}
+
+operators = {UNARY_OPERATOR: list(UnaryOperator), BINARY_OPERATOR: list(BinaryOperator)}
+operator_codes = {operator: code for members in operators.values() for code, operator in enumerate(members)}
+
+# Only the first ABSENT_BITS children of a node may be None; For's body, its fourth child,
+# never is.
+KIND_BITS = 5
+ABSENT_BITS = 3
+KIND_MASK = (1 << KIND_BITS) - 1
+# The kind of the nodes of a subtree that was replaced by a constant, see child_property.
+DEAD = KIND_MASK
+
+
+class Layout:
+    def __init__(self, cls):
+        self.cls = cls
+        self.fields = [field.name for field in dataclasses.fields(cls)] if dataclasses.is_dataclass(cls) else []
+        self.value, self.value_type = value_fields.get(cls, (None, None))
+        self.list = list_fields.get(cls)
+        self.children = [name for name in self.fields if name not in (self.value, self.list)]
+        # Positions of the fields in a constructor call, for Arena.add.
+        self.value_position = self.fields.index(self.value) if self.value is not None else None
+        self.list_position = self.fields.index(self.list) if self.list is not None else None
+        self.child_positions = [self.fields.index(name) for name in self.children]
+
+
+layouts = [Layout(cls) for cls in parser.node_classes]
+kinds_by_class = {cls: kind for kind, cls in enumerate(parser.node_classes)}
+kinds_by_class[parser.LazyFunction] = kinds_by_class[parser.Function]
+CONSTANT_KIND = kinds_by_class[parser.Constant]
+
+
+class Arena:
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = array('i')
+        self.starts = array('I')
+        self.constants = []
+        self.constant_ids = {}
+        self.constructors = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, *args):
+        constructor = self.constructors.get(kind)
+        if constructor is None:
+            constructor = self.constructors[kind] = self.constructor(kind)
+        return constructor(*args)
+
+    def constructor(self, kind):
+        # Returns a function taking the arguments of the node class's constructor, with the
+        # layout lookups done once rather than per node.
+        layout = layouts[kind]
+        value_position, value_type = layout.value_position, layout.value_type
+        list_position = layout.list_position
+        child_positions = list(enumerate(layout.child_positions))
+        kinds, values, starts = self.kinds, self.values, self.starts
+        encode, place, view = self.encode, self.place, self.view
+
+        def add(*args):
+            count = len(args)
+            value = -1
+            if value_position is not None and value_position < count:
+                value = encode(value_type, args[value_position])
+            children = list(args[list_position]) if list_position is not None else []
+            absent = 0
+            for bit, position in child_positions:
+                child = args[position] if position < count else None
+                if child is None:
+                    if bit >= ABSENT_BITS:
+                        raise ValueError(f'{layout.cls.__name__}.{layout.children[bit]} cannot be None in an arena')
+                    absent |= 1 << bit
+                else:
+                    children.append(child)
+            start = place(children)
+            kinds.append(kind | absent << KIND_BITS)
+            values.append(value)
+            starts.append(start)
+            return view(len(kinds) - 1)
+
+        return add
+
+    def place(self, children):
+        # Children are normally the subtrees built just before their parent, in order.
+        end = len(self.kinds)
+        for child in reversed(children):
+            if child.arena is not self or child.index != end - 1:
+                return self.relocate(children)
+            end = self.starts[child.index]
+        return end
+
+    def relocate(self, children):
+        # A compound assignment expands to a Binary whose left operand, a Var of its own, is
+        # built after the right one, so the children are out of order. If the target is not
+        # a Var, an invalid lvalue that validation rejects later, the Binary shares it with
+        # the Assignment and the children overlap. Either way the tail holding them is
+        # rewritten with a copy of each, in order.
+        if any(child.arena is not self for child in children):
+            raise ValueError('Child node belongs to another arena')
+        low = min(self.starts[child.index] for child in children)
+        kinds = self.kinds[low:]
+        values = self.values[low:]
+        starts = self.starts[low:]
+        del self.kinds[low:], self.values[low:], self.starts[low:]
+        for child in children:
+            first = starts[child.index - low] - low
+            last = child.index - low + 1
+            offset = len(self.kinds) - low - first
+            self.kinds.extend(kinds[first:last])
+            self.values.extend(values[first:last])
+            self.starts.extend(start + offset for start in starts[first:last])
+        return low
+
+    def encode(self, value_type, value):
+        if value is None:
+            return -1
+        if value_type == SYMBOL:
+            return value
+        if value_type == CONSTANT:
+            constant = self.constant_ids.get(value)
+            if constant is None:
+                constant = self.constant_ids[value] = len(self.constants)
+                self.constants.append(value)
+            return constant
+        return operator_codes[value]
+
+    def decode(self, value_type, value):
+        if value_type == SYMBOL:
+            return value if value >= 0 else None
+        if value_type == CONSTANT:
+            return self.constants[value]
+        return operators[value_type][value]
+
+    def children(self, index):
+        starts = self.starts
+        start = starts[index]
+        children = []
+        child = index - 1
+        while child >= start:
+            children.append(child)
+            child = starts[child] - 1
+        children.reverse()
+        return children
+
+    def view(self, index):
+        cls = view_classes[self.kinds[index] & KIND_MASK]
+        view = cls.__new__(cls)
+        view.arena = self
+        view.index = index
+        return view
+
+    @property
+    def root(self):
+        return self.view(len(self.kinds) - 1)
+
+
+def value_property(value_type):
+    if value_type == SYMBOL:
+        def get(self):
+            value = self.arena.values[self.index]
+            return value if value >= 0 else None
+    else:
+        def get(self):
+            return self.arena.decode(value_type, self.arena.values[self.index])
+
+    def set(self, value):
+        self.arena.values[self.index] = self.arena.encode(value_type, value)
+
+    return property(get, set)
+
+
+def child_property(bit, count):
+    # The child is found by stepping back from the last child over the later ones that are
+    # present; steps[absent] counts them for each mask of absent children.
+    steps = [sum(1 for later in range(bit + 1, count) if not absent >> later & 1) for absent in range(1 << count)]
+
+    def get(self):
+        arena = self.arena
+        index = self.index
+        absent = arena.kinds[index] >> KIND_BITS
+        if absent >> bit & 1:
+            return None
+        starts = arena.starts
+        child = index - 1
+        for _ in range(steps[absent]):
+            child = starts[child] - 1
+        return arena.view(child)
+
+    def set(self, node):
+        # Nodes cannot be moved in the arrays, so a child can only be replaced by a
+        # Constant, written over the root of the child's subtree. starts is unchanged, so
+        # the parent still steps over the whole subtree, and the rest of it is marked dead.
+        child = get(self)
+        arena = self.arena
+        if child is not None and isinstance(node, View) and node.arena is arena and node.index == child.index:
+            return
+        if child is None or not isinstance(node, parser.Constant):
+            raise TypeError('Only a present child can be replaced, and only by a Constant')
+        kinds = arena.kinds
+        for index in range(arena.starts[child.index], child.index):
+            kinds[index] = DEAD
+        kinds[child.index] = CONSTANT_KIND
+        arena.values[child.index] = arena.encode(CONSTANT, node.value)
+
+    return property(get, set)
+
+
+def list_property():
+    def get(self):
+        arena = self.arena
+        return [arena.view(child) for child in arena.children(self.index)]
+
+    return property(get)
+
+
+class View:
+    __slots__ = ()
+
+
+def make_view_class(layout):
+    namespace = {'__slots__': ('arena', 'index'), '__module__': layout.cls.__module__,
+                 '__qualname__': layout.cls.__qualname__}
+    if layout.value is not None:
+        namespace[layout.value] = value_property(layout.value_type)
+    if layout.list is not None:
+        namespace[layout.list] = list_property()
+    for bit, name in enumerate(layout.children):
+        namespace[name] = child_property(bit, len(layout.children))
+    return type(layout.cls.__name__, (layout.cls, View), namespace)
+
+
+view_classes = [make_view_class(layout) for layout in layouts]
+
+
+class ArenaBuilder:
+    # Stands in for parser.object_nodes: the same constructors, building into an arena.
+    def __init__(self, arena):
+        self.arena = arena
+        for kind, cls in enumerate(parser.node_classes):
+            setattr(self, cls.__name__, arena.constructor(kind))
+
+
+def parse(tokens, arena=None):
+    arena = Arena() if arena is None else arena
+    return parser.parse(tokens, ArenaBuilder(arena))
+
+
+def from_program(program, arena=None):
+    # Writes the arrays directly: visiting children before their parent is post-order.
+    arena = Arena() if arena is None else arena
+    kinds, values, starts = arena.kinds, arena.values, arena.starts
+    stack = [(program, None)]
+    while stack:
+        node, start = stack.pop()
+        kind = kinds_by_class[type(node)]
+        layout = layouts[kind]
+        if start is None:
+            stack.append((node, len(kinds)))
+            stack.extend((child, None) for child in reversed(child_nodes(node, layout)))
+            continue
+        absent = 0
+        for bit, name in enumerate(layout.children):
+            if getattr(node, name) is None:
+                absent |= 1 << bit
+        value = -1 if layout.value is None else arena.encode(layout.value_type, getattr(node, layout.value))
+        kinds.append(kind | absent << KIND_BITS)
+        values.append(value)
+        starts.append(start)
+    return arena.root
+
+
+def child_nodes(node, layout):
+    children = list(getattr(node, layout.list)) if layout.list is not None else []
+    for name in layout.children:
+        child = getattr(node, name)
+        if child is not None:
+            children.append(child)
+    return children
+
+
+def node_builder(arena, kind):
+    # Returns a function building the node of kind, with its absent-children mask, from its
+    # value and its present children in order. The children are the field values but for
+    # the scalar value and the absent children, which are inserted at their positions.
+    layout = layouts[kind & KIND_MASK]
+    absent = kind >> KIND_BITS
+    cls = layout.cls
+    if layout.list is not None:
+        return lambda value, children: cls(children)
+    nones = [layout.fields.index(name) for bit, name in enumerate(layout.children) if absent >> bit & 1]
+    position = layout.value_position
+    if position is None:
+        if not nones:
+            return lambda value, children: cls(*children)
+
+        def build(value, children):
+            for index in nones:
+                children.insert(index, None)
+            return cls(*children)
+        return build
+    value_type = layout.value_type
+    if value_type == SYMBOL:
+        def decode(value):
+            return value if value >= 0 else None
+    elif value_type == CONSTANT:
+        decode = arena.constants.__getitem__
+    else:
+        decode = operators[value_type].__getitem__
+
+    def build(value, children):
+        for index in nones:
+            children.insert(index, None)
+        children.insert(position, decode(value))
+        return cls(*children)
+    return build
+
+
+def to_program(view):
+    # Builds node objects for the subtree of view in one pass over the arrays. Children
+    # precede their parent, so the subtrees built so far whose first index is not before a
+    # node's start are its children, in order. Passes that read each node several times,
+    # like tacky, are faster on the objects than on views, even counting the rebuild.
+    arena = view.arena
+    kinds, values, starts = arena.kinds, arena.values, arena.starts
+    builders = {}
+    built = []
+    firsts = []
+    # The nodes form a tree, so the cyclic garbage collector has nothing to find among them,
+    # but would scan the growing tree over and over while it is built, and then again as it
+    # moves through each generation. It is paused instead, and one collection at the end
+    # moves the whole tree to the oldest generation at once.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for index in range(starts[view.index], view.index + 1):
+            kind = kinds[index]
+            if kind == DEAD:
+                continue
+            start = starts[index]
+            first = len(firsts)
+            while first and firsts[first - 1] >= start:
+                first -= 1
+            children = built[first:]
+            del built[first:], firsts[first:]
+            builder = builders.get(kind)
+            if builder is None:
+                builder = builders[kind] = node_builder(arena, kind)
+            built.append(builder(values[index], children))
+            firsts.append(start)
+    finally:
+        if collecting:
+            gc.enable()
+            gc.collect()
+    return built[-1]
@@ -0,0 +1,277 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+
+import arena
+from symbols import SymbolTable
+from utils import CompilationContext
+
+# An on-disk cache of validated ASTs. Entries are keyed by a hash of the source, the
+# compiler version and the options that change the AST, and hold everything the rest of the
+# pipeline needs: the AST as arena arrays, the symbol table and the temporary and label
+# counters. Headers the source included are recorded with a hash of their contents and an
+# entry is only used if they are unchanged.
+#
+# saved_seconds counts the front end time a hit saves, as recorded in the entry by the miss
+# that stored it, minus the time to load the entry and minus any extra time lowering takes
+# on the hit: the miss records how long it took to lower the parsed program, and the hit
+# lowers a program rebuilt from the entry.
+
+MAGIC = b'CAST\x02'
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+# The modules whose behaviour determines the validated AST.
+FRONT_END_MODULES = ['arena', 'ast_cache', 'folding', 'lexer', 'parser', 'preprocessor', 'symbols', 'utils', 'validation',
+                     'visitor']
+
+INTERNED, FORMATTED, GENERATED_NUMBER, GENERATED_NAME = range(4)
+
+statistics = {'hits': 0, 'misses': 0, 'stale': 0, 'load_seconds': 0.0, 'store_seconds': 0.0,
+              'saved_seconds': 0.0, 'bytes_loaded': 0}
+
+version = None
+
+
+def compiler_version():
+    global version
+    if version is None:
+        digest = hashlib.sha256(MAGIC)
+        for name in FRONT_END_MODULES:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{name}.py'), 'rb') as file:
+                digest.update(file.read())
+        version = digest.digest()
+    return version
+
+
+def file_digest(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).digest()
+
+
+class ASTCache:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def key(self, code, include_dirs=(), macros=None, function=None, source_path=None):
+        # Quoted includes resolve relative to the source file and -I directories relative to
+        # the working directory, so both are hashed as absolute paths: the same text in
+        # another directory can include different headers.
+        digest = hashlib.sha256(compiler_version())
+        directory = os.path.dirname(os.path.abspath(source_path)) if source_path is not None else None
+        include_dirs = [os.path.abspath(include_dir) for include_dir in include_dirs]
+        digest.update(repr((directory, include_dirs, sorted((macros or {}).items()), function)).encode())
+        digest.update(code.encode() if isinstance(code, str) else code)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.ast')
+
+    def load(self, key):
+        # Returns the program, compilation context and recorded lowering time of a cached
+        # entry, or None on a miss.
+        start = time.perf_counter()
+        try:
+            with open(self.path(key), 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            statistics['misses'] += 1
+            return None
+        try:
+            entry = read_entry(data)
+        except (struct.error, ValueError, UnicodeDecodeError, StopIteration, IndexError):
+            # A truncated or corrupt entry, say from a full disk, is a miss like a stale one.
+            entry = None
+        if entry is None:
+            statistics['misses'] += 1
+            statistics['stale'] += 1
+            return None
+        front_end_seconds, lowering_seconds, program, context = entry
+        elapsed = time.perf_counter() - start
+        statistics['hits'] += 1
+        statistics['load_seconds'] += elapsed
+        statistics['saved_seconds'] += front_end_seconds - elapsed
+        statistics['bytes_loaded'] += len(data)
+        return program, context, lowering_seconds
+
+    def record_lowering(self, key, seconds):
+        # Called after a miss lowers the program it stored. The time is written over the
+        # header field in place: the entry is complete without it, and was stored before
+        # lowering added names to the symbol table.
+        try:
+            with open(self.path(key), 'r+b') as file:
+                file.seek(len(MAGIC) + struct.calcsize('<d'))
+                file.write(struct.pack('<d', seconds))
+        except FileNotFoundError:
+            pass
+
+    def count_lowering(self, recorded_seconds, seconds):
+        # Called after a hit lowers its program: lowering time beyond what the miss took is
+        # not saved. An entry stored by a run that stopped before lowering records 0, which
+        # counts all of the hit's lowering against it.
+        statistics['saved_seconds'] -= seconds - recorded_seconds
+
+    def store(self, key, program, context, dependencies=(), front_end_seconds=0.0):
+        start = time.perf_counter()
+        if not isinstance(program, arena.View):
+            program = arena.from_program(program)
+        ast = program.arena
+        writer = Writer()
+        writer.write(MAGIC)
+        # The lowering time is filled in by record_lowering.
+        writer.pack('<ddQQ', front_end_seconds, 0.0, context.tmp_count, context.label_count)
+        # Dependencies are recorded as resolved absolute paths, so that checking them later
+        # does not depend on the working directory.
+        paths = sorted({os.path.realpath(path) for path in dependencies})
+        writer.strings(paths)
+        writer.write(b''.join(file_digest(path) for path in paths))
+        write_symbols(writer, context.symbols)
+        writer.strings(ast.constants)
+        writer.array(ast.kinds)
+        writer.array(ast.values)
+        writer.array(ast.starts)
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name and renamed so concurrent builds never read a
+        # partial entry.
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(b''.join(writer.chunks))
+        os.replace(temporary, self.path(key))
+        statistics['store_seconds'] += time.perf_counter() - start
+
+
+def read_entry(data):
+    # Returns the front end and lowering times, program and compilation context stored in
+    # an entry, or None if a header it depends on changed. Raises on a corrupt entry.
+    reader = Reader(data)
+    if reader.take(len(MAGIC)) != MAGIC:
+        raise ValueError('Not an AST cache entry')
+    front_end_seconds, lowering_seconds, tmp_count, label_count = reader.unpack('<ddQQ')
+    paths = reader.strings()
+    digests = reader.take(DIGEST_SIZE * len(paths))
+    for index, path in enumerate(paths):
+        try:
+            current = file_digest(path)
+        except OSError:
+            current = None
+        if current != digests[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]:
+            return None
+    symbols = read_symbols(reader)
+    ast = arena.Arena()
+    ast.constants = reader.strings()
+    ast.constant_ids = {constant: index for index, constant in enumerate(ast.constants)}
+    ast.kinds = reader.array('B')
+    ast.values = reader.array('i')
+    ast.starts = reader.array('I')
+    if reader.offset != len(data):
+        raise ValueError('Trailing data in AST cache entry')
+    if not len(ast.kinds) == len(ast.values) == len(ast.starts):
+        raise ValueError('Inconsistent AST arrays')
+    return front_end_seconds, lowering_seconds, ast.root, CompilationContext(symbols, tmp_count, label_count)
+
+
+def write_symbols(writer, symbols):
+    tags = array('B')
+    strings = []
+    numbers = array('q')
+    for symbol, name in enumerate(symbols.names):
+        if isinstance(name, str):
+            tags.append(INTERNED if symbols.ids.get(name) == symbol else FORMATTED)
+            strings.append(name)
+        else:
+            prefix, suffix = name
+            strings.append(prefix)
+            if isinstance(suffix, int):
+                tags.append(GENERATED_NUMBER)
+                numbers.append(suffix)
+            else:
+                tags.append(GENERATED_NAME)
+                strings.append(suffix)
+    writer.array(tags)
+    writer.strings(strings)
+    writer.array(numbers)
+
+
+def read_symbols(reader):
+    tags = reader.array('B')
+    strings = iter(reader.strings())
+    numbers = iter(reader.array('q'))
+    symbols = SymbolTable()
+    names = symbols.names
+    ids = symbols.ids
+    for symbol, tag in enumerate(tags):
+        if tag == INTERNED:
+            name = next(strings)
+            ids[name] = symbol
+            names.append(name)
+        elif tag == FORMATTED:
+            names.append(next(strings))
+        elif tag == GENERATED_NUMBER:
+            names.append((next(strings), next(numbers)))
+        else:
+            names.append((next(strings), next(strings)))
+    return symbols
+
+
+# Arrays are stored little-endian. Strings never contain NUL, so a list of them is stored
+# as one NUL-separated block.
+
+class Writer:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def pack(self, format, *values):
+        self.chunks.append(struct.pack(format, *values))
+
+    def array(self, values):
+        if sys.byteorder != 'little':
+            values = array(values.typecode, values)
+            values.byteswap()
+        self.pack('<Q', len(values))
+        self.chunks.append(values.tobytes())
+
+    def strings(self, strings):
+        data = '\0'.join(strings).encode()
+        self.pack('<QQ', len(strings), len(data))
+        self.chunks.append(data)
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def take(self, size):
+        return bytes(self.view(size))
+
+    def view(self, size):
+        if self.offset + size > len(self.data):
+            raise ValueError('Truncated AST cache entry')
+        data = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return data
+
+    def unpack(self, format):
+        values = struct.unpack_from(format, self.data, self.offset)
+        self.offset += struct.calcsize(format)
+        return values
+
+    def array(self, typecode):
+        count, = self.unpack('<Q')
+        values = array(typecode)
+        values.frombytes(self.view(count * values.itemsize))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    def strings(self):
+        count, size = self.unpack('<QQ')
+        data = self.take(size)
+        return data.decode().split('\0') if count else []
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+import arena
+import ast_cache
+import lexer
+import parser
+import tacky
+import validation
+from utils import CompilationContext
+
+from benchmarks.common import synthetic_source, timed
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def front_end(code):
+    context = CompilationContext()
+    program = parser.parse(lexer.tokenize(code, context.symbols))
+    validation.run(program, context)
+    return program, context
+
+
+def main():
+    # A hit lowers node objects rebuilt from the entry, as compiler.py does; tacky over the
+    # arena's views is shown for comparison. saved s is the miss's front end and lowering
+    # minus the hit's load and lowering, which saved_seconds should match.
+    print(f"{'statements':>10} {'front end s':>12} {'store s':>10} {'load s':>10} {'entry KB':>10} "
+          f"{'tacky s':>10} {'tacky on views s':>17} {'tacky on hit s':>15} {'saved s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ast_cache.ASTCache(directory)
+        for statements in SIZES:
+            code = synthetic_source(1, statements)
+            key = cache.key(code)
+            front_end_time, (program, context) = timed(front_end, code)
+            store_time, _ = timed(cache.store, key, program, context, (), front_end_time)
+            tacky_time, _ = timed(tacky.Translator(context).translate, program)
+            cache.record_lowering(key, tacky_time)
+            views_time, _ = timed(tacky.Translator(context).translate, arena.from_program(program))
+            load_time, (cached, cached_context, lowering_time) = timed(cache.load, key)
+            hit_tacky_time, _ = timed(lambda: tacky.Translator(cached_context).translate(arena.to_program(cached)))
+            cache.count_lowering(lowering_time, hit_tacky_time)
+            saved = front_end_time + tacky_time - load_time - hit_tacky_time
+            size = os.path.getsize(cache.path(key)) / 1024
+            print(f"{statements:>10} {front_end_time:>12.3f} {store_time:>10.3f} {load_time:>10.4f} {size:>10.0f} "
+                  f"{tacky_time:>10.3f} {views_time:>17.3f} {hit_tacky_time:>15.3f} {saved:>10.3f}")
+    print(' '.join(f'{name}={value}' for name, value in ast_cache.statistics.items()))
+
+
+if __name__ == '__main__':
+    main()
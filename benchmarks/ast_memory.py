@@ -0,0 +1,97 @@
+import argparse
+import dataclasses
+import gc
+import json
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+import arena
+import lexer
+import parser
+import validation
+from symbols import SymbolTable
+from utils import CompilationContext
+
+from benchmarks.common import synthetic_source
+
+FUNCTIONS = 1
+STATEMENTS = 100_000
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def count_nodes(program):
+    count = 0
+    stack = [program]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, parser.Node):
+            count += 1
+            if dataclasses.is_dataclass(node):
+                stack.extend(getattr(node, field.name) for field in dataclasses.fields(node))
+    return count
+
+
+def node_count(program):
+    return len(program.arena) if isinstance(program, arena.View) else count_nodes(program)
+
+
+def collections():
+    return sum(generation['collections'] for generation in gc.get_stats())
+
+
+def measure(storage, phase):
+    context = CompilationContext()
+    tokens = lexer.lex(synthetic_source(FUNCTIONS, STATEMENTS), symbols=context.symbols)
+    startup_rss = peak_rss_mb()
+    program = parsers[storage](tokens)
+    if phase == 'validate':
+        validation.run(program, context)
+    print(json.dumps({'peak_rss_mb': peak_rss_mb(), 'startup_rss_mb': startup_rss}))
+
+
+parsers = {'objects': parser.parse, 'arena': arena.parse}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure the memory used by the AST.")
+    arg_parser.add_argument('--child', nargs=2, metavar=('STORAGE', 'PHASE'), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child:
+        measure(*args.child)
+        return
+
+    # Children run first: a forked process starts with its parent's peak RSS.
+    print(f"{'storage':>8} {'phase':>10} {'peak RSS MB':>12} {'over lexing':>12}")
+    for storage in parsers:
+        for phase in ['parse', 'validate']:
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.ast_memory', '--child', storage, phase],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output)
+            print(f"{storage:>8} {phase:>10} {result['peak_rss_mb']:>12.1f} "
+                  f"{result['peak_rss_mb'] - result['startup_rss_mb']:>12.1f}")
+
+    print(f"{'storage':>8} {'nodes':>10} {'bytes/node':>12} {'gc runs':>12}")
+    for storage, parse in parsers.items():
+        tokens = lexer.lex(synthetic_source(FUNCTIONS, STATEMENTS), symbols=SymbolTable())
+        gc.collect()
+        before = collections()
+        tracemalloc.start()
+        program = parse(tokens)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        runs = collections() - before
+        nodes = node_count(program)
+        print(f"{storage:>8} {nodes:>10} {size / nodes:>12.1f} {runs:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import gc
+import sys
+
+import cfg
+import folding
+import lexer
+import parser
+import tacky
+import validation
+from source import SourceMap
+from utils import CompilationContext
+
+from benchmarks.common import timed
+from benchmarks.generator import generate
+
+# Statements of a single generated function, chosen to give about 25k to 200k TACKY
+# instructions.
+STATEMENTS = [2_650, 5_300, 10_600, 21_200]
+
+
+def tacky_function(statements):
+    code = generate(0, functions=1, statements=statements)
+    context = CompilationContext()
+    symbols = context.symbols
+    program = parser.parse(parser.TokenStream(list(lexer.tokenize(code, symbols)), SourceMap(code), symbols))
+    validation.run(program, context)
+    folding.run(program, context)
+    return tacky.Translator(context).translate(program).functions[0]
+
+
+def update_jumps(graph):
+    # Turns every conditional jump into an unconditional one, the edit a pass makes when it
+    # finds the condition is always true, and updates the edges of its block.
+    for block in list(graph.blocks()):
+        last = block.instructions[-1]
+        if type(last) in cfg.CONDITIONAL_JUMPS:
+            block.instructions[-1] = tacky.Jump(last.target)
+            graph.update_edges(block.id)
+
+
+def measure(function):
+    gc.disable()
+    try:
+        build_time, graph = timed(cfg.build, function, repeat=3)
+        rebuild_time, instructions = timed(graph.instructions, repeat=3)
+        edges = sum(len(block.successors) for block in graph.nodes.values())
+        update_time, _ = timed(update_jumps, graph)
+    finally:
+        gc.enable()
+    if instructions != function.instructions:
+        raise AssertionError('Rebuilt instructions differ from the original')
+    return len(graph.nodes) - 2, edges, build_time, rebuild_time, update_time
+
+
+def main():
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+    print(f"{'instructions':>12} {'blocks':>8} {'edges':>8} {'build s':>9} {'us/instr':>9} "
+          f"{'rebuild s':>10} {'update s':>9}")
+    for statements in STATEMENTS:
+        function = tacky_function(statements)
+        count = len(function.instructions)
+        blocks, edges, build_time, rebuild_time, update_time = measure(function)
+        print(f"{count:>12} {blocks:>8} {edges:>8} {build_time:>9.4f} {build_time / count * 1e6:>9.3f} "
+              f"{rebuild_time:>10.4f} {update_time:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import time
+
+
+def synthetic_lines(functions=1, statements=100):
+    for f in range(functions):
+        name = 'main' if f == functions - 1 else f'f{f}'
+        yield f'int {name}(void) {{\n'
+        yield '    int a = 1;\n'
+        for s in range(statements):
+            yield f'    a = a * {s % 7 + 1} + (a - {s});\n'
+        yield '    return a;\n'
+        yield '}\n'
+
+
+def synthetic_source(functions=1, statements=100):
+    return ''.join(synthetic_lines(functions, statements))
+
+
+def timed(fn, *args, repeat=1):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
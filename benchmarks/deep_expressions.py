@@ -0,0 +1,34 @@
+import sys
+
+import lexer
+import parser
+
+from benchmarks.common import timed
+
+DEPTH = 100_000
+
+shapes = {
+    'parentheses': lambda n: '(' * n + 'a' + ')' * n,
+    'prefix': lambda n: '- ' * n + 'a',
+    'assignment': lambda n: 'a = ' * n + '1',
+    'conditional': lambda n: 'a ? b : ' * n + 'c',
+    'binary': lambda n: ' + '.join(['a'] * n),
+    'nested binary': lambda n: '(a + ' * n + 'b' + ')' * n,
+}
+
+
+def parse(code):
+    return parser.parse_expression(parser.TokenCursor(lexer.lex(code)))
+
+
+def main():
+    print(f"depth {DEPTH}, recursion limit {sys.getrecursionlimit()}")
+    print(f"{'shape':>14} {'tokens':>10} {'parse s':>10}")
+    for name, shape in shapes.items():
+        code = shape(DEPTH) + ';'
+        elapsed, _ = timed(parse, code)
+        print(f"{name:>14} {len(lexer.lex(code)):>10} {elapsed:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
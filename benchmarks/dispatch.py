@@ -0,0 +1,117 @@
+import gc
+from collections import Counter
+
+import codegen
+import lexer
+import parser
+import tacky
+import validation
+from source import SourceMap
+from utils import CompilationContext
+
+from benchmarks.common import timed
+from benchmarks.generator import generate
+
+OPTIONS = {'functions': 4, 'statements': 8_000}
+
+# The order in which the isinstance chains the passes used before they were visitors
+# tried each type.
+chains = {
+    (validation.Validator, 'validate_'): [
+        parser.VarDecl, parser.Return, parser.If, parser.Expression, parser.Goto, parser.While, parser.DoWhile,
+        parser.For, parser.Label, parser.Compound, parser.Switch, parser.Default, parser.Case, parser.Break,
+        parser.Continue],
+    (validation.Validator, 'resolve_'): [
+        parser.Assignment, parser.Var, parser.Unary, parser.Binary, parser.Constant, parser.Conditional],
+    (tacky.Translator, 'translate_'): [
+        parser.Return, parser.If, parser.Goto, parser.Break, parser.Continue, parser.Switch, parser.Case,
+        parser.Default, parser.DoWhile, parser.While, parser.For, parser.Label, parser.Compound,
+        parser.Expression, parser.Null, parser.VarDecl],
+    (tacky.Translator, 'emit_'): [
+        parser.Constant, parser.Conditional, parser.Unary, parser.Binary, parser.Var, parser.Assignment],
+    (codegen.Translator, 'translate_'): [
+        tacky.Return, tacky.Unary, tacky.Binary, tacky.Jump, tacky.JumpIfZero, tacky.JumpIfNotZero, tacky.Copy,
+        tacky.Label],
+    (codegen.Translator, 'value_'): [tacky.Constant, tacky.Variable],
+    (codegen.AssemblyFunction, 'process_'): [
+        codegen.Mov, codegen.Unary, codegen.Binary, codegen.Cmp, codegen.SetCC, codegen.Idiv],
+}
+
+
+class ChainTable:
+    # Finds handlers the way an isinstance chain does, trying each type in order.
+    def __init__(self, visitor_type, prefix, order):
+        self.entries = [(node_type, getattr(visitor_type, prefix + node_type.__name__)) for node_type in order]
+        self.generic = getattr(visitor_type, prefix + 'generic')
+
+    def __getitem__(self, node_type):
+        for handled, handler in self.entries:
+            if issubclass(node_type, handled):
+                return handler
+        return self.generic
+
+
+def use_chains(enabled):
+    for (visitor_type, prefix), order in chains.items():
+        if enabled:
+            visitor_type.handler_tables[prefix] = ChainTable(visitor_type, prefix, order)
+        else:
+            visitor_type.handler_tables.pop(prefix, None)
+
+
+def front_end(code, counts=None):
+    context = CompilationContext(counts=counts)
+    symbols = context.symbols
+    program = parser.parse(parser.TokenStream(list(lexer.tokenize(code, symbols)), SourceMap(code), symbols))
+    return program, context
+
+
+def replace_pseudo_registers(assembly_program):
+    for function in assembly_program.functions:
+        function.process_function()
+
+
+def run_passes(code, counts=None):
+    # Times the passes that dispatch on node types, on a fresh parse since validation
+    # renames the tree in place. The collector is paused so that its pauses, which grow
+    # with the heap, do not land on one pass or another at random.
+    program, context = front_end(code, counts)
+    gc.disable()
+    try:
+        validate_time, _ = timed(validation.run, program, context)
+        tacky_time, tacky_program = timed(tacky.Translator(context).translate, program)
+        select_time, assembly_program = timed(codegen.convert_to_assembly, tacky_program, context)
+        replace_time, _ = timed(replace_pseudo_registers, assembly_program)
+    finally:
+        gc.enable()
+    return {'validation': validate_time, 'tacky': tacky_time, 'instructions': select_time,
+            'pseudo regs': replace_time}
+
+
+def best_of(runs, code, counts=None):
+    times = [run_passes(code, counts) for _ in range(runs)]
+    return {name: min(run[name] for run in times) for name in times[0]}
+
+
+def main():
+    code = generate(0, **OPTIONS)
+    print(f"{len(lexer.lex(code))} tokens")
+    use_chains(True)
+    chain_times = best_of(3, code)
+    use_chains(False)
+    table_times = best_of(3, code)
+    counts = Counter()
+    counted_times = best_of(1, code, counts)
+    print(f"{'pass':>12} {'chains s':>10} {'tables s':>10} {'speedup':>8} {'counted s':>10}")
+    for name in table_times:
+        print(f"{name:>12} {chain_times[name]:>10.3f} {table_times[name]:>10.3f} "
+              f"{chain_times[name] / table_times[name]:>7.2f}x {counted_times[name]:>10.3f}")
+    total_chains, total_tables = sum(chain_times.values()), sum(table_times.values())
+    print(f"{'total':>12} {total_chains:>10.3f} {total_tables:>10.3f} {total_chains / total_tables:>7.2f}x")
+    print(f"{'handler':>32} {'calls':>10}")
+    for name, calls in counts.most_common(12):
+        print(f"{name:>32} {calls:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import random
+
+# Generates programs in the subset of C the compiler supports, deterministically from a
+# seed. Every statement kind and operator is used. The size is tunable along these axes:
+#   functions        number of functions; the last one is main
+#   statements       statements per function, counting nested ones
+#   depth            maximum nesting depth of statements
+#   expression_size  operators per expression
+#   cases            case labels per switch
+#   variables        variables declared at the top of each function
+# Loops run a bounded number of times, gotos only jump forward, divisors are odd and shift
+# counts are below 32, so the programs terminate and can be run.
+
+DEFAULTS = {'functions': 4, 'statements': 200, 'depth': 4, 'expression_size': 4, 'cases': 4, 'variables': 16}
+
+BINARY_OPERATORS = ['+', '-', '*', '/', '%', '<<', '>>', '&', '|', '^', '&&', '||',
+                    '<', '<=', '>', '>=', '==', '!=']
+UNARY_OPERATORS = ['-', '~', '!']
+COMPOUND_ASSIGNMENTS = ['+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<=', '>>=']
+NESTED_KINDS = ['compound', 'if', 'while', 'do', 'for', 'switch']
+LOOP_BOUND = 3
+
+
+class ProgramGenerator:
+    def __init__(self, seed=0, **options):
+        self.random = random.Random(seed)
+        for name, default in DEFAULTS.items():
+            setattr(self, name, options.pop(name, default))
+        if options:
+            raise TypeError(f'Unknown options: {", ".join(options)}')
+
+    def program(self):
+        lines = []
+        for index in range(self.functions):
+            lines.extend(self.function(index))
+        return '\n'.join(lines) + '\n'
+
+    def function(self, index):
+        # Validation shares one variable map between functions, so every name is prefixed
+        # with the function it belongs to.
+        self.prefix = f'f{index}_'
+        self.count = 0
+        self.names = []
+        self.loops = 0
+        self.switches = 0
+        name = 'main' if index == self.functions - 1 else f'f{index}'
+        lines = [f'int {name}(void) {{']
+        declared = set()
+        for _ in range(self.variables):
+            lines.append(f'    {self.declare(declared)}')
+        lines.extend(self.block(self.statements, 1, declared))
+        lines.append(f'    return {self.expression(self.expression_size)};')
+        lines.append('}')
+        return lines
+
+    def fresh(self, kind):
+        self.count += 1
+        return f'{self.prefix}{kind}{self.count}'
+
+    def declare(self, declared, name=None):
+        # A redeclared variable would be read uninitialized by an initializer mentioning it.
+        if name is None:
+            name = self.fresh('v')
+            declaration = f'int {name} = {self.expression(self.expression_size)};'
+        else:
+            declaration = f'int {name} = {self.random.randint(0, 100)};'
+        declared.add(name)
+        self.names.append(name)
+        return declaration
+
+    def block(self, budget, depth, declared):
+        # Returns the lines of a block holding budget statements. While depth allows, the
+        # first one nests and gets a share of the budget that reaches the full depth.
+        indent = '    ' * depth
+        mark = len(self.names)
+        lines = []
+        labels = []
+        here = budget
+        if depth < self.depth and budget >= 2:
+            here = max(1, budget // (self.depth - depth + 1))
+            lines.extend(self.nested(budget - here, depth))
+            here -= 1
+        while here > 0:
+            if depth < self.depth and here >= 2 and self.random.random() < 0.25:
+                inner = self.random.randint(1, min(3, here - 1))
+                lines.extend(self.nested(inner, depth))
+                here -= inner + 1
+                continue
+            choice = self.random.random()
+            if not self.names:
+                lines.append(f'{indent};')
+            elif choice < 0.1 and depth > 1:
+                lines.append(f'{indent}{self.declare(declared, self.shadow(declared))}')
+            elif choice < 0.15:
+                label = self.fresh('label')
+                labels.append(label)
+                lines.append(f'{indent}goto {label};')
+            elif choice < 0.25 and (self.loops or self.switches):
+                jump = 'continue' if self.loops and self.random.random() < 0.5 else 'break'
+                lines.append(f'{indent}if ({self.expression(self.expression_size)}) {jump};')
+            else:
+                lines.append(f'{indent}{self.assignment()}')
+            here -= 1
+        lines.extend(f'{indent}{label}: ;' for label in labels)
+        del self.names[mark:]
+        return lines
+
+    def shadow(self, declared):
+        # Redeclares one of the function's variables, or declares a new one if the pick is
+        # already declared in this block.
+        name = self.names[self.random.randrange(self.variables)] if self.variables else None
+        return None if name in declared else name
+
+    def nested(self, budget, depth):
+        indent = '    ' * depth
+        kind = self.random.choice(NESTED_KINDS)
+        lines = []
+        if kind == 'compound':
+            lines.append(f'{indent}{{')
+            lines.extend(self.block(budget, depth + 1, set()))
+            lines.append(f'{indent}}}')
+        elif kind == 'if':
+            then = budget if budget < 2 else self.random.randint(1, budget - 1)
+            lines.append(f'{indent}if ({self.expression(self.expression_size)}) {{')
+            lines.extend(self.block(then, depth + 1, set()))
+            if budget > then:
+                lines.append(f'{indent}}} else {{')
+                lines.extend(self.block(budget - then, depth + 1, set()))
+            lines.append(f'{indent}}}')
+        elif kind == 'for':
+            counter = self.fresh('i')
+            lines.append(f'{indent}for (int {counter} = 0; {counter} < {LOOP_BOUND}; {counter} = {counter} + 1) {{')
+            lines.extend(self.loop_body(budget, depth))
+            lines.append(f'{indent}}}')
+        elif kind in ('while', 'do'):
+            # The counter is only read by the loop, so nothing else can stop it terminating.
+            counter = self.fresh('c')
+            lines.append(f'{indent}int {counter} = 0;')
+            lines.append(f'{indent}while ({counter} < {LOOP_BOUND}) {{' if kind == 'while' else f'{indent}do {{')
+            lines.append(f'{indent}    {counter} = {counter} + 1;')
+            lines.extend(self.loop_body(budget, depth))
+            lines.append(f'{indent}}}' if kind == 'while' else f'{indent}}} while ({counter} < {LOOP_BOUND});')
+        else:
+            lines.extend(self.switch(budget, depth))
+        return lines
+
+    def loop_body(self, budget, depth):
+        self.loops += 1
+        lines = self.block(budget, depth + 1, set())
+        self.loops -= 1
+        return lines
+
+    def switch(self, budget, depth):
+        indent = '    ' * depth
+        modulus = max(4 * self.cases, 1)
+        values = self.random.sample(range(modulus), self.cases)
+        shares = [budget // (self.cases + 1)] * self.cases
+        default = budget - sum(shares)
+        lines = [f'{indent}switch ({self.expression(self.expression_size)} % {modulus}) {{']
+        self.switches += 1
+        for value, share in zip(values, shares):
+            lines.append(f'{indent}case {value}: {{')
+            lines.extend(self.block(share, depth + 1, set()))
+            lines.append(f'{indent}    break;')
+            lines.append(f'{indent}}}')
+        lines.append(f'{indent}default: {{')
+        lines.extend(self.block(default, depth + 1, set()))
+        lines.append(f'{indent}}}')
+        lines.append(f'{indent}}}')
+        self.switches -= 1
+        return lines
+
+    def assignment(self):
+        target = self.variable()
+        choice = self.random.random()
+        if choice < 0.15:
+            return self.random.choice([f'{target}++;', f'{target}--;', f'++{target};', f'--{target};'])
+        if choice < 0.4:
+            operator = self.random.choice(COMPOUND_ASSIGNMENTS)
+            value = self.expression(self.expression_size)
+            if operator in ('/=', '%='):
+                value = f'({value}) | 1'
+            elif operator in ('<<=', '>>='):
+                value = f'({value}) & 31'
+            return f'{target} {operator} {value};'
+        return f'{target} = {self.expression(self.expression_size)};'
+
+    def variable(self):
+        return self.random.choice(self.names)
+
+    def expression(self, size):
+        if size <= 0 or not self.names:
+            if self.names and self.random.random() < 0.7:
+                return self.variable()
+            return str(self.random.randint(0, 100))
+        choice = self.random.random()
+        if choice < 0.7:
+            left = self.random.randint(0, size - 1)
+            operator = self.random.choice(BINARY_OPERATORS)
+            left, right = self.expression(left), self.expression(size - 1 - left)
+            if operator in ('/', '%'):
+                right = f'({right} | 1)'
+            elif operator in ('<<', '>>'):
+                right = f'({right} & 31)'
+            return f'({left} {operator} {right})'
+        if choice < 0.85:
+            return f'{self.random.choice(UNARY_OPERATORS)}({self.expression(size - 1)})'
+        first = self.random.randint(0, size - 1)
+        second = self.random.randint(0, size - 1 - first)
+        return (f'({self.expression(first)} ? {self.expression(second)} : '
+                f'{self.expression(size - 1 - first - second)})')
+
+
+def generate(seed=0, **options):
+    return ProgramGenerator(seed, **options).program()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate a C program for benchmarking the compiler.")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    for name, default in DEFAULTS.items():
+        arg_parser.add_argument(f'--{name.replace("_", "-")}', type=int, default=default)
+    args = vars(arg_parser.parse_args())
+    print(generate(**args), end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import incremental
+
+from benchmarks.common import synthetic_source, timed
+
+FUNCTIONS = [500, 5_000]
+STATEMENTS = 10
+
+
+def edit(result, offset):
+    return incremental.update(result, offset, 0, ' + 1')
+
+
+def main():
+    print(f"{'functions':>10} {'full parse s':>13} {'edit s':>10} {'speedup':>9}")
+    for functions in FUNCTIONS:
+        code = synthetic_source(functions=functions, statements=STATEMENTS)
+        full, result = timed(incremental.parse, code)
+        # Append a term to the first statement of the middle function.
+        offset = code.index(';', result.starts[functions // 2])
+        update, _ = timed(edit, result, offset, repeat=5)
+        print(f"{functions:>10} {full:>13.3f} {update:>10.5f} {full / update:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import incremental
+import lexer
+import parser
+
+from benchmarks.common import synthetic_source, timed
+
+FUNCTIONS = 200
+STATEMENTS = 500
+
+
+def parse_one(tokens, lazy):
+    # Parses the whole file, then reads the body of its last function.
+    program = parser.parse(tokens, lazy=lazy)
+    return program.functions[-1].block
+
+
+def main():
+    code = synthetic_source(FUNCTIONS, STATEMENTS)
+    tokens = lexer.lex(code)
+    lex_time, _ = timed(lexer.lex, code)
+    print(f"{FUNCTIONS} functions of {STATEMENTS} statements, {len(tokens)} tokens, lexed in {lex_time:.3f} s")
+    print(f"{'':>28} {'eager s':>10} {'lazy s':>10} {'speedup':>8}")
+    # The first two rows parse already lexed tokens; incremental.parse lexes as well.
+    rows = [
+        ('top level only', lambda lazy: parser.parse(tokens, lazy=lazy)),
+        ('one function body', lambda lazy: parse_one(tokens, lazy)),
+        ('incremental.parse', lambda lazy: incremental.parse(code, lazy)),
+    ]
+    for name, run in rows:
+        eager_time, _ = timed(run, False, repeat=3)
+        lazy_time, _ = timed(run, True, repeat=3)
+        print(f"{name:>28} {eager_time:>10.3f} {lazy_time:>10.3f} {eager_time / lazy_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
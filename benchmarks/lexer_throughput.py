@@ -0,0 +1,25 @@
+import lexer
+
+from benchmarks.common import synthetic_source, timed
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def lex(code):
+    count = 0
+    for _ in lexer.tokenize(code):
+        count += 1
+    return count
+
+
+def main():
+    print(f"{'bytes':>12} {'tokens':>10} {'lex s':>10} {'MB/s':>10}")
+    for statements in SIZES:
+        code = synthetic_source(statements=statements)
+        size = len(code.encode())
+        elapsed, count = timed(lex, code, repeat=3)
+        print(f"{size:>12} {count:>10} {elapsed:>10.3f} {size / elapsed / 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import lexer
+import source
+
+from benchmarks.common import synthetic_lines
+
+BYTES_PER_STATEMENT = 24
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def measure(mode, path):
+    startup_rss = peak_rss_mb()
+    start = time.perf_counter()
+    with open(path, 'rb' if mode == 'mmap' else 'r') as file:
+        code = source.map_file(file) if mode == 'mmap' else file.read()
+        tokens = lexer.tokenize(code)
+        next(tokens)
+        first_token = time.perf_counter() - start
+        count = 1 + sum(1 for _ in tokens)
+    total = time.perf_counter() - start
+    print(json.dumps({'mode': mode, 'tokens': count, 'first_token_s': first_token, 'total_s': total,
+                      'peak_rss_mb': peak_rss_mb(), 'startup_rss_mb': startup_rss}))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare reading and memory-mapping a large input.")
+    arg_parser.add_argument('--megabytes', type=int, default=20)
+    arg_parser.add_argument('--child', nargs=2, metavar=('MODE', 'FILE'), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child:
+        measure(*args.child)
+        return
+
+    with tempfile.NamedTemporaryFile('w', suffix='.c', delete=False) as file:
+        file.writelines(synthetic_lines(statements=args.megabytes * 2**20 // BYTES_PER_STATEMENT))
+        path = file.name
+    try:
+        print(f"input: {os.path.getsize(path) / 2**20:.1f} MB")
+        print(f"{'mode':>6} {'tokens':>10} {'first token s':>14} {'total s':>9} {'peak RSS MB':>12} {'over startup':>13}")
+        for mode in ['read', 'mmap']:
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.mmap_input', '--child', mode, path],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output)
+            print(f"{mode:>6} {result['tokens']:>10} {result['first_token_s']:>14.4f} {result['total_s']:>9.2f} "
+                  f"{result['peak_rss_mb']:>12.1f} {result['peak_rss_mb'] - result['startup_rss_mb']:>13.1f}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
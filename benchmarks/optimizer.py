@@ -0,0 +1,147 @@
+import glob
+import os
+import sys
+
+import codegen
+import folding
+import lexer
+import optimizer
+import parser
+import tacky
+import validation
+from source import SourceMap
+from utils import CompilationContext
+
+from benchmarks.common import timed
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'valid')
+# Programs that run for longer, like the one that counts down from INT_MAX in steps of 5,
+# are left out of the executed instruction counts.
+STEP_LIMIT = 2_000_000
+
+CONFIGURATIONS = [
+    ('none', optimizer.Optimizations()),
+    ('fold constants', optimizer.Optimizations(fold_constants=True)),
+    ('unreachable', optimizer.Optimizations(eliminate_unreachable_code=True)),
+    ('copies', optimizer.Optimizations(propagate_copies=True)),
+    ('dead stores', optimizer.Optimizations(eliminate_dead_stores=True)),
+    ('all', optimizer.Optimizations.all()),
+]
+
+
+class Trap(Exception):
+    pass
+
+
+class StepLimitExceeded(Exception):
+    pass
+
+
+def execute(function: tacky.Function):
+    # Interprets a TACKY function and returns its result and the number of instructions it
+    # executed, not counting labels, which generate no code. Division by zero and
+    # INT_MIN / -1 raise Trap, as they do in the compiled program.
+    instructions = function.instructions
+    targets = {instruction.identifier: index for index, instruction in enumerate(instructions)
+               if type(instruction) is tacky.Label}
+    variables = {}
+
+    def value(operand):
+        if type(operand) is tacky.Constant:
+            return folding.wrap(int(operand.value))
+        return variables.get(operand.identifier, 0)
+
+    index = executed = 0
+    while True:
+        instruction = instructions[index]
+        index += 1
+        kind = type(instruction)
+        if kind is tacky.Label:
+            continue
+        executed += 1
+        if executed > STEP_LIMIT:
+            raise StepLimitExceeded()
+        if kind is tacky.Copy:
+            variables[instruction.dst.identifier] = value(instruction.src)
+        elif kind is tacky.Binary:
+            result = folding.binary_value(instruction.operator, value(instruction.src1), value(instruction.src2))
+            if result is None:
+                raise Trap()
+            variables[instruction.dst.identifier] = result
+        elif kind is tacky.Unary:
+            variables[instruction.dst.identifier] = folding.unary_value(instruction.operator, value(instruction.src))
+        elif kind is tacky.Jump:
+            index = targets[instruction.target]
+        elif kind is tacky.JumpIfZero:
+            if value(instruction.condition) == 0:
+                index = targets[instruction.target]
+        elif kind is tacky.JumpIfNotZero:
+            if value(instruction.condition) != 0:
+                index = targets[instruction.target]
+        elif kind is tacky.Return:
+            return value(instruction.value), executed
+
+
+def compile_tacky(code, optimizations):
+    context = CompilationContext()
+    symbols = context.symbols
+    program = parser.parse(parser.TokenStream(list(lexer.tokenize(code, symbols)), SourceMap(code), symbols))
+    validation.run(program, context)
+    folding.run(program, context)
+    tacky_program = tacky.Translator(context).translate(program)
+    optimize_time, _ = timed(optimizer.optimize, tacky_program, optimizations, context)
+    return tacky_program, context, optimize_time
+
+
+def assembly_instructions(tacky_program, context):
+    code = codegen.emit_code(codegen.translate_program(tacky_program, context))
+    return sum(1 for line in code.splitlines() if line.startswith('\t') and not line.startswith('\t.'))
+
+
+def measure(sources, optimizations):
+    totals = {'tacky': 0, 'copies': 0, 'executed': 0, 'assembly': 0, 'optimize s': 0.0, 'over limit': 0}
+    results = {}
+    for name, code in sources.items():
+        tacky_program, context, optimize_time = compile_tacky(code, optimizations)
+        main = tacky_program.functions[-1]
+        try:
+            result, executed = execute(main)
+        except Trap:
+            result, executed = 'trap', 0
+        except StepLimitExceeded:
+            result, executed = 'over limit', 0
+            totals['over limit'] += 1
+        results[name] = result
+        totals['tacky'] += len(main.instructions)
+        totals['copies'] += sum(1 for instruction in main.instructions if type(instruction) is tacky.Copy)
+        totals['executed'] += executed
+        totals['assembly'] += assembly_instructions(tacky_program, context)
+        totals['optimize s'] += optimize_time
+    return totals, results
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(TESTS, '*.c')))
+    sources = {}
+    for path in paths:
+        with open(path) as file:
+            sources[path] = file.read()
+    print(f"{len(sources)} programs")
+    print(f"{'optimizations':>16} {'tacky':>8} {'copies':>8} {'executed':>10} {'assembly':>9} {'optimize s':>11} {'changed':>8} {'over limit':>11}")
+    baseline = None
+    for name, optimizations in CONFIGURATIONS:
+        totals, results = measure(sources, optimizations)
+        if baseline is None:
+            baseline = totals, results
+        # Programs whose result differs from the unoptimized one; this should always be 0.
+        changed = sum(1 for path in results if results[path] != baseline[1][path])
+        print(f"{name:>16} {totals['tacky']:>8} {totals['copies']:>8} {totals['executed']:>10} {totals['assembly']:>9} "
+              f"{totals['optimize s']:>11.4f} {changed:>8} {totals['over limit']:>11}")
+        if baseline[0] is not totals:
+            print(f"{'':>16} " + ' '.join(
+                f"{1 - totals[key] / baseline[0][key]:>{width}.1%}"
+                for key, width in (('tacky', 8), ('copies', 8), ('executed', 10), ('assembly', 9))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import lexer
+import parser
+
+from benchmarks.common import synthetic_source, timed
+
+TOKENS_PER_STATEMENT = 12
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def parse_tokens(tokens):
+    return parser.parse(parser.TokenStream(tokens))
+
+
+def main():
+    print(f"{'tokens':>10} {'parse s':>10} {'us/token':>10}")
+    for size in SIZES:
+        code = synthetic_source(statements=size // TOKENS_PER_STATEMENT)
+        tokens = list(lexer.tokenize(code))
+        elapsed, _ = timed(parse_tokens, tokens)
+        print(f"{len(tokens):>10} {elapsed:>10.3f} {elapsed / len(tokens) * 1e6:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import cProfile
+import pstats
+
+import lexer
+import parser
+
+from benchmarks.common import timed
+
+BLOCKS = 5_000
+
+# One loop body per block, using every statement kind and every operator, so each kind of
+# token goes through the parser's dispatch.
+BLOCK = '''
+    a = ~b + -c * !d / (e % 3) - f++ + --g;
+    a += b << 2 >> 1; a -= b & c | d ^ e; a *= 2; a /= 3; a %= 5;
+    a &= b; a |= c; a ^= d; a <<= 1; a >>= 1;
+    a = b < c && c <= d || d > e && e >= f || f == g && g != b ? b : c ? d : e;
+    if (a) b = 1; else { c = 2; }
+    while (a) { break; }
+    do { continue; } while (0);
+    for (int i = 0; i < 10; i = i + 1) ;
+    switch (a) { case 1: b = 2; default: c = 3; }
+    goto label{n};
+    label{n}: ;
+'''
+
+
+def synthetic_source(blocks):
+    declarations = ''.join(f'    int {name} = 1;\n' for name in 'abcdefg')
+    body = ''.join(BLOCK.replace('{n}', str(n)) for n in range(blocks))
+    return f'int main(void) {{\n{declarations}    for (;;) {{{body}    }}\n    return a;\n}}\n'
+
+
+def main():
+    tokens = lexer.lex(synthetic_source(BLOCKS))
+    elapsed, _ = timed(parser.parse, tokens, repeat=3)
+    print(f"{len(tokens)} tokens, parse {elapsed:.3f} s, {len(tokens) / elapsed / 1e6:.2f} M tokens/s")
+
+    profile = cProfile.Profile()
+    profile.runcall(parser.parse, tokens)
+    statistics = pstats.Stats(profile)
+    total = statistics.total_tt
+    print(f"{'function':>28} {'calls':>10} {'own s':>8} {'share':>7}")
+    rows = sorted(statistics.stats.items(), key=lambda item: item[1][2], reverse=True)
+    for (_, _, name), (_, calls, own, _, _) in rows[:12]:
+        print(f"{name:>28} {calls:>10} {own:>8.3f} {own / total:>6.1%}")
+
+
+if __name__ == '__main__':
+    main()
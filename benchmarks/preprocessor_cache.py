@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+import preprocessor
+
+from benchmarks.common import timed
+
+HEADERS = 20
+UNITS = 50
+DEFINES = 200
+
+
+def write_tree(directory):
+    # Every header is guarded and includes the previous one, and every unit includes all of
+    # them, so each header is reached many times per unit.
+    for h in range(HEADERS):
+        with open(os.path.join(directory, f'h{h}.h'), 'w') as file:
+            file.write(f'#ifndef H{h}_H\n#define H{h}_H\n')
+            if h:
+                file.write(f'#include "h{h - 1}.h"\n')
+            for d in range(DEFINES):
+                file.write(f'#define H{h}_VALUE{d} ({d} + {h})\n')
+            file.write('#endif\n')
+    includes = ''.join(f'#include "h{h}.h"\n' for h in range(HEADERS))
+    body = ' + '.join(f'H{h}_VALUE{h}' for h in range(HEADERS))
+    return f'{includes}int main(void) {{\n    return {body};\n}}\n'
+
+
+def preprocess_units(code, directory, use_cache):
+    preprocessor.cache.clear()
+    for key in preprocessor.statistics:
+        preprocessor.statistics[key] = 0
+    count = 0
+    for _ in range(UNITS):
+        tokens = preprocessor.Preprocessor(use_cache=use_cache).preprocess(code, os.path.join(directory, 'main.c'))
+        count += sum(1 for _ in tokens)
+    return count, dict(preprocessor.statistics)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        code = write_tree(directory)
+        print(f"{HEADERS} guarded headers, {UNITS} translation units")
+        print(f"{'cache':>8} {'time s':>10} {'bytes lexed':>14} {'bytes included':>16} {'hits':>8} {'skipped':>8}")
+        for use_cache in (False, True):
+            elapsed, (count, statistics) = timed(preprocess_units, code, directory, use_cache)
+            print(f"{'on' if use_cache else 'off':>8} {elapsed:>10.3f} {statistics['header_bytes_lexed']:>14} "
+                  f"{statistics['header_bytes_included']:>16} {statistics['cache_hits']:>8} "
+                  f"{statistics['skipped_includes']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import json
+import math
+import sys
+import time
+import tracemalloc
+
+import codegen
+import folding
+import lexer
+import optimizer
+import parser
+import preprocessor
+import tacky
+import validation
+from source import SourceMap
+from utils import CompilationContext
+
+from benchmarks.generator import DEFAULTS, generate
+
+# A stage whose time or memory grows faster than size ** SUPERLINEAR_EXPONENT is flagged.
+SUPERLINEAR_EXPONENT = 1.2
+DEFAULT_SIZES = {'statements': [500, 1_000, 2_000, 4_000, 8_000]}
+
+
+# The stages of compiler.process with --optimize, each taking the previous stage's result.
+# Generated programs have no directives, but code that does goes through the preprocessor,
+# whose time is then part of lex.
+def lex(state):
+    code = state['code']
+    symbols = state['context'].symbols
+    if '#' in code:
+        state['tokens'] = list(preprocessor.Preprocessor(symbols=symbols).preprocess(code))
+    else:
+        state['tokens'] = list(lexer.tokenize(code, symbols))
+
+
+def parse(state):
+    tokens = parser.TokenStream(state['tokens'], SourceMap(state['code']), state['context'].symbols)
+    state['program'] = parser.parse(tokens)
+
+
+def validate(state):
+    validation.run(state['program'], state['context'])
+
+
+def fold(state):
+    folding.run(state['program'], state['context'])
+
+
+def translate(state):
+    state['tacky'] = tacky.Translator(state['context']).translate(state['program'])
+
+
+def optimize(state):
+    optimizer.optimize(state['tacky'], optimizer.Optimizations.all(), state['context'])
+
+
+def generate_code(state):
+    state['assembly'] = codegen.translate_program(state['tacky'], state['context'])
+
+
+def emit(state):
+    state['text'] = codegen.emit_code(state['assembly'])
+
+
+stages = {'lex': lex, 'parse': parse, 'validate': validate, 'fold': fold, 'tacky': translate,
+          'optimize': optimize, 'codegen': generate_code, 'emit': emit}
+
+
+def run_stages(code, trace):
+    state = {'code': code, 'context': CompilationContext()}
+    results = {}
+    for name, stage in stages.items():
+        if trace:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        stage(state)
+        elapsed = time.perf_counter() - start
+        results[name] = tracemalloc.get_traced_memory()[1] - current if trace else elapsed
+    return results, len(state['tokens'])
+
+
+def measure(code, repeat):
+    # Times are the best of repeat untraced runs; memory is the peak a stage allocates on
+    # top of what earlier stages left, from one run under tracemalloc.
+    times = None
+    for _ in range(repeat):
+        elapsed, tokens = run_stages(code, False)
+        times = elapsed if times is None else {name: min(times[name], elapsed[name]) for name in times}
+    tracemalloc.start()
+    peaks, _ = run_stages(code, True)
+    tracemalloc.stop()
+    return tokens, {name: {'seconds': times[name], 'peak_bytes': peaks[name]} for name in stages}
+
+
+def growth_exponent(sizes, values):
+    # Least-squares slope of log(value) against log(size).
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if value > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def growth(runs):
+    tokens = [run['tokens'] for run in runs]
+    result = {}
+    for name in stages:
+        time_exponent = growth_exponent(tokens, [run['stages'][name]['seconds'] for run in runs])
+        memory_exponent = growth_exponent(tokens, [run['stages'][name]['peak_bytes'] for run in runs])
+        superlinear = any(exponent is not None and exponent > SUPERLINEAR_EXPONENT
+                          for exponent in (time_exponent, memory_exponent))
+        result[name] = {'time_exponent': time_exponent, 'memory_exponent': memory_exponent,
+                        'superlinear': superlinear}
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Time each compiler stage on generated programs of growing size.")
+    arg_parser.add_argument('--axis', choices=DEFAULTS, default='statements', help="The generator option to vary")
+    arg_parser.add_argument('--sizes', type=lambda text: [int(size) for size in text.split(',')],
+                            help="Comma-separated values of the axis")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    for name, default in DEFAULTS.items():
+        arg_parser.add_argument(f'--{name.replace("_", "-")}', type=int, default=default)
+    args = arg_parser.parse_args()
+    options = {name: getattr(args, name) for name in DEFAULTS}
+    sizes = args.sizes or DEFAULT_SIZES.get(args.axis) or [options[args.axis] * 2 ** n for n in range(5)]
+
+    runs = []
+    for size in sizes:
+        code = generate(args.seed, **{**options, args.axis: size})
+        tokens, stage_results = measure(code, args.repeat)
+        runs.append({args.axis: size, 'bytes': len(code), 'tokens': tokens, 'stages': stage_results})
+        print(f"{args.axis}={size}: {tokens} tokens", file=sys.stderr)
+
+    report = {'axis': args.axis, 'seed': args.seed, 'options': options, 'runs': runs, 'growth': growth(runs),
+              'superlinear_exponent': SUPERLINEAR_EXPONENT}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import sys
+
+import lexer
+import parser
+import validation
+from source import SourceMap
+from utils import CompilationContext
+
+from benchmarks.common import timed
+
+VARIABLES = 10_000
+DEPTHS = [125, 250, 500, 1_000]
+
+
+def nested_source(variables, depth):
+    # Declares the variables at the top of main, then nests blocks depth deep. Each block
+    # shadows one of them and reads two others, one declared near the top of the chain.
+    lines = ['int main(void) {']
+    lines.extend(f'    int v{n} = {n};' for n in range(variables))
+    for level in range(depth):
+        lines.append('{')
+        lines.append(f'int v{level % variables} = v{(level + 1) % variables};')
+        lines.append(f'v{level % variables} = v{level % variables} + v{(7 * level) % variables};')
+    lines.extend('}' for _ in range(depth))
+    lines.append('    return v0;')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def validate(code):
+    context = CompilationContext()
+    symbols = context.symbols
+    program = parser.parse(parser.TokenStream(list(lexer.tokenize(code, symbols)), SourceMap(code), symbols))
+    elapsed, _ = timed(validation.run, program, context)
+    return elapsed
+
+
+def main():
+    # The parser and validation recurse a few frames per nested block.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * max(DEPTHS)))
+    print(f"{VARIABLES} variables, recursion limit {sys.getrecursionlimit()}")
+    print(f"{'depth':>8} {'tokens':>10} {'validate s':>12}")
+    for depth in DEPTHS:
+        code = nested_source(VARIABLES, depth)
+        tokens = len(lexer.lex(code))
+        # validation.run renames the tree in place, so each run validates a fresh parse.
+        elapsed = min(validate(code) for _ in range(3))
+        print(f"{depth:>8} {tokens:>10} {elapsed:>12.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import tracemalloc
+
+import lexer
+
+from benchmarks.common import synthetic_source, timed
+
+STATEMENTS = 100_000
+
+
+def traced_size(fn, *args):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def token_list(code):
+    return list(lexer.tokenize(code))
+
+
+def main():
+    code = synthetic_source(statements=STATEMENTS)
+    print(f"source: {len(code)} bytes")
+    print(f"{'storage':>12} {'tokens':>10} {'bytes':>12} {'bytes/token':>12} {'lex s':>8}")
+    for name, fn in [('tuple list', token_list), ('TokenBuffer', lexer.lex)]:
+        size, tokens = traced_size(fn, code)
+        elapsed, _ = timed(fn, code)
+        print(f"{name:>12} {len(tokens):>10} {size:>12} {size / len(tokens):>12.1f} {elapsed:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+from typing import Dict, List, Set
+
+import tacky
+
+# The ids of the two nodes every graph has besides its basic blocks. Blocks are numbered
+# from 0 in the order they appear in the function.
+ENTRY = -1
+EXIT = -2
+
+JUMPS = {tacky.Jump, tacky.JumpIfZero, tacky.JumpIfNotZero}
+CONDITIONAL_JUMPS = {tacky.JumpIfZero, tacky.JumpIfNotZero}
+ENDS_BLOCK = JUMPS | {tacky.Return}
+
+
+class BasicBlock:
+    # A straight-line run of instructions: only the first may be a Label and only the last a
+    # jump or a Return. previous and next link the blocks in the order the function lays
+    # them out, from ENTRY to EXIT, which is also the order control falls through them.
+    __slots__ = ('id', 'instructions', 'predecessors', 'successors', 'previous', 'next')
+
+    def __init__(self, id: int, instructions: List[tacky.Instruction]):
+        self.id = id
+        self.instructions = instructions
+        self.predecessors = set()
+        self.successors = set()
+        self.previous = None
+        self.next = None
+
+    def __repr__(self):
+        return f'BasicBlock({self.id}, {len(self.instructions)} instructions, successors={sorted(self.successors)})'
+
+
+class Graph:
+    # The control-flow graph of a TACKY function. Passes edit the instructions of blocks in
+    # place; after changing the last instruction of a block, update_edges recomputes the
+    # block's successors, and remove_block drops a block with all its edges. instructions
+    # lays the blocks out again as a flat list.
+    def __init__(self, instructions: List[tacky.Instruction]):
+        self.nodes: Dict[int, BasicBlock] = {ENTRY: BasicBlock(ENTRY, []), EXIT: BasicBlock(EXIT, [])}
+        self.label_blocks: Dict[int, int] = {}
+        self.partition(instructions)
+        for block in self.blocks():
+            self.add_edges(block)
+        self.add_edge(ENTRY, self.nodes[ENTRY].next)
+
+    def partition(self, instructions: List[tacky.Instruction]):
+        nodes = self.nodes
+        label_blocks = self.label_blocks
+        last = nodes[ENTRY]
+        current = []
+        for instruction in instructions:
+            kind = type(instruction)
+            if kind is tacky.Label:
+                if current:
+                    last = self.append_block(last, current)
+                    current = []
+                label_blocks[instruction.identifier] = len(nodes) - 2
+                current.append(instruction)
+            else:
+                current.append(instruction)
+                if kind in ENDS_BLOCK:
+                    last = self.append_block(last, current)
+                    current = []
+        if current:
+            last = self.append_block(last, current)
+        last.next = EXIT
+        self.nodes[EXIT].previous = last.id
+
+    def append_block(self, last: BasicBlock, instructions: List[tacky.Instruction]) -> BasicBlock:
+        block = BasicBlock(len(self.nodes) - 2, instructions)
+        self.nodes[block.id] = block
+        last.next = block.id
+        block.previous = last.id
+        return block
+
+    def blocks(self):
+        # The basic blocks in layout order.
+        nodes = self.nodes
+        block = nodes[nodes[ENTRY].next]
+        while block.id != EXIT:
+            yield block
+            block = nodes[block.next]
+
+    def block(self, id: int) -> BasicBlock:
+        return self.nodes[id]
+
+    def label_block(self, label: int) -> int:
+        return self.label_blocks[label]
+
+    def add_edge(self, source: int, target: int):
+        self.nodes[source].successors.add(target)
+        self.nodes[target].predecessors.add(source)
+
+    def remove_edge(self, source: int, target: int):
+        self.nodes[source].successors.discard(target)
+        self.nodes[target].predecessors.discard(source)
+
+    def add_edges(self, block: BasicBlock):
+        last = block.instructions[-1] if block.instructions else None
+        kind = type(last)
+        if kind is tacky.Return:
+            self.add_edge(block.id, EXIT)
+            return
+        if kind in JUMPS:
+            self.add_edge(block.id, self.label_blocks[last.target])
+            if kind not in CONDITIONAL_JUMPS:
+                return
+        self.add_edge(block.id, block.next)
+
+    def update_edges(self, id: int):
+        # Recomputes the successors of a block from its last instruction.
+        block = self.nodes[id]
+        for successor in list(block.successors):
+            self.remove_edge(id, successor)
+        self.add_edges(block)
+
+    def remove_block(self, id: int):
+        # Removes a block and its edges. Blocks that fell through to it must have been
+        # updated or removed first, since they would now fall through to the next one.
+        nodes = self.nodes
+        block = nodes[id]
+        for successor in block.successors:
+            nodes[successor].predecessors.discard(id)
+        for predecessor in block.predecessors:
+            nodes[predecessor].successors.discard(id)
+        del nodes[id]
+        nodes[block.previous].next = block.next
+        nodes[block.next].previous = block.previous
+        instructions = block.instructions
+        if instructions and type(instructions[0]) is tacky.Label:
+            del self.label_blocks[instructions[0].identifier]
+
+    def remove_label(self, id: int):
+        # Drops the Label a block starts with, once nothing jumps to it.
+        label = self.nodes[id].instructions.pop(0)
+        del self.label_blocks[label.identifier]
+
+    def reachable(self) -> Set[int]:
+        # The ids of the nodes control can reach from ENTRY.
+        nodes = self.nodes
+        seen = {ENTRY}
+        stack = [ENTRY]
+        while stack:
+            for successor in nodes[stack.pop()].successors:
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        return seen
+
+    def instructions(self) -> List[tacky.Instruction]:
+        instructions = []
+        for block in self.blocks():
+            instructions.extend(block.instructions)
+        return instructions
+
+
+def build(function: tacky.Function) -> Graph:
+    return Graph(function.instructions)
+
+
+def rebuild(function: tacky.Function, graph: Graph):
+    function.instructions = graph.instructions()
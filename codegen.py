@@ -1,63 +1,61 @@
 import common
 import tacky
+from collections import Counter
 from typing import List, Dict
 
+from symbols import SymbolTable
+from utils import CompilationContext
+from visitor import Visitor
+
 
 class AssemblyNode:
     pass
 
 
 class AssemblyProgram(AssemblyNode):
-    def __init__(self, functions: List['AssemblyFunction']):
+    def __init__(self, functions: List['AssemblyFunction'], symbols: SymbolTable):
         self.functions = functions
+        self.symbols = symbols
 
     def emit(self) -> str:
         """Generate the assembly code for the entire program."""
-        return "\n".join(function.emit() for function in self.functions)
+        return "\n".join(function.emit(self.symbols) for function in self.functions)
 
 
-class AssemblyFunction(AssemblyNode):
-    def __init__(self, name: str, instructions: List['AssemblyInstruction']):
+class AssemblyFunction(AssemblyNode, Visitor):
+    def __init__(self, name: int, instructions: List['AssemblyInstruction'], counts: Counter = None):
+        super().__init__(counts)
         self.name = name
         self.instructions = instructions
         self.stack_size = 0
-        self.pseudo_register_map: Dict[str, int] = {}
+        self.pseudo_register_map: Dict[int, int] = {}
         self.current_stack_index = -4
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
+        name = symbols.name(self.name)
         header = (
-            f"\t.globl _{self.name}\n"
-            f"_{self.name}:\n"
+            f"\t.globl _{name}\n"
+            f"_{name}:\n"
             "\tpushq\t%rbp\n"
             "\tmovq\t%rsp, %rbp\n"
         )
-        instructions = ''.join(str(inst.emit()) for inst in self.instructions)
+        instructions = ''.join(str(inst.emit(symbols)) for inst in self.instructions)
         return header + instructions
 
     def process_function(self):
+        handlers = self.handlers('process_')
         for inst in self.instructions:
-            if isinstance(inst, Mov):
-                self.process_mov(inst)
-            elif isinstance(inst, Unary):
-                self.process_unary(inst)
-            elif isinstance(inst, Binary):
-                self.process_binary(inst)
-            elif isinstance(inst, Cmp):
-                self.process_cmp(inst)
-            elif isinstance(inst, SetCC):
-                self.process_setcc(inst)
-            elif isinstance(inst, Idiv):
-                self.process_idiv(inst)
+            handlers[type(inst)](self, inst)
 
         self.stack_size = -self.current_stack_index - 4
 
-    def get_stack_index(self, identifier: str) -> int:
+    def get_stack_index(self, identifier: int) -> int:
         if identifier not in self.pseudo_register_map:
             self.pseudo_register_map[identifier] = self.current_stack_index
             self.current_stack_index -= 4
         return self.pseudo_register_map[identifier]
 
-    def process_mov(self, inst: 'Mov'):
+    def process_Mov(self, inst: 'Mov'):
         if isinstance(inst.src, Pseudo):
             index = self.get_stack_index(inst.src.identifier)
             inst.src = Stack(index)
@@ -65,12 +63,12 @@ class AssemblyFunction(AssemblyNode):
             index = self.get_stack_index(inst.dst.identifier)
             inst.dst = Stack(index)
 
-    def process_unary(self, inst: 'Unary'):
+    def process_Unary(self, inst: 'Unary'):
         if isinstance(inst.operand, Pseudo):
             index = self.get_stack_index(inst.operand.identifier)
             inst.operand = Stack(index)
 
-    def process_binary(self, inst: 'Binary'):
+    def process_Binary(self, inst: 'Binary'):
         if isinstance(inst.src, Pseudo):
             index = self.get_stack_index(inst.src.identifier)
             inst.src = Stack(index)
@@ -78,7 +76,7 @@ class AssemblyFunction(AssemblyNode):
             index = self.get_stack_index(inst.dst.identifier)
             inst.dst = Stack(index)
 
-    def process_cmp(self, inst: 'Cmp'):
+    def process_Cmp(self, inst: 'Cmp'):
         if isinstance(inst.operand1, Pseudo):
             index = self.get_stack_index(inst.operand1.identifier)
             inst.operand1 = Stack(index)
@@ -87,17 +85,20 @@ class AssemblyFunction(AssemblyNode):
             inst.operand2 = Stack(index)
 
 
-    def process_setcc(self, inst: 'SetCC'):
+    def process_SetCC(self, inst: 'SetCC'):
         if isinstance(inst.operand, Pseudo):
             index = self.get_stack_index(inst.operand.identifier)
             inst.operand = Stack(index)
 
 
-    def process_idiv(self, inst: 'Idiv'):
+    def process_Idiv(self, inst: 'Idiv'):
         if isinstance(inst.src, Pseudo):
             index = self.get_stack_index(inst.src.identifier)
             inst.src = Stack(index)
 
+    def process_generic(self, inst: 'AssemblyInstruction'):
+        pass
+
     def fixing_up_instructions(self):
         self.instructions.insert(0, AllocStack(self.stack_size))
         i = 0
@@ -173,7 +174,7 @@ class AssemblyFunction(AssemblyNode):
 
 
 class AssemblyInstruction(AssemblyNode):
-    def emit(self):
+    def emit(self, symbols: SymbolTable):
         pass
 
 
@@ -182,7 +183,7 @@ class Mov(AssemblyInstruction):
         self.src = src
         self.dst = dst
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return f"\tmovl\t{self.src.emit()}, {self.dst.emit()}\n"
 
 
@@ -191,7 +192,7 @@ class Unary(AssemblyInstruction):
         self.operator = operator
         self.operand = operand
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return f"\t{translate_operator(self.operator)}\t{self.operand.emit()}\n"
 
 
@@ -201,7 +202,7 @@ class Binary(AssemblyInstruction):
         self.src = src
         self.dst = dst
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return f"\t{translate_binary_operator(self.binary_operator)}\t{self.src.emit()}, {self.dst.emit()}\n"
 
 
@@ -210,7 +211,7 @@ class Cmp(AssemblyInstruction):
         self.operand1 = operand1
         self.operand2 = operand2
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return f"\tcmpl\t{self.operand1.emit()}, {self.operand2.emit()}\n"
 
 
@@ -218,30 +219,30 @@ class Idiv(AssemblyInstruction):
     def __init__(self, src: 'Operand'):
         self.src = src
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return f"\tidivl\t{self.src.emit()}\n"
 
 
 class Cdq(AssemblyInstruction):
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return "\tcdq\n"
 
 
 class Jmp(AssemblyInstruction):
-    def __init__(self, identifier: str):
+    def __init__(self, identifier: int):
         self.identifier = identifier
 
-    def emit(self) -> str:
-        return f"\tjmp\t.L{self.identifier}\n"
+    def emit(self, symbols: SymbolTable) -> str:
+        return f"\tjmp\t.L{symbols.name(self.identifier)}\n"
 
 
 class JmpCC(AssemblyInstruction):
-    def __init__(self, cond_code: str, identifier: str):
+    def __init__(self, cond_code: str, identifier: int):
         self.cond_code = cond_code
         self.identifier = identifier
 
-    def emit(self) -> str:
-        return f"\tj{self.cond_code}\t.L{self.identifier}\n"
+    def emit(self, symbols: SymbolTable) -> str:
+        return f"\tj{self.cond_code}\t.L{symbols.name(self.identifier)}\n"
 
 
 class SetCC(AssemblyInstruction):
@@ -249,28 +250,28 @@ class SetCC(AssemblyInstruction):
         self.cond_code = cond_code
         self.operand = operand
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return f"\tset{self.cond_code}\t{self.operand.emit()}\n"
 
 
 class Label(AssemblyInstruction):
-    def __init__(self, identifier: str):
+    def __init__(self, identifier: int):
         self.identifier = identifier
 
-    def emit(self) -> str:
-        return f".L{self.identifier}:\n"
+    def emit(self, symbols: SymbolTable) -> str:
+        return f".L{symbols.name(self.identifier)}:\n"
 
 
 class AllocStack(AssemblyInstruction):
     def __init__(self, size: int):
         self.size = size
 
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return f"\tsubq\t${self.size}, %rsp\n"
 
 
 class Ret(AssemblyInstruction):
-    def emit(self) -> str:
+    def emit(self, symbols: SymbolTable) -> str:
         return "\tmovq\t%rbp, %rsp\n\tpopq\t%rbp\n\tret\n"
 
 
@@ -296,7 +297,7 @@ class Register(Operand):
 
 
 class Pseudo(Operand):
-    def __init__(self, identifier: str):
+    def __init__(self, identifier: int):
         self.identifier = identifier
 
     def emit(self) -> str:
@@ -311,132 +312,120 @@ class Stack(Operand):
         return f"{self.position}(%rbp)"
 
 
-def translate_program(program: tacky.Program) -> AssemblyProgram:
-    assembly_program = convert_to_assembly(program)
+def translate_program(program: tacky.Program, context: CompilationContext) -> AssemblyProgram:
+    assembly_program = convert_to_assembly(program, context)
     for function in assembly_program.functions:
         function.process_function()
         function.fixing_up_instructions()
     return assembly_program
 
 
-def convert_to_assembly(program: tacky.Program) -> AssemblyProgram:
-    functions = [translate_function(function) for function in program.functions]
-    return AssemblyProgram(functions)
-
-
-def translate_function(function: tacky.Function) -> AssemblyFunction:
-    instructions = []
-    for instruction in function.instructions:
-        instructions.extend(translate_instruction(instruction))
-    return AssemblyFunction(function.identifier, instructions)
-
-
-def translate_instruction(instruction: tacky.Instruction) -> List[AssemblyInstruction]:
-    if isinstance(instruction, tacky.Return):
-        return translate_return(instruction)
-    elif isinstance(instruction, tacky.Unary):
-        return translate_unary(instruction)
-    elif isinstance(instruction, tacky.Binary):
-        return translate_binary(instruction)
-    elif isinstance(instruction, tacky.Jump):
-        return translate_jump(instruction)
-    elif isinstance(instruction, tacky.JumpIfZero):
-        return translate_jump_if_zero(instruction)
-    elif isinstance(instruction, tacky.JumpIfNotZero):
-        return translate_jump_if_not_zero(instruction)
-    elif isinstance(instruction, tacky.Copy):
-        return translate_copy(instruction)
-    elif isinstance(instruction, tacky.Label):
-        return translate_label(instruction)
-    else:
-        raise SyntaxError(f'Unexpected instruction type: {type(instruction)}')
+def convert_to_assembly(program: tacky.Program, context: CompilationContext) -> AssemblyProgram:
+    translator = Translator(context.counts)
+    functions = [translator.translate_function(function) for function in program.functions]
+    return AssemblyProgram(functions, context.symbols)
 
 
-def translate_return(_return: tacky.Return) -> List[AssemblyInstruction]:
-    value = translate_value(_return.value)
-    return [Mov(value, Register('eax')),
-            Ret()]
+class Translator(Visitor):
+    def __init__(self, counts: Counter = None):
+        super().__init__(counts)
+        self.instructions = self.handlers('translate_')
+        self.values = self.handlers('value_')
 
+    def translate_function(self, function: tacky.Function) -> AssemblyFunction:
+        instructions = []
+        handlers = self.instructions
+        for instruction in function.instructions:
+            instructions.extend(handlers[type(instruction)](self, instruction))
+        return AssemblyFunction(function.identifier, instructions, self.counts)
 
-def translate_unary(unary: tacky.Unary) -> List[AssemblyInstruction]:
-    if unary.operator == common.UnaryOperator.NOT:
-        src_value = translate_value(unary.src)
-        dst_value = translate_value(unary.dst)
-        return [Cmp(Imm(0), src_value),
-                Mov(Imm(0), dst_value),
-                SetCC(translate_relational_operator(common.BinaryOperator.EQUAL_TO), dst_value)]
-    else:
-        src_value = translate_value(unary.src)
-        dst_value = translate_value(unary.dst)
-        return [Mov(src_value, dst_value),
-                Unary(unary.operator, dst_value)]
-
-
-def translate_binary(binary: tacky.Binary) -> List[AssemblyInstruction]:
-    src1_value = translate_value(binary.src1)
-    src2_value = translate_value(binary.src2)
-    dst_value = translate_value(binary.dst)
-    instructions = []
-
-    if binary.operator == common.BinaryOperator.DIVIDE:
-        instructions.extend([
-            Mov(src1_value, Register('eax')),
-            Cdq(),
-            Idiv(src2_value),
-            Mov(Register('eax'), dst_value)
-        ])
-    elif binary.operator == common.BinaryOperator.REMAINDER:
-        instructions.extend([
-            Mov(src1_value, Register('eax')),
-            Cdq(),
-            Idiv(src2_value),
-            Mov(Register('edx'), dst_value)
-        ])
-    elif binary.operator in common.relational_ops:
-        cond_code = translate_relational_operator(binary.operator)
-        instructions.extend([
-            Cmp(src2_value, src1_value),
-            Mov(Imm(0), dst_value),
-            SetCC(cond_code, dst_value),
-        ])
-    else:
-        instructions.extend([
-            Mov(src1_value, dst_value),
-            Binary(binary.operator, src2_value, dst_value)
-        ])
-    return instructions
-
-
-def translate_jump(jump: tacky.Jump) -> List[AssemblyInstruction]:
-    return [Jmp(jump.target)]
-
-
-def translate_jump_if_zero(jump: tacky.JumpIfZero) -> List[AssemblyInstruction]:
-    value = translate_value(jump.condition)
-    return [Cmp(Imm(0), value), JmpCC(translate_relational_operator(common.BinaryOperator.EQUAL_TO), jump.target)]
-
-
-def translate_jump_if_not_zero(jump: tacky.JumpIfNotZero) -> List[AssemblyInstruction]:
-    value = translate_value(jump.condition)
-    return [Cmp(Imm(0), value), JmpCC(translate_relational_operator(common.BinaryOperator.NOT_EQUAL_TO), jump.target)]
-
-
-def translate_copy(copy: tacky.Copy) -> List[AssemblyInstruction]:
-    src_value = translate_value(copy.src)
-    dst_value = translate_value(copy.dst)
-    return [Mov(src_value, dst_value)]
-
-
-def translate_label(label: tacky.Label) -> List[AssemblyInstruction]:
-    return [Label(label.identifier)]
+    def translate_instruction(self, instruction: tacky.Instruction) -> List[AssemblyInstruction]:
+        return self.instructions[type(instruction)](self, instruction)
 
+    def translate_generic(self, instruction: tacky.Instruction) -> List[AssemblyInstruction]:
+        raise SyntaxError(f'Unexpected instruction type: {type(instruction)}')
 
-def translate_value(value: tacky.Value) -> Operand:
-    if isinstance(value, tacky.Constant):
+    def translate_Return(self, _return: tacky.Return) -> List[AssemblyInstruction]:
+        value = self.translate_value(_return.value)
+        return [Mov(value, Register('eax')),
+                Ret()]
+
+    def translate_Unary(self, unary: tacky.Unary) -> List[AssemblyInstruction]:
+        if unary.operator == common.UnaryOperator.NOT:
+            src_value = self.translate_value(unary.src)
+            dst_value = self.translate_value(unary.dst)
+            return [Cmp(Imm(0), src_value),
+                    Mov(Imm(0), dst_value),
+                    SetCC(translate_relational_operator(common.BinaryOperator.EQUAL_TO), dst_value)]
+        else:
+            src_value = self.translate_value(unary.src)
+            dst_value = self.translate_value(unary.dst)
+            return [Mov(src_value, dst_value),
+                    Unary(unary.operator, dst_value)]
+
+    def translate_Binary(self, binary: tacky.Binary) -> List[AssemblyInstruction]:
+        src1_value = self.translate_value(binary.src1)
+        src2_value = self.translate_value(binary.src2)
+        dst_value = self.translate_value(binary.dst)
+        instructions = []
+
+        if binary.operator == common.BinaryOperator.DIVIDE:
+            instructions.extend([
+                Mov(src1_value, Register('eax')),
+                Cdq(),
+                Idiv(src2_value),
+                Mov(Register('eax'), dst_value)
+            ])
+        elif binary.operator == common.BinaryOperator.REMAINDER:
+            instructions.extend([
+                Mov(src1_value, Register('eax')),
+                Cdq(),
+                Idiv(src2_value),
+                Mov(Register('edx'), dst_value)
+            ])
+        elif binary.operator in common.relational_ops:
+            cond_code = translate_relational_operator(binary.operator)
+            instructions.extend([
+                Cmp(src2_value, src1_value),
+                Mov(Imm(0), dst_value),
+                SetCC(cond_code, dst_value),
+            ])
+        else:
+            instructions.extend([
+                Mov(src1_value, dst_value),
+                Binary(binary.operator, src2_value, dst_value)
+            ])
+        return instructions
+
+    def translate_Jump(self, jump: tacky.Jump) -> List[AssemblyInstruction]:
+        return [Jmp(jump.target)]
+
+    def translate_JumpIfZero(self, jump: tacky.JumpIfZero) -> List[AssemblyInstruction]:
+        value = self.translate_value(jump.condition)
+        return [Cmp(Imm(0), value), JmpCC(translate_relational_operator(common.BinaryOperator.EQUAL_TO), jump.target)]
+
+    def translate_JumpIfNotZero(self, jump: tacky.JumpIfNotZero) -> List[AssemblyInstruction]:
+        value = self.translate_value(jump.condition)
+        return [Cmp(Imm(0), value), JmpCC(translate_relational_operator(common.BinaryOperator.NOT_EQUAL_TO), jump.target)]
+
+    def translate_Copy(self, copy: tacky.Copy) -> List[AssemblyInstruction]:
+        src_value = self.translate_value(copy.src)
+        dst_value = self.translate_value(copy.dst)
+        return [Mov(src_value, dst_value)]
+
+    def translate_Label(self, label: tacky.Label) -> List[AssemblyInstruction]:
+        return [Label(label.identifier)]
+
+    def translate_value(self, value: tacky.Value) -> Operand:
+        return self.values[type(value)](self, value)
+
+    def value_Constant(self, value: tacky.Constant) -> Operand:
         return Imm(int(value.value))
-    elif isinstance(value, tacky.Variable):
+
+    def value_Variable(self, value: tacky.Variable) -> Operand:
         return Pseudo(value.identifier)
-    else:
+
+    def value_generic(self, value: tacky.Value) -> Operand:
         raise SyntaxError(f'Unexpected value type: {type(value)}')
 
 
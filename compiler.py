@@ -1,35 +1,110 @@
 #!/usr/bin/env python3
 
 import argparse
+import sys
+import time
+from collections import Counter
+import source
 import lexer
+import preprocessor
 import parser
+import arena
+import ast_cache
 import validation
+import folding
 import tacky
+import optimizer
 import codegen
+from utils import CompilationContext
+
+def select_function(program, name, symbols):
+    # Only the selected function's body is parsed; the others are brace-matched and dropped.
+    symbol = symbols.intern(name)
+    for function in program.functions:
+        if function.name == symbol:
+            function.block  # Parses the body, so --parse reports its errors.
+            return parser.Program([function])
+    raise SyntaxError(f"No function named '{name}'")
+
 
 def process(arguments):
+    counts = Counter() if arguments.visit_counts else None
     try:
-        with open(arguments.file, 'r') as file:
-            code = file.read()
+        with open(arguments.file, 'rb' if arguments.mmap else 'r') as file:
+            code = source.map_file(file) if arguments.mmap else file.read()
 
-            tokens = list(lexer.tokenize(code))
-            if arguments.lex:
-                return
+            macros = dict((define.split('=', 1) + ['1'])[:2] for define in arguments.defines)
+            cache = ast_cache.ASTCache(arguments.ast_cache) if arguments.ast_cache else None
+            cached = None
+            if cache is not None:
+                cache_key = cache.key(code, arguments.include_dirs, macros, arguments.function, arguments.file)
+                cached = cache.load(cache_key)
 
-            ast_program = parser.parse(tokens)
-            if arguments.parse:
-                return
+            if cached is not None:
+                ast_program, context, cached_lowering_seconds = cached
+                context.counts = counts
+                if arguments.lex or arguments.parse or arguments.validate:
+                    return
+            else:
+                start = time.perf_counter()
+                context = CompilationContext(counts=counts)
+                symbols = context.symbols
+                preprocessing = None
+                directive = '#' if isinstance(code, str) else b'#'
+                if arguments.include_dirs or arguments.defines or code.find(directive) != -1:
+                    preprocessing = preprocessor.Preprocessor(arguments.include_dirs, macros, symbols=symbols)
+                    tokens = preprocessing.preprocess(code, arguments.file)
+                elif arguments.function:
+                    tokens = lexer.lex(code, symbols=symbols)
+                else:
+                    tokens = lexer.tokenize(code, symbols)
+                if arguments.lex:
+                    for _ in tokens:
+                        pass
+                    return
 
-            validation.run(ast_program)
-            if arguments.validate:
-                return
+                if isinstance(tokens, lexer.TokenBuffer):
+                    token_stream = parser.TokenCursor(tokens, source.SourceMap(code))
+                else:
+                    token_stream = parser.TokenStream(tokens, source.SourceMap(code), symbols)
+                if arguments.function:
+                    ast_program = select_function(parser.parse(token_stream, lazy=True), arguments.function, symbols)
+                elif arguments.arena:
+                    ast_program = arena.parse(token_stream)
+                else:
+                    ast_program = parser.parse(token_stream)
+                if arguments.parse:
+                    return
+
+                validation.run(ast_program, context)
+                folding.run(ast_program, context)
+                if cache is not None:
+                    dependencies = preprocessing.included if preprocessing is not None else ()
+                    cache.store(cache_key, ast_program, context, dependencies, time.perf_counter() - start)
+                if arguments.validate:
+                    return
 
-            tacky_translator = tacky.Translator()
+            lowering_start = time.perf_counter()
+            if cached is not None and not arguments.arena:
+                # A hit loads the program as arena views. Tacky reads each node several times,
+                # which costs more through views than rebuilding node objects does.
+                ast_program = arena.to_program(ast_program)
+            tacky_translator = tacky.Translator(context)
             tacky_program = tacky_translator.translate(ast_program)
+            if cached is not None:
+                cache.count_lowering(cached_lowering_seconds, time.perf_counter() - lowering_start)
+            elif cache is not None:
+                cache.record_lowering(cache_key, time.perf_counter() - lowering_start)
+            optimizations = optimizer.Optimizations.all() if arguments.optimize else optimizer.Optimizations(
+                fold_constants=arguments.fold_constants,
+                eliminate_unreachable_code=arguments.eliminate_unreachable_code,
+                propagate_copies=arguments.propagate_copies,
+                eliminate_dead_stores=arguments.eliminate_dead_stores)
+            optimizer.optimize(tacky_program, optimizations, context)
             if arguments.tacky:
                 return
 
-            assembly_program = codegen.translate_program(tacky_program)
+            assembly_program = codegen.translate_program(tacky_program, context)
             if arguments.codegen:
                 return
 
@@ -38,10 +113,34 @@ def process(arguments):
     except SyntaxError as e:
         print(f"An error occurred: {e}")
         return -1
+    except RecursionError:
+        # The passes over the AST recurse once per level of nesting.
+        print("An error occurred: Program nests too deeply")
+        return -1
+    finally:
+        if counts is not None:
+            for name, count in sorted(counts.items(), key=lambda item: -item[1]):
+                print(f'{count:>10} {name}', file=sys.stderr)
+        if arguments.ast_cache_stats:
+            print(' '.join(f'{name}={value:.6f}' if isinstance(value, float) else f'{name}={value}'
+                           for name, value in ast_cache.statistics.items()), file=sys.stderr)
 
 if __name__ == '__main__':
     arg_parser = argparse.ArgumentParser(description="Tokenize a C-like file.")
     arg_parser.add_argument('file', help="The path to the file to tokenize")
+    arg_parser.add_argument('--mmap', action='store_true', help="Memory-map the input and lex the mapped bytes instead of reading it into a string")
+    arg_parser.add_argument('-I', dest='include_dirs', action='append', default=[], help="Add a directory to search for #include files")
+    arg_parser.add_argument('-D', dest='defines', action='append', default=[], help="Define an object-like macro as NAME or NAME=VALUE")
+    arg_parser.add_argument('--arena', action='store_true', help="Store the AST in a struct-of-arrays arena instead of one object per node")
+    arg_parser.add_argument('--ast-cache', metavar='DIR', help="Cache validated ASTs in DIR, keyed by a hash of the source, and reuse them when it is unchanged")
+    arg_parser.add_argument('--ast-cache-stats', action='store_true', help="Print AST cache hits, misses and load times to stderr")
+    arg_parser.add_argument('--visit-counts', action='store_true', help="Print how many nodes each handler of each pass visited to stderr")
+    arg_parser.add_argument('--function', metavar='NAME', help="Compile only the function NAME; the bodies of the other functions are not parsed")
+    arg_parser.add_argument('--fold-constants', action='store_true', help="Evaluate TACKY instructions whose operands are constants at compile time")
+    arg_parser.add_argument('--eliminate-unreachable-code', action='store_true', help="Remove TACKY code control never reaches, jumps to the next instruction and unused labels")
+    arg_parser.add_argument('--propagate-copies', action='store_true', help="Replace uses of TACKY variables with the values copied into them")
+    arg_parser.add_argument('--eliminate-dead-stores', action='store_true', help="Remove TACKY instructions whose result is never read")
+    arg_parser.add_argument('--optimize', action='store_true', help="Run all TACKY optimizations")
     arg_parser.add_argument('--lex', action='store_true', help="Directs the compiler to run the lexer, but stop before parsing")
     arg_parser.add_argument('--parse', action='store_true', help="Directs the compiler to run the parser, but stop before validation")
     arg_parser.add_argument('--validate', action='store_true', help="Directs the compiler to run the validation, but stop before tacky")
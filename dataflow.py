@@ -0,0 +1,178 @@
+from collections import defaultdict, deque
+from typing import Dict, List, Set
+
+import cfg
+import tacky
+
+
+def value_key(value: tacky.Value):
+    # A hashable stand-in for a TACKY value: constants with the same int value are equal.
+    if type(value) is tacky.Constant:
+        return tacky.Constant, int(value.value)
+    return tacky.Variable, value.identifier
+
+
+class ReachingCopies:
+    # For each block, the Copy instructions that have been executed on every path to its
+    # start without their source or destination being written since: the destination still
+    # holds the source's value there. Sets of copies are ints used as bitsets over the
+    # distinct copies in the function, so that merging paths is a single &.
+    def __init__(self, graph: cfg.Graph):
+        self.graph = graph
+        self.copies = []
+        self.bits: Dict[tuple, int] = {}
+        # The copies that read or write each variable, and those that write it.
+        self.mentions = defaultdict(int)
+        self.writes = defaultdict(int)
+        for block in graph.blocks():
+            for instruction in block.instructions:
+                if type(instruction) is tacky.Copy:
+                    self.add_copy(instruction)
+        self.incoming: Dict[int, int] = {}
+        self.outgoing: Dict[int, int] = {}
+        self.solve()
+
+    def add_copy(self, copy: tacky.Copy):
+        key = (value_key(copy.src), copy.dst.identifier)
+        if key in self.bits:
+            return
+        bit = self.bits[key] = 1 << len(self.copies)
+        self.copies.append(copy)
+        self.mentions[copy.dst.identifier] |= bit
+        self.writes[copy.dst.identifier] |= bit
+        if type(copy.src) is tacky.Variable:
+            self.mentions[copy.src.identifier] |= bit
+
+    def transfer(self, instruction: tacky.Instruction, reaching: int) -> int:
+        # The copies that reach the point after instruction, given those that reach it.
+        kind = type(instruction)
+        if kind is tacky.Copy:
+            if self.is_redundant(instruction, reaching):
+                return reaching
+            dst = instruction.dst.identifier
+            return reaching & ~self.mentions[dst] | self.bits[(value_key(instruction.src), dst)]
+        if kind is tacky.Unary or kind is tacky.Binary:
+            return reaching & ~self.mentions[instruction.dst.identifier]
+        return reaching
+
+    def is_redundant(self, copy: tacky.Copy, reaching: int) -> bool:
+        # Whether the destination of copy already holds the value of its source.
+        bits = self.bits
+        src = copy.src
+        if reaching & bits.get((value_key(src), copy.dst.identifier), 0):
+            return True
+        return type(src) is tacky.Variable and bool(
+            reaching & bits.get(((tacky.Variable, copy.dst.identifier), src.identifier), 0))
+
+    def source(self, variable: tacky.Variable, reaching: int) -> tacky.Value:
+        # The value variable holds a copy of, or variable itself. A copy to a variable kills
+        # every other copy to it, so at most one reaches.
+        copies = reaching & self.writes.get(variable.identifier, 0)
+        if not copies:
+            return variable
+        return self.copies[copies.bit_length() - 1].src
+
+    def meet(self, block: cfg.BasicBlock) -> int:
+        outgoing = self.outgoing
+        reaching = -1
+        for predecessor in block.predecessors:
+            reaching &= outgoing[predecessor]
+        return reaching if block.predecessors else 0
+
+    def solve(self):
+        graph = self.graph
+        everything = (1 << len(self.copies)) - 1
+        outgoing = self.outgoing
+        outgoing[cfg.ENTRY] = 0
+        for block in graph.blocks():
+            outgoing[block.id] = everything
+        worklist = deque(graph.blocks())
+        queued = {block.id for block in worklist}
+        while worklist:
+            block = worklist.popleft()
+            queued.discard(block.id)
+            reaching = self.incoming[block.id] = self.meet(block) & everything
+            for instruction in block.instructions:
+                reaching = self.transfer(instruction, reaching)
+            if reaching != outgoing[block.id]:
+                outgoing[block.id] = reaching
+                for successor in block.successors:
+                    if successor != cfg.EXIT and successor not in queued:
+                        queued.add(successor)
+                        worklist.append(graph.block(successor))
+
+
+class Liveness:
+    # For each block, the variables whose current value may still be read: those live at its
+    # start and at its end. live_after gives the sets between the instructions of a block,
+    # which is what dead store elimination and register allocation need. Sets of variables
+    # are int bitsets, with the bit of each variable in bits.
+    def __init__(self, graph: cfg.Graph):
+        self.graph = graph
+        self.bits: Dict[int, int] = {}
+        self.live_in: Dict[int, int] = {}
+        self.live_out: Dict[int, int] = {}
+        self.solve()
+
+    def bit(self, variable: tacky.Variable) -> int:
+        bit = self.bits.get(variable.identifier)
+        if bit is None:
+            bit = self.bits[variable.identifier] = 1 << len(self.bits)
+        return bit
+
+    def uses(self, value: tacky.Value) -> int:
+        return self.bit(value) if type(value) is tacky.Variable else 0
+
+    def transfer(self, instruction: tacky.Instruction, live: int) -> int:
+        # The variables live before instruction, given those live after it.
+        kind = type(instruction)
+        if kind is tacky.Copy or kind is tacky.Unary:
+            return live & ~self.bit(instruction.dst) | self.uses(instruction.src)
+        if kind is tacky.Binary:
+            return live & ~self.bit(instruction.dst) | self.uses(instruction.src1) | self.uses(instruction.src2)
+        if kind is tacky.JumpIfZero or kind is tacky.JumpIfNotZero:
+            return live | self.uses(instruction.condition)
+        if kind is tacky.Return:
+            return live | self.uses(instruction.value)
+        return live
+
+    def meet(self, block: cfg.BasicBlock) -> int:
+        live_in = self.live_in
+        live = 0
+        for successor in block.successors:
+            live |= live_in.get(successor, 0)
+        return live
+
+    def solve(self):
+        # A backward analysis: blocks are visited from the last, and a change at the start of
+        # a block is passed on to its predecessors.
+        graph = self.graph
+        live_in = self.live_in
+        live_in[cfg.EXIT] = 0
+        worklist = deque(reversed(list(graph.blocks())))
+        queued = {block.id for block in worklist}
+        while worklist:
+            block = worklist.popleft()
+            queued.discard(block.id)
+            live = self.live_out[block.id] = self.meet(block)
+            for instruction in reversed(block.instructions):
+                live = self.transfer(instruction, live)
+            if live != live_in.get(block.id):
+                live_in[block.id] = live
+                for predecessor in block.predecessors:
+                    if predecessor != cfg.ENTRY and predecessor not in queued:
+                        queued.add(predecessor)
+                        worklist.append(graph.block(predecessor))
+
+    def live_after(self, block: cfg.BasicBlock) -> List[int]:
+        # The variables live after each instruction of block, in order.
+        live = self.live_out[block.id]
+        after = [0] * len(block.instructions)
+        for index in range(len(block.instructions) - 1, -1, -1):
+            after[index] = live
+            live = self.transfer(block.instructions[index], live)
+        return after
+
+    def variables(self, live: int) -> Set[int]:
+        # The identifiers of the variables in a set.
+        return {identifier for identifier, bit in self.bits.items() if live & bit}
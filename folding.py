@@ -0,0 +1,244 @@
+import parser
+from common import BinaryOperator, UnaryOperator
+from visitor import Visitor
+
+# Evaluates integer constant expressions with the semantics of the code the compiler
+# generates for them: 32-bit two's complement arithmetic that wraps on overflow, shift
+# counts taken modulo 32 as x86 does, and a logical right shift, which is what shrl
+# does. Division by zero and INT_MIN / -1 trap at run time, so they are not folded.
+
+INT_MIN = -(1 << 31)
+
+
+def wrap(value: int) -> int:
+    value &= 0xFFFFFFFF
+    return value - (1 << 32) if value & 0x80000000 else value
+
+
+def divide(left: int, right: int):
+    if right == 0 or (left == INT_MIN and right == -1):
+        return None
+    # C division truncates towards zero.
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+
+def remainder(left: int, right: int):
+    quotient = divide(left, right)
+    return None if quotient is None else left - right * quotient
+
+
+binary_operations = {
+    BinaryOperator.ADD: lambda left, right: wrap(left + right),
+    BinaryOperator.SUBTRACT: lambda left, right: wrap(left - right),
+    BinaryOperator.MULTIPLY: lambda left, right: wrap(left * right),
+    BinaryOperator.DIVIDE: divide,
+    BinaryOperator.REMAINDER: remainder,
+    BinaryOperator.BITWISE_LEFTSHIFT: lambda left, right: wrap(left << (right & 31)),
+    BinaryOperator.BITWISE_RIGHTSHIFT: lambda left, right: wrap((left & 0xFFFFFFFF) >> (right & 31)),
+    BinaryOperator.BITWISE_AND: lambda left, right: left & right,
+    BinaryOperator.BITWISE_OR: lambda left, right: left | right,
+    BinaryOperator.BITWISE_XOR: lambda left, right: left ^ right,
+    BinaryOperator.LOGICAL_AND: lambda left, right: int(left != 0 and right != 0),
+    BinaryOperator.LOGICAL_OR: lambda left, right: int(left != 0 or right != 0),
+    BinaryOperator.EQUAL_TO: lambda left, right: int(left == right),
+    BinaryOperator.NOT_EQUAL_TO: lambda left, right: int(left != right),
+    BinaryOperator.LESS_THAN: lambda left, right: int(left < right),
+    BinaryOperator.LESS_THAN_OR_EQUAL: lambda left, right: int(left <= right),
+    BinaryOperator.GREATER_THAN: lambda left, right: int(left > right),
+    BinaryOperator.GREATER_THAN_OR_EQUAL_TO: lambda left, right: int(left >= right),
+}
+
+unary_operations = {
+    UnaryOperator.NEGATE: lambda value: wrap(-value),
+    UnaryOperator.COMPLEMENT: lambda value: wrap(~value),
+    UnaryOperator.NOT: lambda value: int(value == 0),
+}
+
+
+def binary_value(operator: BinaryOperator, left: int, right: int):
+    # The value of left operator right, or None if it cannot be computed at compile time.
+    return binary_operations[operator](left, right)
+
+
+def unary_value(operator: UnaryOperator, value: int):
+    operation = unary_operations.get(operator)
+    return None if operation is None else operation(value)
+
+
+def short_circuit(operator: BinaryOperator, left: int):
+    # The value of left && right or left || right when left alone decides it.
+    if operator == BinaryOperator.LOGICAL_AND and left == 0:
+        return 0
+    if operator == BinaryOperator.LOGICAL_OR and left != 0:
+        return 1
+    return None
+
+
+class ConstantFolder(Visitor):
+    # Replaces every subexpression whose value is known at compile time with a Constant, in
+    # place. fold_* handlers fold the subexpressions of a node and return its own value, or
+    # None if it is not constant; the caller replaces it. Top-level expression statements
+    # are left as they are, since a block's items cannot be replaced in an arena. Handlers
+    # dispatch on their operands directly rather than through fold, so that each level of
+    # an expression costs one Python frame.
+    def __init__(self, counts=None):
+        super().__init__(counts)
+        self.statements = self.handlers('walk_')
+        self.expressions = self.handlers('fold_')
+
+    def run(self, program: parser.Program):
+        for function in program.functions:
+            self.walk_block(function.block)
+
+    def walk_block(self, block: parser.Block):
+        statements = self.statements
+        for item in block.block_items:
+            statements[type(item)](self, item)
+
+    def walk(self, statement: parser.Statement):
+        self.statements[type(statement)](self, statement)
+
+    def fold(self, exp: parser.Expression):
+        return self.expressions[type(exp)](self, exp)
+
+    def folded(self, exp: parser.Expression):
+        # exp, or a Constant in its place if it has a value.
+        value = self.fold(exp)
+        if value is None or isinstance(exp, parser.Constant):
+            return exp
+        return parser.Constant(str(value))
+
+    def walk_VarDecl(self, declaration: parser.VarDecl):
+        if declaration.init is not None:
+            declaration.init = self.folded(declaration.init)
+
+    def walk_Return(self, statement: parser.Return):
+        statement.exp = self.folded(statement.exp)
+
+    def walk_If(self, statement: parser.If):
+        statement.condition = self.folded(statement.condition)
+        self.walk(statement.then)
+        if statement.else_ is not None:
+            self.walk(statement.else_)
+
+    def walk_Expression(self, statement: parser.Expression):
+        self.fold(statement)
+
+    def walk_While(self, statement: parser.While):
+        statement.condition = self.folded(statement.condition)
+        self.walk(statement.body)
+
+    walk_DoWhile = walk_While
+
+    def walk_For(self, statement: parser.For):
+        for_init = statement.for_init
+        if isinstance(for_init, parser.InitDeclaration):
+            self.walk_VarDecl(for_init.declaration)
+        elif isinstance(for_init, parser.InitExpression):
+            for_init.expression = self.folded(for_init.expression)
+        if statement.condition is not None:
+            statement.condition = self.folded(statement.condition)
+        if statement.post is not None:
+            statement.post = self.folded(statement.post)
+        self.walk(statement.body)
+
+    def walk_Switch(self, statement: parser.Switch):
+        statement.expr = self.folded(statement.expr)
+        self.walk(statement.body)
+
+    def walk_Label(self, statement: parser.Label):
+        self.walk(statement.statement)
+
+    # Case labels were folded by validation.
+    walk_Case = walk_Default = walk_Label
+
+    def walk_Compound(self, statement: parser.Compound):
+        self.walk_block(statement.block)
+
+    def walk_generic(self, statement: parser.Statement):
+        pass
+
+    def fold_Constant(self, exp: parser.Constant):
+        return wrap(int(exp.value))
+
+    def fold_Var(self, exp: parser.Var):
+        return None
+
+    def fold_Unary(self, exp: parser.Unary):
+        value = self.expressions[type(exp.inner)](self, exp.inner)
+        if value is None:
+            return None
+        if exp.operator not in unary_operations:
+            # Increments and decrements apply to variables, which are never constant.
+            return None
+        return unary_value(exp.operator, value)
+
+    def fold_Binary(self, exp: parser.Binary):
+        left = self.expressions[type(exp.left)](self, exp.left)
+        if left is not None:
+            value = short_circuit(exp.operator, left)
+            if value is not None:
+                return value
+        right = self.expressions[type(exp.right)](self, exp.right)
+        if left is not None and right is not None:
+            value = binary_value(exp.operator, left, right)
+            if value is not None:
+                return value
+        # The whole expression is not constant, but either side may be.
+        if left is not None and not isinstance(exp.left, parser.Constant):
+            exp.left = parser.Constant(str(left))
+        if right is not None and not isinstance(exp.right, parser.Constant):
+            exp.right = parser.Constant(str(right))
+        return None
+
+    def fold_Assignment(self, exp: parser.Assignment):
+        value = self.expressions[type(exp.right)](self, exp.right)
+        if value is not None and not isinstance(exp.right, parser.Constant):
+            exp.right = parser.Constant(str(value))
+        return None
+
+    def fold_Conditional(self, exp: parser.Conditional):
+        condition = self.expressions[type(exp.condition)](self, exp.condition)
+        then = self.expressions[type(exp.then)](self, exp.then)
+        else_ = self.expressions[type(exp.else_)](self, exp.else_)
+        if condition is not None:
+            value = then if condition != 0 else else_
+            if value is not None:
+                return value
+        for name, value in (('condition', condition), ('then', then), ('else_', else_)):
+            if value is not None and not isinstance(getattr(exp, name), parser.Constant):
+                setattr(exp, name, parser.Constant(str(value)))
+        return None
+
+    def fold_generic(self, exp: parser.Expression):
+        raise SyntaxError("Invalid expression!")
+
+
+def constant_value(exp: parser.Expression):
+    # The value of a constant expression such as a case label, without changing it, or None
+    # if it is not constant.
+    if isinstance(exp, parser.Constant):
+        return wrap(int(exp.value))
+    if isinstance(exp, parser.Unary):
+        value = constant_value(exp.inner)
+        return None if value is None else unary_value(exp.operator, value)
+    if isinstance(exp, parser.Binary):
+        left = constant_value(exp.left)
+        if left is None:
+            return None
+        value = short_circuit(exp.operator, left)
+        if value is not None:
+            return value
+        right = constant_value(exp.right)
+        return None if right is None else binary_value(exp.operator, left, right)
+    if isinstance(exp, parser.Conditional):
+        condition = constant_value(exp.condition)
+        if condition is None:
+            return None
+        return constant_value(exp.then if condition != 0 else exp.else_)
+    return None
+
+
+def run(program: parser.Program, context):
+    ConstantFolder(context.counts).run(program)
@@ -0,0 +1,124 @@
+import bisect
+from collections import namedtuple
+
+import lexer
+import parser
+
+# The source is kept as one segment per top-level function, holding the text from the end
+# of the previous function to the end of this one, plus a final segment with the trailing
+# text. Each segment has its own token buffer with offsets relative to the segment, so an
+# edit only re-lexes and re-parses the segment it falls into.
+#
+# Function nodes are shared between successive results. Passes that rewrite the AST in
+# place, such as validation, must run on a copy. With lazy set, functions are only
+# brace-matched and their bodies parsed on first access, see parser.LazyFunction.
+Segment = namedtuple('Segment', 'text tokens')
+
+
+class FrontEndResult:
+    def __init__(self, segments, starts, program, lazy=False):
+        self.segments = segments
+        self.starts = starts
+        self.program = program
+        self.lazy = lazy
+
+    @property
+    def source(self):
+        return ''.join(segment.text for segment in self.segments)
+
+
+def parse(code, lazy=False):
+    tokens = lexer.lex(code)
+    cursor = parser.TokenCursor(tokens)
+    functions = []
+    segments = []
+    starts = []
+    base = 0
+    first = 0
+    while cursor:
+        functions.append(parser.skim_function(cursor) if lazy else parser.parse_function(cursor))
+        end = tokens.ends[cursor.position - 1]
+        segments.append(make_segment(code[base:end], tokens, first, cursor.position, base))
+        starts.append(base)
+        base = end
+        first = cursor.position
+    segments.append(Segment(code[base:], lexer.TokenBuffer(code[base:])))
+    starts.append(base)
+    return FrontEndResult(segments, starts, parser.Program(functions), lazy)
+
+
+def make_segment(text, tokens, first, last, base):
+    segment_tokens = lexer.TokenBuffer(text)
+    segment_tokens.extend(zip(tokens.kinds[first:last],
+                              (start - base for start in tokens.starts[first:last]),
+                              (end - base for end in tokens.ends[first:last])))
+    return Segment(text, segment_tokens)
+
+
+def update(previous, offset, deleted, inserted):
+    index = bisect.bisect_right(previous.starts, offset) - 1
+    segment = previous.segments[index]
+    local_offset = offset - previous.starts[index]
+    if local_offset + deleted > len(segment.text):
+        return reparse(previous, offset, deleted, inserted)
+
+    text = segment.text[:local_offset] + inserted + segment.text[local_offset + deleted:]
+    functions = previous.program.functions
+    try:
+        tokens = relex(segment.tokens, text, local_offset, deleted, len(inserted))
+        if index == len(functions):
+            if len(tokens):
+                return reparse(previous, offset, deleted, inserted)
+        else:
+            cursor = parser.TokenCursor(tokens)
+            function = parser.skim_function(cursor) if previous.lazy else parser.parse_function(cursor)
+            if cursor:
+                return reparse(previous, offset, deleted, inserted)
+            functions = functions[:index] + [function] + functions[index + 1:]
+    except SyntaxError:
+        return reparse(previous, offset, deleted, inserted)
+
+    delta = len(inserted) - deleted
+    segments = previous.segments[:index] + [Segment(text, tokens)] + previous.segments[index + 1:]
+    starts = previous.starts[:index + 1] + [start + delta for start in previous.starts[index + 1:]]
+    return FrontEndResult(segments, starts, parser.Program(functions), previous.lazy)
+
+
+def reparse(previous, offset, deleted, inserted):
+    code = previous.source
+    return parse(code[:offset] + inserted + code[offset + deleted:], previous.lazy)
+
+
+def relex(tokens, text, offset, deleted, inserted):
+    kinds = tokens.kinds
+    starts = tokens.starts
+    ends = tokens.ends
+    delta = inserted - deleted
+    edit_end = offset + inserted
+
+    # Tokens that end before the edit cannot change, so scanning resumes at the end of the
+    # last of them.
+    first = bisect.bisect_left(ends, offset)
+    result = lexer.TokenBuffer(text)
+    result.kinds.extend(kinds[:first])
+    result.starts.extend(starts[:first])
+    result.ends.extend(ends[:first])
+
+    old = bisect.bisect_left(ends, offset + deleted)
+    count = len(kinds)
+    for kind, start, end in lexer.scan(text, ends[first - 1] if first else 0):
+        result.kinds.append(kind)
+        result.starts.append(start)
+        result.ends.append(end)
+        if end < edit_end:
+            continue
+        while old < count and ends[old] + delta < end:
+            old += 1
+        if old < count and ends[old] + delta == end:
+            # Past the edit, scanning from the same position as before yields the same
+            # tokens, so the rest of the old buffer is reused with shifted offsets.
+            result.kinds.extend(kinds[old + 1:])
+            result.starts.extend(start + delta for start in starts[old + 1:])
+            result.ends.extend(end + delta for end in ends[old + 1:])
+            break
+    return result
@@ -1,4 +1,7 @@
 import re
+from array import array
+
+from source import SourceMap
 
 
 INT = 'INT'
@@ -76,28 +79,35 @@ LESS_THAN_OR_EQUAL_TO_OP = 'LESS_THAN_OR_EQUAL_TO_OP'
 GREATER_THAN_OR_EQUAL_TO_OP = 'GREATER_THAN_OR_EQUAL_TO_OP'
 
 
-token_specification = [
-    (INT, r'int\b'),
-    (VOID, r'void\b'),
-    (RETURN, r'return\b'),
-    (IF, r'if\b'),
-    (ELSE, r'else\b'),
-    (GOTO, r'goto\b'),
-    (DO, r'do\b'),
-    (WHILE, r'while\b'),
-    (FOR, r'for\b'),
-    (BREAK, r'break\b'),
-    (CONTINUE, r'continue\b'),
-    (SWITCH, r'switch\b'),
-    (CASE, r'case\b'),
-    (DEFAULT, r'default\b'),
+keywords = {
+    'int': INT,
+    'void': VOID,
+    'return': RETURN,
+    'if': IF,
+    'else': ELSE,
+    'goto': GOTO,
+    'do': DO,
+    'while': WHILE,
+    'for': FOR,
+    'break': BREAK,
+    'continue': CONTINUE,
+    'switch': SWITCH,
+    'case': CASE,
+    'default': DEFAULT,
+}
+
+
+trivia_specification = [
+    (WHITESPACE, r'\s+'),
+    (COMMENT, r'//[^\n]*|/\*[\s\S]*?\*/'),
+    (PRECOMPILER_DIRECTIVE, r'#[^\n]*'),
+]
+
 
+token_specification = [
     (IDENTIFIER, r'[a-zA-Z_]\w*\b'),
     (CONSTANT, r'\b\d+\b'),
-    (COMMENT, r'//.*|/\*[\s\S]*?\*/'),
-    (PRECOMPILER_DIRECTIVE, r'#.*'),
-    (WHITESPACE, r'\s+'),
-    
+
     (TERNARY_OP, r'\?'),
 
     (OPEN_PAREN, r'\('),
@@ -115,7 +125,7 @@ token_specification = [
     (MULTIPLICATION_OP, r'\*'),
 
     (DIVISION_ASSIGNMENT_OP, r'/='),
-    (DIVISION_OP, r'/'),
+    (DIVISION_OP, r'/(?!\*)'),
 
     (ADDITION_ASSIGNMENT_OP, r'\+='),
     (INCREMENT_OP, r'\+\+'),
@@ -159,34 +169,158 @@ token_specification = [
 ]
 
 
-token_regex = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in token_specification)
-get_token = re.compile(token_regex).match
-
-
-ignored_tokens = {WHITESPACE, COMMENT, PRECOMPILER_DIRECTIVE}
-
-
-def tokenize(code):
+trivia_regex = '(?:' + '|'.join(pattern for _, pattern in trivia_specification) + ')*'
+
+# The preprocessor needs to see directives, so in directive mode they are scanned as tokens.
+directive_trivia_regex = '(?:' + '|'.join(pattern for name, pattern in trivia_specification
+                                          if name != PRECOMPILER_DIRECTIVE) + ')*'
+directive_specification = token_specification + [(PRECOMPILER_DIRECTIVE, dict(trivia_specification)[PRECOMPILER_DIRECTIVE])]
+
+
+def token_regex(trivia, specification):
+    # The trivia prefix is wrapped in a lookahead and re-matched with a backreference so
+    # that it behaves atomically: a failed token match can never backtrack into a comment.
+    # The last group matches the character no token matches, or the end of the input, so
+    # that the scan always matches where the previous token ended: a failing search would
+    # retry from every later position, which makes a bad character cost quadratic time.
+    return (f'(?=({trivia}))\\1(?:' + '|'.join(f'({pattern})' for _, pattern in specification)
+            + r'|([\s\S]|\Z))')
+
+
+scanner_patterns = {
+    False: (token_regex(trivia_regex, token_specification), trivia_regex),
+    True: (token_regex(directive_trivia_regex, directive_specification), trivia_regex),
+}
+
+# Text is scanned as str; bytes (including memory-mapped files) are scanned with the same
+# patterns compiled for bytes, which restricts identifiers and whitespace to ASCII. Each
+# scanner also gives the number of its last group, which stops the scan.
+scanners = {
+    (binary, directives): (re.compile(pattern.encode() if binary else pattern).finditer,
+                           re.compile(trivia.encode() if binary else trivia).match,
+                           re.compile(pattern).groups)
+    for directives, (pattern, trivia) in scanner_patterns.items() for binary in (False, True)
+}
+
+
+# Every token type gets a small integer kind so that tokens can be stored in typed arrays.
+token_types = list(keywords.values()) + [name for name, _ in directive_specification]
+token_kinds = {type_: kind for kind, type_ in enumerate(token_types)}
+
+# Tokens other than identifiers and constants always have the same text: their pattern
+# without escapes and trailing lookahead.
+spellings = {type_: keyword for keyword, type_ in keywords.items()}
+spellings.update((name, re.sub(r'\\(.)', r'\1', re.sub(r'\(\?!.*\)$', '', pattern)))
+                 for name, pattern in token_specification if name not in {IDENTIFIER, CONSTANT})
+kind_spellings = [spellings.get(type_) for type_ in token_types]
+
+# Group 1 is the trivia prefix, token groups follow in specification order.
+group_types = [None, None] + [name for name, _ in directive_specification]
+group_kinds = [None, None] + [token_kinds[name] for name, _ in directive_specification]
+group_spellings = [None, None] + [spellings.get(name) for name, _ in directive_specification]
+keyword_kinds = {keyword: token_kinds[type_] for keyword, type_ in keywords.items()}
+IDENTIFIER_KIND = token_kinds[IDENTIFIER]
+DIRECTIVE_KIND = token_kinds[PRECOMPILER_DIRECTIVE]
+OPEN_BRACE_KIND = token_kinds[OPEN_BRACE]
+CLOSE_BRACE_KIND = token_kinds[CLOSE_BRACE]
+
+
+class TokenBuffer:
+    def __init__(self, source, symbols=None):
+        self.source = source
+        self.symbols = symbols
+        self.binary = not isinstance(source, str)
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def extend(self, tokens):
+        append_kind = self.kinds.append
+        append_start = self.starts.append
+        append_end = self.ends.append
+        for kind, start, end in tokens:
+            append_kind(kind)
+            append_start(start)
+            append_end(end)
+
+    def __getitem__(self, index):
+        return token_types[self.kinds[index]], self.value(index), self.starts[index], self.ends[index]
+
+    def type(self, index):
+        return token_types[self.kinds[index]]
+
+    def value(self, index):
+        spelling = kind_spellings[self.kinds[index]]
+        if spelling is not None:
+            return spelling
+        value = self.source[self.starts[index]:self.ends[index]]
+        if self.binary:
+            value = value.decode()
+        if self.symbols is not None and self.kinds[index] == IDENTIFIER_KIND:
+            return self.symbols.intern(value)
+        return value
+
+
+def tokenize(code, symbols=None):
+    intern = symbols.intern if symbols is not None else None
+    binary = not isinstance(code, str)
+    scan_tokens, _, end = scanners[binary, False]
     pos = 0
-    line = 1
-    col = 1
-    while pos < len(code):
-        match = get_token(code, pos)
-        if match is not None:
-            type_ = match.lastgroup
-            value = match.group(type_)
-            if type_ not in ignored_tokens:
-                yield type_, value
-            pos = match.end()
-            # Update line and column numbers
-            lines = value.split('\n')
-            if len(lines) > 1:
-                line += len(lines) - 1
-                col = len(lines[-1]) + 1
-            else:
-                col += len(value)
-        else:
-            line_number = code.count('\n', 0, pos) + 1
-            line_start = code.rfind('\n', 0, pos)
-            column_number = pos - line_start
-            raise SyntaxError(f'Unexpected character at line {line_number}, column {column_number}: {code[pos]}')
+    for match in scan_tokens(code):
+        index = match.lastindex
+        if index == end:
+            break
+        start = match.start(index)
+        pos = match.end()
+        type_ = group_types[index]
+        value = group_spellings[index]
+        if value is None:
+            value = code[start:pos]
+            if binary:
+                value = value.decode()
+            if type_ == IDENTIFIER:
+                type_ = keywords.get(value, IDENTIFIER)
+                if type_ == IDENTIFIER and intern is not None:
+                    value = intern(value)
+        yield type_, value, start, pos
+    check_end(code, pos)
+
+
+def scan(code, pos=0, directives=False):
+    binary = not isinstance(code, str)
+    scan_tokens, _, end = scanners[binary, directives]
+    for match in scan_tokens(code, pos):
+        index = match.lastindex
+        if index == end:
+            break
+        start = match.start(index)
+        pos = match.end()
+        kind = group_kinds[index]
+        if kind == IDENTIFIER_KIND:
+            text = code[start:pos]
+            if binary:
+                text = text.decode()
+            kind = keyword_kinds.get(text, IDENTIFIER_KIND)
+        yield kind, start, pos
+    check_end(code, pos)
+
+
+def lex(code, directives=False, symbols=None):
+    tokens = TokenBuffer(code, symbols)
+    tokens.extend(scan(code, directives=directives))
+    return tokens
+
+
+def check_end(code, pos):
+    binary = not isinstance(code, str)
+    _, get_trivia, _ = scanners[binary, False]
+    pos = get_trivia(code, pos).end()
+    if pos < len(code):
+        location = SourceMap(code).describe(pos)
+        character = code[pos:pos + 1]
+        if binary:
+            character = character.decode(errors='replace')
+        raise SyntaxError(f'Unexpected character at {location}: {character}')
@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from typing import List
+
+import cfg
+import dataflow
+import folding
+import tacky
+from common import BinaryOperator
+from utils import CompilationContext
+from visitor import Visitor
+
+
+@dataclass
+class Optimizations:
+    fold_constants: bool = False
+    eliminate_unreachable_code: bool = False
+    propagate_copies: bool = False
+    eliminate_dead_stores: bool = False
+
+    @classmethod
+    def all(cls):
+        return cls(fold_constants=True, eliminate_unreachable_code=True, propagate_copies=True,
+                   eliminate_dead_stores=True)
+
+
+def constant_value(value: tacky.Value):
+    # The int a TACKY value holds, or None if it is a variable.
+    if type(value) is tacky.Constant:
+        return folding.wrap(int(value.value))
+    return None
+
+
+class ConstantFolder(Visitor):
+    # Evaluates the instructions whose operands are all constants. fold_* handlers return
+    # the instruction to keep in place of the one given, or None to drop it.
+    def __init__(self, counts=None):
+        super().__init__(counts)
+        self.instructions = self.handlers('fold_')
+
+    def run(self, instructions: List[tacky.Instruction]) -> List[tacky.Instruction]:
+        handlers = self.instructions
+        folded = []
+        for instruction in instructions:
+            instruction = handlers[type(instruction)](self, instruction)
+            if instruction is not None:
+                folded.append(instruction)
+        return folded
+
+    def fold_Unary(self, instruction: tacky.Unary):
+        src = constant_value(instruction.src)
+        if src is not None:
+            value = folding.unary_value(instruction.operator, src)
+            if value is not None:
+                return tacky.Copy(tacky.Constant(value), instruction.dst)
+        return instruction
+
+    def fold_Binary(self, instruction: tacky.Binary):
+        src1 = constant_value(instruction.src1)
+        src2 = constant_value(instruction.src2)
+        if src1 is not None and src2 is not None:
+            # Division by zero and INT_MIN / -1 are kept so they still trap at run time.
+            value = folding.binary_value(instruction.operator, src1, src2)
+            if value is not None:
+                return tacky.Copy(tacky.Constant(value), instruction.dst)
+        return instruction
+
+    def fold_JumpIfZero(self, instruction: tacky.JumpIfZero):
+        condition = constant_value(instruction.condition)
+        if condition is None:
+            return instruction
+        return tacky.Jump(instruction.target) if condition == 0 else None
+
+    def fold_JumpIfNotZero(self, instruction: tacky.JumpIfNotZero):
+        condition = constant_value(instruction.condition)
+        if condition is None:
+            return instruction
+        return tacky.Jump(instruction.target) if condition != 0 else None
+
+    def fold_generic(self, instruction: tacky.Instruction):
+        return instruction
+
+
+def eliminate_unreachable_code(graph: cfg.Graph):
+    # Removes the blocks control never reaches, then the jumps to the block that follows
+    # anyway, then the labels that are left with nothing jumping to them.
+    reachable = graph.reachable()
+    for block in list(graph.blocks()):
+        if block.id not in reachable:
+            graph.remove_block(block.id)
+    for block in graph.blocks():
+        instructions = block.instructions
+        if instructions and type(instructions[-1]) in cfg.JUMPS and block.successors == {block.next}:
+            instructions.pop()
+            graph.update_edges(block.id)
+    for block in graph.blocks():
+        instructions = block.instructions
+        # A block whose only predecessor is the one before it is entered by falling through.
+        if instructions and type(instructions[0]) is tacky.Label and block.predecessors == {block.previous}:
+            graph.remove_label(block.id)
+
+
+class CopyPropagator(Visitor):
+    # Replaces each variable an instruction reads with the value it was copied from, where
+    # that copy reaches the instruction, and drops copies whose destination already holds
+    # their source. The copies left behind are often dead. propagate_* handlers return the
+    # rewritten instruction, or None to drop it.
+    def __init__(self, counts=None):
+        super().__init__(counts)
+        self.instructions = self.handlers('propagate_')
+        self.copies = None
+        self.reaching = 0
+
+    def run(self, graph: cfg.Graph):
+        copies = self.copies = dataflow.ReachingCopies(graph)
+        handlers = self.instructions
+        for block in graph.blocks():
+            self.reaching = copies.incoming[block.id]
+            rewritten = []
+            for instruction in block.instructions:
+                replacement = handlers[type(instruction)](self, instruction)
+                if replacement is not None:
+                    rewritten.append(replacement)
+                self.reaching = copies.transfer(instruction, self.reaching)
+            block.instructions = rewritten
+
+    def value(self, value: tacky.Value) -> tacky.Value:
+        if type(value) is tacky.Variable:
+            return self.copies.source(value, self.reaching)
+        return value
+
+    def propagate_Copy(self, instruction: tacky.Copy):
+        if self.copies.is_redundant(instruction, self.reaching):
+            return None
+        src = self.value(instruction.src)
+        if src == instruction.dst:
+            return None
+        return instruction if src is instruction.src else tacky.Copy(src, instruction.dst)
+
+    def propagate_Unary(self, instruction: tacky.Unary):
+        src = self.value(instruction.src)
+        return instruction if src is instruction.src else tacky.Unary(instruction.operator, src, instruction.dst)
+
+    def propagate_Binary(self, instruction: tacky.Binary):
+        src1 = self.value(instruction.src1)
+        src2 = self.value(instruction.src2)
+        if src1 is instruction.src1 and src2 is instruction.src2:
+            return instruction
+        return tacky.Binary(instruction.operator, src1, src2, instruction.dst)
+
+    def propagate_JumpIfZero(self, instruction: tacky.JumpIfZero):
+        condition = self.value(instruction.condition)
+        return instruction if condition is instruction.condition else tacky.JumpIfZero(condition, instruction.target)
+
+    def propagate_JumpIfNotZero(self, instruction: tacky.JumpIfNotZero):
+        condition = self.value(instruction.condition)
+        if condition is instruction.condition:
+            return instruction
+        return tacky.JumpIfNotZero(condition, instruction.target)
+
+    def propagate_Return(self, instruction: tacky.Return):
+        value = self.value(instruction.value)
+        return instruction if value is instruction.value else tacky.Return(value)
+
+    def propagate_generic(self, instruction: tacky.Instruction):
+        return instruction
+
+
+STORES = {tacky.Copy, tacky.Unary, tacky.Binary}
+
+
+def may_trap(instruction: tacky.Instruction) -> bool:
+    # Division and remainder trap when the divisor is 0, or -1 with INT_MIN, so they are
+    # kept even if their result is never used, unless the divisor rules that out.
+    if type(instruction) is not tacky.Binary:
+        return False
+    if instruction.operator not in (BinaryOperator.DIVIDE, BinaryOperator.REMAINDER):
+        return False
+    return constant_value(instruction.src2) in (None, 0, -1)
+
+
+def eliminate_dead_stores(graph: cfg.Graph):
+    # Removes the instructions that write a variable nobody reads before it is written again.
+    liveness = dataflow.Liveness(graph)
+    for block in graph.blocks():
+        instructions = block.instructions
+        live_after = liveness.live_after(block)
+        block.instructions = [
+            instruction for instruction, live in zip(instructions, live_after)
+            if type(instruction) not in STORES or live & liveness.bit(instruction.dst) or may_trap(instruction)]
+
+
+def optimize_function(function: tacky.Function, optimizations: Optimizations, context: CompilationContext):
+    # Runs the enabled passes until none of them changes the function any more, since each
+    # can expose work for the others.
+    while True:
+        instructions = function.instructions
+        if optimizations.fold_constants:
+            function.instructions = ConstantFolder(context.counts).run(function.instructions)
+        if (optimizations.eliminate_unreachable_code or optimizations.propagate_copies
+                or optimizations.eliminate_dead_stores):
+            graph = cfg.build(function)
+            if optimizations.eliminate_unreachable_code:
+                eliminate_unreachable_code(graph)
+            if optimizations.propagate_copies:
+                CopyPropagator(context.counts).run(graph)
+            if optimizations.eliminate_dead_stores:
+                eliminate_dead_stores(graph)
+            cfg.rebuild(function, graph)
+        if function.instructions == instructions:
+            return
+
+
+def optimize(program: tacky.Program, optimizations: Optimizations, context: CompilationContext):
+    for function in program.functions:
+        optimize_function(function, optimizations, context)
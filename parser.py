@@ -1,695 +1,750 @@
 import lexer
+from collections import deque, namedtuple
 from dataclasses import dataclass
+from functools import partial
+from types import SimpleNamespace
 from typing import List, Optional, Union
 
 from common import UnaryOperator, BinaryOperator
+from source import SourceMap
 
-precedence = {
-    lexer.MULTIPLICATION_OP: 50,
-    lexer.DIVISION_OP: 50,
-    lexer.MODULO_OP: 50,
-    lexer.ADDITION_OP: 45,
-    lexer.SUBTRACTION_OP: 45,
-    lexer.BITWISE_LEFT_SHIFT_OP: 40,
-    lexer.BITWISE_RIGHT_SHIFT_OP: 40,
-    lexer.LESS_THAN_OP: 38,
-    lexer.LESS_THAN_OR_EQUAL_TO_OP: 38,
-    lexer.GREATER_THAN_OP: 38,
-    lexer.GREATER_THAN_OR_EQUAL_TO_OP: 38,
-    lexer.EQUAL_TO_OP: 37,
-    lexer.NOT_EQUAL_TO_OP: 37,
-    lexer.BITWISE_AND_OP: 30,
-    lexer.BITWISE_XOR_OP: 25,
-    lexer.BITWISE_OR_OP: 20,
-    lexer.LOGICAL_AND_OP: 15,
-    lexer.LOGICAL_OR_OP: 10,
-    lexer.TERNARY_OP: 3,
-    lexer.ASSIGNMENT_OP: 1,
-    lexer.ADDITION_ASSIGNMENT_OP: 1,
-    lexer.SUBTRACTION_ASSIGNMENT_OP: 1,
-    lexer.MULTIPLICATION_ASSIGNMENT_OP: 1,
-    lexer.DIVISION_ASSIGNMENT_OP: 1,
-    lexer.REMAINDER_ASSIGNMENT_OP: 1,
-    lexer.BITWISE_OR_ASSIGNMENT_OP: 1,
-    lexer.BITWISE_AND_ASSIGNMENT_OP: 1,
-    lexer.BITWISE_XOR_ASSIGNMENT_OP: 1,
-    lexer.BITWISE_LEFT_SHIFT_ASSIGNMENT_OP: 1,
-    lexer.BITWISE_RIGHT_SHIFT_ASSIGNMENT_OP: 1
-}
-
-
-binary_ops = {
-    lexer.ADDITION_OP,
-    lexer.SUBTRACTION_OP,
-    lexer.MODULO_OP,
-    lexer.DIVISION_OP,
-    lexer.MULTIPLICATION_OP,
-    lexer.BITWISE_LEFT_SHIFT_OP,
-    lexer.BITWISE_RIGHT_SHIFT_OP,
-    lexer.BITWISE_AND_OP,
-    lexer.BITWISE_XOR_OP,
-    lexer.BITWISE_OR_OP,
-    lexer.LESS_THAN_OP,
-    lexer.LESS_THAN_OR_EQUAL_TO_OP,
-    lexer.GREATER_THAN_OP,
-    lexer.GREATER_THAN_OR_EQUAL_TO_OP,
-    lexer.EQUAL_TO_OP,
-    lexer.NOT_EQUAL_TO_OP,
-    lexer.LOGICAL_AND_OP,
-    lexer.LOGICAL_OR_OP,
-    lexer.ASSIGNMENT_OP,
-    lexer.ADDITION_ASSIGNMENT_OP,
-    lexer.SUBTRACTION_ASSIGNMENT_OP,
-    lexer.MULTIPLICATION_ASSIGNMENT_OP,
-    lexer.DIVISION_ASSIGNMENT_OP,
-    lexer.REMAINDER_ASSIGNMENT_OP,
-    lexer.BITWISE_OR_ASSIGNMENT_OP,
-    lexer.BITWISE_AND_ASSIGNMENT_OP,
-    lexer.BITWISE_XOR_ASSIGNMENT_OP,
-    lexer.BITWISE_LEFT_SHIFT_ASSIGNMENT_OP,
-    lexer.BITWISE_RIGHT_SHIFT_ASSIGNMENT_OP,
-    lexer.TERNARY_OP
-}
+# Names are symbol ids when the tokens come from a lexer given a SymbolTable, else strings.
+Symbol = Union[int, str]
 
-
-assignment_ops = {
-    lexer.ASSIGNMENT_OP,
-    lexer.ADDITION_ASSIGNMENT_OP,
-    lexer.SUBTRACTION_ASSIGNMENT_OP,
-    lexer.MULTIPLICATION_ASSIGNMENT_OP,
-    lexer.DIVISION_ASSIGNMENT_OP,
-    lexer.REMAINDER_ASSIGNMENT_OP,
-    lexer.BITWISE_OR_ASSIGNMENT_OP,
-    lexer.BITWISE_AND_ASSIGNMENT_OP,
-    lexer.BITWISE_XOR_ASSIGNMENT_OP,
-    lexer.BITWISE_LEFT_SHIFT_ASSIGNMENT_OP,
-    lexer.BITWISE_RIGHT_SHIFT_ASSIGNMENT_OP
-}
+class Node:
+    __slots__ = ()
 
 
-prefix_ops = {
-    lexer.BITWISE_COMPLEMENT_OP,
-    lexer.SUBTRACTION_OP,
-    lexer.LOGICAL_NOT_OP,
-    lexer.INCREMENT_OP,
-    lexer.DECREMENT_OP
-}
+@dataclass(slots=True)
+class Program(Node):
+    functions: List['Function']
 
 
-postfix_ops = {
-    lexer.INCREMENT_OP,
-    lexer.DECREMENT_OP
-}
+@dataclass(slots=True)
+class Function(Node):
+    name: Symbol
+    block: 'Block'
 
 
-class Node:
-    pass
+class LazyFunction(Function):
+    # A function whose body has only been brace-matched. open_body makes a token stream over
+    # the body, which is parsed the first time block is read.
+    __slots__ = ('open_body',)
 
+    def __init__(self, name, open_body):
+        self.name = name
+        self.open_body = open_body
 
-@dataclass
-class Program(Node):
-    functions: List['Function']
+    @property
+    def parsed(self):
+        return self.open_body is None
 
+    @property
+    def block(self):
+        if self.open_body is not None:
+            Function.block.__set__(self, parse_block(self.open_body()))
+            self.open_body = None
+        return Function.block.__get__(self)
 
-@dataclass
-class Function(Node):
-    name: str
-    block: 'Block'
+    @block.setter
+    def block(self, block):
+        Function.block.__set__(self, block)
+        self.open_body = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Block(Node):
     block_items: List[Union['VarDecl', 'Statement']]
 
 
-@dataclass
+@dataclass(slots=True)
 class VarDecl(Node):
-    name: str
+    name: Symbol
     init: Optional['Expression'] = None
 
 
 class ForInit(Node):
-    pass
+    __slots__ = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class InitDeclaration(ForInit):
     declaration: 'VarDecl'
 
 
-@dataclass
+@dataclass(slots=True)
 class InitExpression(ForInit):
     expression: 'Expression'
 
 
 class Statement(Node):
-    pass
+    __slots__ = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class Return(Statement):
     exp: 'Expression'
 
 
-@dataclass
+@dataclass(slots=True)
 class If(Statement):
     condition: 'Expression'
     then: 'Statement'
     else_: 'Statement'
 
 
-@dataclass
+@dataclass(slots=True)
 class Goto(Statement):
-    label: str
+    label: Symbol
 
 
-@dataclass
+@dataclass(slots=True)
 class Label(Statement):
-    label: str
+    label: Symbol
     statement: 'Statement'
 
 
-@dataclass
+@dataclass(slots=True)
 class Compound(Statement):
     block: 'Block'
 
 
 class Null(Statement):
-    pass
+    __slots__ = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class Break(Statement):
-    label: Optional[str] = None
+    label: Optional[Symbol] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Continue(Statement):
-    label: Optional[str] = None
+    label: Optional[Symbol] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class While(Statement):
     condition: 'Expression'
     body: 'Statement'
-    label: Optional[str] = None
+    label: Optional[Symbol] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class DoWhile(Statement):
     condition: 'Expression'
     body: 'Statement'
-    label: Optional[str] = None
+    label: Optional[Symbol] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class For(Statement):
     for_init: 'ForInit'
     condition: 'Expression'
     post: 'Expression'
     body: 'Statement'
-    label: Optional[str] = None
+    label: Optional[Symbol] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Switch(Statement):
     expr: 'Expression'
     body: 'Compound'
-    label: Optional[str] = None
+    label: Optional[Symbol] = None
 
 
 class LabeledStatement(Statement):
-    pass
+    __slots__ = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class Case(LabeledStatement):
     const: 'Constant'
     statement: 'Statement'
 
 
-@dataclass
+@dataclass(slots=True)
 class Default(LabeledStatement):
     statement: 'Statement'
 
 
 class Expression(Statement):
-    pass
+    __slots__ = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class Constant(Expression):
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Var(Expression):
-    identifier: str
+    identifier: Symbol
 
 
-@dataclass
+@dataclass(slots=True)
 class Unary(Expression):
     operator: 'UnaryOperator'
     inner: 'Expression'
 
 
-@dataclass
+@dataclass(slots=True)
 class Binary(Expression):
     operator: 'BinaryOperator'
     left: 'Expression'
     right: 'Expression'
 
 
-@dataclass
+@dataclass(slots=True)
 class Assignment(Expression):
     left: 'Expression'
     right: 'Expression'
 
 
-@dataclass
+@dataclass(slots=True)
 class Conditional(Expression):
     condition: 'Expression'
     then: 'Expression'
     else_: 'Expression'
 
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Node):
-    name: str
+    name: Symbol
+
+
+node_classes = [Program, Function, Block, VarDecl, InitDeclaration, InitExpression, Return, If, Goto, Label,
+                Compound, Null, Break, Continue, While, DoWhile, For, Switch, Case, Default, Constant, Var,
+                Unary, Binary, Assignment, Conditional]
 
+# The parser builds nodes through the constructors in tokens.nodes. These build the object
+# AST; arena.ArenaBuilder provides the same names and stores nodes in arrays instead.
+object_nodes = SimpleNamespace(**{cls.__name__: cls for cls in node_classes})
 
-def parse(tokens):
+
+def parse(tokens, nodes=None, lazy=False):
+    # With lazy set, function bodies are skimmed and parsed on first access, see
+    # LazyFunction. Syntax errors inside a body are only reported then.
+    if isinstance(tokens, lexer.TokenBuffer):
+        tokens = TokenCursor(tokens)
+    elif not isinstance(tokens, TokenStream):
+        tokens = TokenStream(tokens)
+    if nodes is not None:
+        if lazy:
+            raise ValueError('Lazy parsing builds object nodes only')
+        tokens.nodes = nodes
     functions = []
     while tokens:
-        func = parse_function(tokens)
+        func = skim_function(tokens) if lazy else parse_function(tokens)
         functions.append(func)
-    return Program(functions)
+    return tokens.nodes.Program(functions)
 
 
 def parse_function(tokens):
-    expect(lexer.INT, tokens)
-    name = expect(lexer.IDENTIFIER, tokens)[1]
-    expect(lexer.OPEN_PAREN, tokens)
-    expect(lexer.VOID, tokens)
-    expect(lexer.CLOSE_PAREN, tokens)
+    tokens.expect(lexer.INT)
+    name = tokens.expect(lexer.IDENTIFIER)[1]
+    tokens.expect(lexer.OPEN_PAREN)
+    tokens.expect(lexer.VOID)
+    tokens.expect(lexer.CLOSE_PAREN)
     block = parse_block(tokens)
-    return Function(name, block)
+    return tokens.nodes.Function(name, block)
+
+
+def skim_function(tokens):
+    tokens.expect(lexer.INT)
+    name = tokens.expect(lexer.IDENTIFIER)[1]
+    tokens.expect(lexer.OPEN_PAREN)
+    tokens.expect(lexer.VOID)
+    tokens.expect(lexer.CLOSE_PAREN)
+    return LazyFunction(name, tokens.skim_block())
 
 
 def parse_block(tokens):
-    expect(lexer.OPEN_BRACE, tokens)
+    tokens.expect(lexer.OPEN_BRACE)
     block_items = []
-    next_token = peek(tokens)
-    while next_token[0] != lexer.CLOSE_BRACE:
+    next_type = tokens.peek_type()
+    while next_type != lexer.CLOSE_BRACE:
         next_block_item = parse_block_item(tokens)
         block_items.append(next_block_item)
-        next_token = peek(tokens)
-    pop(tokens)
-    return Block(block_items)
+        next_type = tokens.peek_type()
+    tokens.pop()
+    return tokens.nodes.Block(block_items)
 
 
 def parse_block_item(tokens):
-    next_token = peek(tokens)
-    if next_token[0] == lexer.INT:
+    next_type = tokens.peek_type()
+    if next_type == lexer.INT:
         return parse_declaration(tokens)
     else:
         return parse_statement(tokens)
 
 
 def parse_statement(tokens):
-    next_token = peek(tokens)
-    if next_token[0] == lexer.RETURN:
-        return parse_return(tokens)
-    elif next_token[0] == lexer.IF:
-        return parse_if(tokens)
-    elif next_token[0] == lexer.GOTO:
-        return parse_goto(tokens)
-    elif next_token[0] == lexer.BREAK:
-        return parse_break(tokens)
-    elif next_token[0] == lexer.CONTINUE:
-        return parse_continue(tokens)
-    elif next_token[0] == lexer.WHILE:
-        return parse_while(tokens)
-    elif next_token[0] == lexer.DO:
-        return parse_do(tokens)
-    elif next_token[0] == lexer.FOR:
-        return parse_for(tokens)
-    elif next_token[0] == lexer.SWITCH:
-        return parse_switch(tokens)
-    elif next_token[0] == lexer.CASE:
-        return parse_case_label(tokens)
-    elif next_token[0] == lexer.DEFAULT:
-        return parse_default_label(tokens)
-    elif next_token[0] == lexer.OPEN_BRACE:
-        return parse_compound(tokens)
-    elif next_token[0] == lexer.SEMICOLON:
-        pop(tokens)
-        return Null()
-    elif next_token[0] == lexer.IDENTIFIER and peek(tokens, 1)[0] == lexer.COLON:
+    return token_table.get(tokens.peek_type(), NO_RULE).statement(tokens)
+
+
+def parse_null(tokens):
+    tokens.pop()
+    return tokens.nodes.Null()
+
+
+def parse_identifier_statement(tokens):
+    if tokens.peek_type(1) == lexer.COLON:
         return parse_label(tokens)
-    else:
-        exp = parse_expression(tokens, 0)
-        expect(lexer.SEMICOLON, tokens)
-        return exp
+    return parse_expression_statement(tokens)
+
+
+def parse_expression_statement(tokens):
+    exp = parse_expression(tokens, 0)
+    tokens.expect(lexer.SEMICOLON)
+    return exp
 
 
 def parse_label(tokens):
-    label = expect(lexer.IDENTIFIER, tokens)[1]
-    expect(lexer.COLON, tokens)
+    label = tokens.expect(lexer.IDENTIFIER)[1]
+    tokens.expect(lexer.COLON)
     statement = parse_statement(tokens)
-    return Label(label, statement)
+    return tokens.nodes.Label(label, statement)
 
 
 def parse_switch(tokens):
-    expect(lexer.SWITCH, tokens)
-    expect(lexer.OPEN_PAREN, tokens)
+    tokens.expect(lexer.SWITCH)
+    tokens.expect(lexer.OPEN_PAREN)
     expr = parse_expression(tokens, 0)
-    expect(lexer.CLOSE_PAREN, tokens)
+    tokens.expect(lexer.CLOSE_PAREN)
     body = parse_statement(tokens)
-    return Switch(expr, body)
+    return tokens.nodes.Switch(expr, body)
+
+
+case_terminators = {lexer.CASE, lexer.DEFAULT, lexer.CLOSE_BRACE}
 
 
 def parse_case_label(tokens):
-    expect(lexer.CASE, tokens)
+    tokens.expect(lexer.CASE)
+    # Validation checks that the label is a constant expression and folds it.
     c = parse_expression(tokens, 0)
-    if not isinstance(c, Constant):
-        raise SyntaxError("Case label must be constant")
-    expect(lexer.COLON, tokens)
+    tokens.expect(lexer.COLON)
     statements = []
     while True:
-        next_token = peek(tokens)
-        if next_token[0] in {lexer.CASE, lexer.DEFAULT, lexer.CLOSE_BRACE}:
+        if tokens.peek_type() in case_terminators:
             break
         statements.append(parse_statement(tokens))
-    return Case(c, Compound(Block(statements)))
+    return tokens.nodes.Case(c, tokens.nodes.Compound(tokens.nodes.Block(statements)))
 
 
 def parse_default_label(tokens):
-    expect(lexer.DEFAULT, tokens)
-    expect(lexer.COLON, tokens)
+    tokens.expect(lexer.DEFAULT)
+    tokens.expect(lexer.COLON)
     statements = []
     while True:
-        next_token = peek(tokens)
-        if next_token[0] in {lexer.CASE, lexer.DEFAULT, lexer.CLOSE_BRACE}:
+        if tokens.peek_type() in case_terminators:
             break
         statements.append(parse_statement(tokens))
-    return Default(Compound(Block(statements)))
+    return tokens.nodes.Default(tokens.nodes.Compound(tokens.nodes.Block(statements)))
 
 
 def parse_compound(tokens):
     block = parse_block(tokens)
-    return Compound(block)
+    return tokens.nodes.Compound(block)
 
 
 def parse_declaration(tokens):
-    expect(lexer.INT, tokens)
-    identifier = expect(lexer.IDENTIFIER, tokens)[1]
-    next_token = peek(tokens)
+    tokens.expect(lexer.INT)
+    identifier = tokens.expect(lexer.IDENTIFIER)[1]
+    next_type = tokens.peek_type()
     exp = None
-    if next_token[0] == lexer.ASSIGNMENT_OP:
-        pop(tokens)
+    if next_type == lexer.ASSIGNMENT_OP:
+        tokens.pop()
         exp = parse_expression(tokens, 0)
-    expect(lexer.SEMICOLON, tokens)
-    return VarDecl(identifier, exp)
+    tokens.expect(lexer.SEMICOLON)
+    return tokens.nodes.VarDecl(identifier, exp)
 
 
 def parse_return(tokens):
-    expect(lexer.RETURN, tokens)
+    tokens.expect(lexer.RETURN)
     val = parse_expression(tokens, 0)
-    expect(lexer.SEMICOLON, tokens)
-    return Return(val)
+    tokens.expect(lexer.SEMICOLON)
+    return tokens.nodes.Return(val)
 
 
 def parse_if(tokens):
-    expect(lexer.IF, tokens)
-    expect(lexer.OPEN_PAREN, tokens)
+    tokens.expect(lexer.IF)
+    tokens.expect(lexer.OPEN_PAREN)
     condition = parse_expression(tokens, 0)
-    expect(lexer.CLOSE_PAREN, tokens)
+    tokens.expect(lexer.CLOSE_PAREN)
     then = parse_statement(tokens)
     else_ = None
-    next_token = peek(tokens)
-    if next_token[0] == lexer.ELSE:
-        pop(tokens)
+    next_type = tokens.peek_type()
+    if next_type == lexer.ELSE:
+        tokens.pop()
         else_ = parse_statement(tokens)
-    return If(condition, then, else_)
+    return tokens.nodes.If(condition, then, else_)
 
 
 def parse_goto(tokens):
-    expect(lexer.GOTO, tokens)
-    label = expect(lexer.IDENTIFIER, tokens)[1]
-    expect(lexer.SEMICOLON, tokens)
-    return Goto(label)
+    tokens.expect(lexer.GOTO)
+    label = tokens.expect(lexer.IDENTIFIER)[1]
+    tokens.expect(lexer.SEMICOLON)
+    return tokens.nodes.Goto(label)
 
 
 def parse_break(tokens):
-    expect(lexer.BREAK, tokens)
-    expect(lexer.SEMICOLON, tokens)
-    return Break()
+    tokens.expect(lexer.BREAK)
+    tokens.expect(lexer.SEMICOLON)
+    return tokens.nodes.Break()
 
 
 def parse_continue(tokens):
-    expect(lexer.CONTINUE, tokens)
-    expect(lexer.SEMICOLON, tokens)
-    return Continue()
+    tokens.expect(lexer.CONTINUE)
+    tokens.expect(lexer.SEMICOLON)
+    return tokens.nodes.Continue()
 
 
 def parse_while(tokens):
-    expect(lexer.WHILE, tokens)
-    expect(lexer.OPEN_PAREN, tokens)
+    tokens.expect(lexer.WHILE)
+    tokens.expect(lexer.OPEN_PAREN)
     exp = parse_expression(tokens, 0)
-    expect(lexer.CLOSE_PAREN, tokens)
+    tokens.expect(lexer.CLOSE_PAREN)
     statement = parse_statement(tokens)
-    return While(exp, statement)
+    return tokens.nodes.While(exp, statement)
 
 
 def parse_do(tokens):
-    expect(lexer.DO, tokens)
+    tokens.expect(lexer.DO)
     statement = parse_statement(tokens)
-    expect(lexer.WHILE, tokens)
-    expect(lexer.OPEN_PAREN, tokens)
+    tokens.expect(lexer.WHILE)
+    tokens.expect(lexer.OPEN_PAREN)
     exp = parse_expression(tokens, 0)
-    expect(lexer.CLOSE_PAREN, tokens)
-    expect(lexer.SEMICOLON, tokens)
-    return DoWhile(exp, statement)
+    tokens.expect(lexer.CLOSE_PAREN)
+    tokens.expect(lexer.SEMICOLON)
+    return tokens.nodes.DoWhile(exp, statement)
 
 
 def parse_for(tokens):
-    expect(lexer.FOR, tokens)
-    expect(lexer.OPEN_PAREN, tokens)
+    tokens.expect(lexer.FOR)
+    tokens.expect(lexer.OPEN_PAREN)
 
     for_init = parse_for_init(tokens)
 
     cond = None
-    next_token = peek(tokens)
-    if next_token[0] != lexer.SEMICOLON:
+    next_type = tokens.peek_type()
+    if next_type != lexer.SEMICOLON:
         cond = parse_expression(tokens, 0)
-    expect(lexer.SEMICOLON, tokens)
+    tokens.expect(lexer.SEMICOLON)
 
     post = None
-    next_token = peek(tokens)
-    if next_token[0] != lexer.CLOSE_PAREN:
+    next_type = tokens.peek_type()
+    if next_type != lexer.CLOSE_PAREN:
         post = parse_expression(tokens, 0)
 
-    expect(lexer.CLOSE_PAREN, tokens)
+    tokens.expect(lexer.CLOSE_PAREN)
 
     body = parse_statement(tokens)
-    return For(for_init, cond, post, body)
+    return tokens.nodes.For(for_init, cond, post, body)
 
 
 def parse_for_init(tokens):
     for_init = None
-    next_token = peek(tokens)
-    if next_token[0] == lexer.INT:
+    next_type = tokens.peek_type()
+    if next_type == lexer.INT:
         decl = parse_declaration(tokens)
-        for_init = InitDeclaration(decl)
+        for_init = tokens.nodes.InitDeclaration(decl)
     else:
-        if next_token[0] == lexer.SEMICOLON:
-            pop(tokens)
+        if next_type == lexer.SEMICOLON:
+            tokens.pop()
         else:
             expr = parse_expression(tokens, 0)
-            for_init = InitExpression(expr)
-            expect(lexer.SEMICOLON, tokens)
+            for_init = tokens.nodes.InitExpression(expr)
+            tokens.expect(lexer.SEMICOLON)
     return for_init
 
 
-def parse_expression(tokens, min_precedence):
-    left = parse_prefix_expression(tokens)
-    next_token = peek(tokens)
-    while next_token[0] in binary_ops and precedence[next_token[0]] >= min_precedence:
-        if next_token[0] in assignment_ops:
-            pop(tokens)
-            right = parse_expression(tokens, precedence[next_token[0]])
-            if next_token[0] != lexer.ASSIGNMENT_OP:
-                right = Binary(parse_assignment_operator(next_token[0]), left, right)
-            left = Assignment(left, right)
-        elif next_token[0] == lexer.TERNARY_OP:
-            middle = parse_conditional_middle(tokens)
-            right = parse_expression(tokens, precedence[next_token[0]])
-            left = Conditional(left, middle, right)
-        else:
-            bin_op = parse_binary_operator(tokens)
-            right = parse_expression(tokens, precedence[next_token[0]] + 1)
-            left = Binary(bin_op, left, right)
-        next_token = peek(tokens)
-    return parse_postfix(tokens, left)
-
-
-def parse_conditional_middle(tokens):
-    expect(lexer.TERNARY_OP, tokens)
-    exp = parse_expression(tokens, 0)
-    expect(lexer.COLON, tokens)
-    return exp
-
-
-def parse_prefix_expression(tokens):
-    next_token = peek(tokens)
-    if next_token[0] in prefix_ops:
-        return parse_prefix(tokens)
-    else:
-        return parse_postfix(tokens, parse_factor(tokens))
-
-
-def parse_factor(tokens):
-    next_token = peek(tokens)
-    if next_token[0] == lexer.CONSTANT:
-        return parse_constant(tokens)
-    elif next_token[0] == lexer.OPEN_PAREN:
-        pop(tokens)  # Consume '('
-        inner_exp = parse_expression(tokens, 0)
-        expect(lexer.CLOSE_PAREN, tokens)
-        return inner_exp
-    else:
-        identifier = expect(lexer.IDENTIFIER, tokens)[1]
-        return Var(identifier)
-
-
-def parse_prefix(tokens):
-    operator = parse_unary_operator(tokens)
-    inner_exp = parse_prefix_expression(tokens)
-    return Unary(operator, inner_exp)
-
-
-def parse_postfix(tokens, left):
-    next_token = peek(tokens)
-    while next_token[0] in postfix_ops:
-        operator = pop(tokens)[0]
-        if operator == lexer.INCREMENT_OP:
-            left = Unary(UnaryOperator.POST_INCREMENT, left)
-        elif operator == lexer.DECREMENT_OP:
-            left = Unary(UnaryOperator.POST_DECREMENT, left)
-        next_token = peek(tokens)
-    return left
-
-
-def parse_constant(tokens) -> Constant:
-    value = expect(lexer.CONSTANT, tokens)[1]
-    return Constant(value)
-
-
-def parse_unary(tokens) -> Unary:
-    operator = parse_unary_operator(tokens)
-    inner_exp = parse_factor(tokens)
-    return Unary(operator, inner_exp)
-
-
-def parse_assignment_operator(op) -> BinaryOperator:
-    match op:
-        case lexer.ADDITION_ASSIGNMENT_OP:
-            return BinaryOperator.ADD
-        case lexer.SUBTRACTION_ASSIGNMENT_OP:
-            return BinaryOperator.SUBTRACT
-        case lexer.MULTIPLICATION_ASSIGNMENT_OP:
-            return BinaryOperator.MULTIPLY
-        case lexer.DIVISION_ASSIGNMENT_OP:
-            return BinaryOperator.DIVIDE
-        case lexer.REMAINDER_ASSIGNMENT_OP:
-            return BinaryOperator.REMAINDER
-        case lexer.BITWISE_OR_ASSIGNMENT_OP:
-            return BinaryOperator.BITWISE_OR
-        case lexer.BITWISE_AND_ASSIGNMENT_OP:
-            return BinaryOperator.BITWISE_AND
-        case lexer.BITWISE_XOR_ASSIGNMENT_OP:
-            return BinaryOperator.BITWISE_XOR
-        case lexer.BITWISE_LEFT_SHIFT_ASSIGNMENT_OP:
-            return BinaryOperator.BITWISE_LEFTSHIFT
-        case lexer.BITWISE_RIGHT_SHIFT_ASSIGNMENT_OP:
-            return BinaryOperator.BITWISE_RIGHTSHIFT
-
-
-def parse_unary_operator(tokens) -> UnaryOperator:
-    op = pop(tokens)
-    if op[0] == lexer.BITWISE_COMPLEMENT_OP:
-        return UnaryOperator.COMPLEMENT
-    elif op[0] == lexer.SUBTRACTION_OP:
-        return UnaryOperator.NEGATE
-    elif op[0] == lexer.LOGICAL_NOT_OP:
-        return UnaryOperator.NOT
-    elif op[0] == lexer.INCREMENT_OP:
-        return UnaryOperator.PRE_INCREMENT
-    elif op[0] == lexer.DECREMENT_OP:
-        return UnaryOperator.PRE_DECREMENT
-    else:
-        raise SyntaxError(f"Unexpected operator: {op}")
-
-
-def parse_binary_operator(tokens) -> BinaryOperator:
-    op = pop(tokens)
-    if op[0] == lexer.SUBTRACTION_OP:
-        return BinaryOperator.SUBTRACT
-    elif op[0] == lexer.ADDITION_OP:
-        return BinaryOperator.ADD
-    elif op[0] == lexer.DIVISION_OP:
-        return BinaryOperator.DIVIDE
-    elif op[0] == lexer.MODULO_OP:
-        return BinaryOperator.REMAINDER
-    elif op[0] == lexer.MULTIPLICATION_OP:
-        return BinaryOperator.MULTIPLY
-    elif op[0] == lexer.BITWISE_LEFT_SHIFT_OP:
-        return BinaryOperator.BITWISE_LEFTSHIFT
-    elif op[0] == lexer.BITWISE_RIGHT_SHIFT_OP:
-        return BinaryOperator.BITWISE_RIGHTSHIFT
-    elif op[0] == lexer.BITWISE_AND_OP:
-        return BinaryOperator.BITWISE_AND
-    elif op[0] == lexer.BITWISE_XOR_OP:
-        return BinaryOperator.BITWISE_XOR
-    elif op[0] == lexer.BITWISE_OR_OP:
-        return BinaryOperator.BITWISE_OR
-    elif op[0] == lexer.LOGICAL_AND_OP:
-        return BinaryOperator.LOGICAL_AND
-    elif op[0] == lexer.LOGICAL_OR_OP:
-        return BinaryOperator.LOGICAL_OR
-    elif op[0] == lexer.EQUAL_TO_OP:
-        return BinaryOperator.EQUAL_TO
-    elif op[0] == lexer.NOT_EQUAL_TO_OP:
-        return BinaryOperator.NOT_EQUAL_TO
-    elif op[0] == lexer.LESS_THAN_OP:
-        return BinaryOperator.LESS_THAN
-    elif op[0] == lexer.LESS_THAN_OR_EQUAL_TO_OP:
-        return BinaryOperator.LESS_THAN_OR_EQUAL
-    elif op[0] == lexer.GREATER_THAN_OP:
-        return BinaryOperator.GREATER_THAN
-    elif op[0] == lexer.GREATER_THAN_OR_EQUAL_TO_OP:
-        return BinaryOperator.GREATER_THAN_OR_EQUAL_TO
-    else:
-        raise SyntaxError(f"Unexpected operator: {op}")
+# Suspended states of parse_expression, kept on an explicit stack so that long operator
+# chains and deep nesting do not recurse. Each entry also records the minimum precedence
+# of the expression it belongs to.
+PENDING_PREFIX = 0        # (PENDING_PREFIX, operator)
+PENDING_PAREN = 1         # (PENDING_PAREN, min_precedence)
+PENDING_BINARY = 2        # (PENDING_BINARY, operator, left, min_precedence)
+PENDING_ASSIGNMENT = 3    # (PENDING_ASSIGNMENT, operator or None for '=', left, min_precedence)
+PENDING_MIDDLE = 4        # (PENDING_MIDDLE, condition, min_precedence)
+PENDING_CONDITIONAL = 5   # (PENDING_CONDITIONAL, condition, middle, min_precedence)
 
 
-def pop(tokens):
-    if not tokens:
-        raise SyntaxError("Unexpected end of input")
-    return tokens.pop(0)
-
-
-def peek(tokens, n=0):
-    if n >= len(tokens):
-        raise SyntaxError("Unexpected end of input")
-    return tokens[n]
-
+def parse_expression(tokens, min_precedence=0):
+    nodes = tokens.nodes
+    peek_type = tokens.peek_type
+    pop = tokens.pop
+    rules = token_table
+    stack = []
+    while True:
+        # Operand: prefix operators, then a constant, variable or parenthesised expression.
+        next_type = peek_type()
+        rule = rules.get(next_type, NO_RULE)
+        while rule.prefix is not None:
+            pop()
+            stack.append((PENDING_PREFIX, rule.prefix))
+            next_type = peek_type()
+            rule = rules.get(next_type, NO_RULE)
+        if next_type == lexer.OPEN_PAREN:
+            pop()
+            stack.append((PENDING_PAREN, min_precedence))
+            min_precedence = 0
+            continue
+        if next_type == lexer.CONSTANT:
+            left = nodes.Constant(pop()[1])
+        else:
+            left = nodes.Var(tokens.expect(lexer.IDENTIFIER)[1])
+        left, rule = finish_operand(tokens, left, stack)
+
+        # Operators: either suspend the current level to parse a right operand, or close it
+        # and combine the result with the level below.
+        while True:
+            if rule.precedence >= min_precedence:
+                pop()
+                if rule.infix == INFIX_BINARY:
+                    stack.append((PENDING_BINARY, rule.binary, left, min_precedence))
+                    min_precedence = rule.right_precedence
+                elif rule.infix == INFIX_ASSIGNMENT:
+                    stack.append((PENDING_ASSIGNMENT, rule.binary, left, min_precedence))
+                    min_precedence = rule.right_precedence
+                else:
+                    stack.append((PENDING_MIDDLE, left, min_precedence))
+                    min_precedence = 0
+                break
+
+            if not stack:
+                return left
+            pending = stack.pop()
+            kind = pending[0]
+            if kind == PENDING_BINARY:
+                _, operator, previous, min_precedence = pending
+                left = nodes.Binary(operator, previous, left)
+            elif kind == PENDING_ASSIGNMENT:
+                _, operator, previous, min_precedence = pending
+                if operator is not None:
+                    # Passes rename variables in place, so the operand gets its own node.
+                    operand = nodes.Var(previous.identifier) if isinstance(previous, Var) else previous
+                    left = nodes.Binary(operator, operand, left)
+                left = nodes.Assignment(previous, left)
+            elif kind == PENDING_CONDITIONAL:
+                _, condition, middle, min_precedence = pending
+                left = nodes.Conditional(condition, middle, left)
+            elif kind == PENDING_MIDDLE:
+                _, condition, min_precedence = pending
+                tokens.expect(lexer.COLON)
+                stack.append((PENDING_CONDITIONAL, condition, left, min_precedence))
+                min_precedence = rules[lexer.TERNARY_OP].right_precedence
+                break
+            else:
+                min_precedence = pending[1]
+                tokens.expect(lexer.CLOSE_PAREN)
+                left, rule = finish_operand(tokens, left, stack)
+
+
+def finish_operand(tokens, operand, stack):
+    # Returns the operand and the rule for the token after it.
+    nodes = tokens.nodes
+    # Postfix operators bind tighter than the prefix operators waiting on the stack.
+    rule = token_table.get(tokens.peek_type(), NO_RULE)
+    while rule.postfix is not None:
+        tokens.pop()
+        operand = nodes.Unary(rule.postfix, operand)
+        rule = token_table.get(tokens.peek_type(), NO_RULE)
+    while stack and stack[-1][0] == PENDING_PREFIX:
+        operand = nodes.Unary(stack.pop()[1], operand)
+    return operand, rule
+
+
+# Everything the parser dispatches on, looked up once per token type:
+#   statement         parses a statement starting with the token
+#   infix             INFIX_BINARY, INFIX_ASSIGNMENT or INFIX_CONDITIONAL for infix operators
+#   precedence        binding power of an infix operator, -1 for other tokens
+#   associativity     LEFT or RIGHT
+#   right_precedence  minimum precedence of the right operand, following associativity
+#   binary            the BinaryOperator of a binary or compound assignment operator
+#   prefix, postfix   the UnaryOperator of the token as a prefix or postfix operator
+TokenRule = namedtuple('TokenRule', 'statement infix precedence associativity right_precedence binary prefix postfix')
+
+INFIX_BINARY, INFIX_ASSIGNMENT, INFIX_CONDITIONAL = range(1, 4)
+LEFT, RIGHT = 'left', 'right'
+
+NO_RULE = TokenRule(parse_expression_statement, None, -1, None, None, None, None, None)
+
+
+def infix(kind, precedence, associativity, binary=None):
+    right_precedence = precedence + 1 if associativity == LEFT else precedence
+    return {'infix': kind, 'precedence': precedence, 'associativity': associativity,
+            'right_precedence': right_precedence, 'binary': binary}
+
+
+token_rules = {
+    lexer.RETURN: {'statement': parse_return},
+    lexer.IF: {'statement': parse_if},
+    lexer.GOTO: {'statement': parse_goto},
+    lexer.BREAK: {'statement': parse_break},
+    lexer.CONTINUE: {'statement': parse_continue},
+    lexer.WHILE: {'statement': parse_while},
+    lexer.DO: {'statement': parse_do},
+    lexer.FOR: {'statement': parse_for},
+    lexer.SWITCH: {'statement': parse_switch},
+    lexer.CASE: {'statement': parse_case_label},
+    lexer.DEFAULT: {'statement': parse_default_label},
+    lexer.OPEN_BRACE: {'statement': parse_compound},
+    lexer.SEMICOLON: {'statement': parse_null},
+    lexer.IDENTIFIER: {'statement': parse_identifier_statement},
+
+    lexer.MULTIPLICATION_OP: infix(INFIX_BINARY, 50, LEFT, BinaryOperator.MULTIPLY),
+    lexer.DIVISION_OP: infix(INFIX_BINARY, 50, LEFT, BinaryOperator.DIVIDE),
+    lexer.MODULO_OP: infix(INFIX_BINARY, 50, LEFT, BinaryOperator.REMAINDER),
+    lexer.ADDITION_OP: infix(INFIX_BINARY, 45, LEFT, BinaryOperator.ADD),
+    lexer.SUBTRACTION_OP: {**infix(INFIX_BINARY, 45, LEFT, BinaryOperator.SUBTRACT), 'prefix': UnaryOperator.NEGATE},
+    lexer.BITWISE_LEFT_SHIFT_OP: infix(INFIX_BINARY, 40, LEFT, BinaryOperator.BITWISE_LEFTSHIFT),
+    lexer.BITWISE_RIGHT_SHIFT_OP: infix(INFIX_BINARY, 40, LEFT, BinaryOperator.BITWISE_RIGHTSHIFT),
+    lexer.LESS_THAN_OP: infix(INFIX_BINARY, 38, LEFT, BinaryOperator.LESS_THAN),
+    lexer.LESS_THAN_OR_EQUAL_TO_OP: infix(INFIX_BINARY, 38, LEFT, BinaryOperator.LESS_THAN_OR_EQUAL),
+    lexer.GREATER_THAN_OP: infix(INFIX_BINARY, 38, LEFT, BinaryOperator.GREATER_THAN),
+    lexer.GREATER_THAN_OR_EQUAL_TO_OP: infix(INFIX_BINARY, 38, LEFT, BinaryOperator.GREATER_THAN_OR_EQUAL_TO),
+    lexer.EQUAL_TO_OP: infix(INFIX_BINARY, 37, LEFT, BinaryOperator.EQUAL_TO),
+    lexer.NOT_EQUAL_TO_OP: infix(INFIX_BINARY, 37, LEFT, BinaryOperator.NOT_EQUAL_TO),
+    lexer.BITWISE_AND_OP: infix(INFIX_BINARY, 30, LEFT, BinaryOperator.BITWISE_AND),
+    lexer.BITWISE_XOR_OP: infix(INFIX_BINARY, 25, LEFT, BinaryOperator.BITWISE_XOR),
+    lexer.BITWISE_OR_OP: infix(INFIX_BINARY, 20, LEFT, BinaryOperator.BITWISE_OR),
+    lexer.LOGICAL_AND_OP: infix(INFIX_BINARY, 15, LEFT, BinaryOperator.LOGICAL_AND),
+    lexer.LOGICAL_OR_OP: infix(INFIX_BINARY, 10, LEFT, BinaryOperator.LOGICAL_OR),
+    lexer.TERNARY_OP: infix(INFIX_CONDITIONAL, 3, RIGHT),
+    lexer.ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT),
+    lexer.ADDITION_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.ADD),
+    lexer.SUBTRACTION_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.SUBTRACT),
+    lexer.MULTIPLICATION_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.MULTIPLY),
+    lexer.DIVISION_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.DIVIDE),
+    lexer.REMAINDER_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.REMAINDER),
+    lexer.BITWISE_OR_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.BITWISE_OR),
+    lexer.BITWISE_AND_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.BITWISE_AND),
+    lexer.BITWISE_XOR_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.BITWISE_XOR),
+    lexer.BITWISE_LEFT_SHIFT_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.BITWISE_LEFTSHIFT),
+    lexer.BITWISE_RIGHT_SHIFT_ASSIGNMENT_OP: infix(INFIX_ASSIGNMENT, 1, RIGHT, BinaryOperator.BITWISE_RIGHTSHIFT),
+
+    lexer.BITWISE_COMPLEMENT_OP: {'prefix': UnaryOperator.COMPLEMENT},
+    lexer.LOGICAL_NOT_OP: {'prefix': UnaryOperator.NOT},
+    lexer.INCREMENT_OP: {'prefix': UnaryOperator.PRE_INCREMENT, 'postfix': UnaryOperator.POST_INCREMENT},
+    lexer.DECREMENT_OP: {'prefix': UnaryOperator.PRE_DECREMENT, 'postfix': UnaryOperator.POST_DECREMENT},
+}
 
-def expect(type_, tokens):
-    if not tokens:
-        raise SyntaxError(f"Expected {type_}, but reached end of input")
-    actual = pop(tokens)
-    if actual[0] != type_:
-        raise SyntaxError(f'Expected {type_}, got {actual}')
-    return actual
+token_table = {type_: NO_RULE._replace(**fields) for type_, fields in token_rules.items()}
+
+
+class TokenStream:
+    def __init__(self, tokens, source_map=None, symbols=None):
+        self.tokens = iter(tokens)
+        self.buffer = deque()
+        self.source_map = source_map
+        self.symbols = symbols
+        self.nodes = object_nodes
+
+    def __bool__(self):
+        return self.fill(1)
+
+    def fill(self, n):
+        buffer = self.buffer
+        while len(buffer) < n:
+            token = next(self.tokens, None)
+            if token is None:
+                return False
+            buffer.append(token)
+        return True
+
+    def pop(self):
+        if not self.buffer and not self.fill(1):
+            raise SyntaxError("Unexpected end of input")
+        return self.buffer.popleft()
+
+    def peek(self, n=0):
+        if n >= len(self.buffer) and not self.fill(n + 1):
+            raise SyntaxError("Unexpected end of input")
+        return self.buffer[n]
+
+    def peek_type(self, n=0):
+        return self.peek(n)[0]
+
+    def expect(self, type_):
+        if not self:
+            raise SyntaxError(f"Expected {type_}, but reached end of input")
+        actual = self.pop()
+        if actual[0] != type_:
+            raise self.error(f"Expected {type_}, got {actual[0]} '{self.spelling(actual)}'", actual)
+        return actual
+
+    def skim_block(self):
+        # Consumes a brace-balanced block and returns a function making a stream over it.
+        block = [self.expect(lexer.OPEN_BRACE)]
+        depth = 1
+        while depth:
+            token = self.pop()
+            if token[0] == lexer.OPEN_BRACE:
+                depth += 1
+            elif token[0] == lexer.CLOSE_BRACE:
+                depth -= 1
+            block.append(token)
+        return partial(TokenStream, block, self.source_map, self.symbols)
+
+    def spelling(self, token):
+        if token[0] == lexer.IDENTIFIER and self.symbols is not None:
+            return self.symbols.name(token[1])
+        return token[1]
+
+    def error(self, message, token):
+        if self.source_map is not None:
+            message = f'{message} at {self.source_map.describe(token[2])}'
+        return SyntaxError(message)
+
+
+class TokenCursor(TokenStream):
+    def __init__(self, buffer, source_map=None, start=0, end=None):
+        self.buffer = buffer
+        self.kinds = buffer.kinds
+        self.position = start
+        self.end = len(buffer) if end is None else end
+        self.source_map = source_map if source_map is not None else SourceMap(buffer.source)
+        self.symbols = buffer.symbols
+        self.nodes = object_nodes
+
+    def __bool__(self):
+        return self.position < self.end
+
+    def pop(self):
+        position = self.position
+        if position >= self.end:
+            raise SyntaxError("Unexpected end of input")
+        self.position = position + 1
+        return self.buffer[position]
+
+    def peek(self, n=0):
+        position = self.position + n
+        if position >= self.end:
+            raise SyntaxError("Unexpected end of input")
+        return self.buffer[position]
+
+    def peek_type(self, n=0):
+        position = self.position + n
+        if position >= self.end:
+            raise SyntaxError("Unexpected end of input")
+        return lexer.token_types[self.kinds[position]]
+
+    def skim_block(self):
+        start = self.position
+        self.expect(lexer.OPEN_BRACE)
+        kinds = self.kinds
+        position = self.position
+        end = self.end
+        depth = 1
+        while depth:
+            if position >= end:
+                raise SyntaxError("Unexpected end of input")
+            kind = kinds[position]
+            if kind == lexer.OPEN_BRACE_KIND:
+                depth += 1
+            elif kind == lexer.CLOSE_BRACE_KIND:
+                depth -= 1
+            position += 1
+        self.position = position
+        return partial(TokenCursor, self.buffer, self.source_map, start, position)
@@ -0,0 +1,226 @@
+import os
+import re
+
+import lexer
+from source import SourceMap
+
+MAX_INCLUDE_DEPTH = 200
+
+directive_pattern = re.compile(r'#\s*(\w*)\s*(.*)')
+include_pattern = re.compile(r'"([^"]+)"\s*$')
+define_pattern = re.compile(r'(\w+)(\()?\s*(.*)')
+
+
+class SourceFile:
+    def __init__(self, path, code, mtime=None):
+        self.path = path
+        self.code = code
+        self.mtime = mtime
+        self.size = len(code)
+        self.tokens = lexer.lex(code, directives=True)
+        self.guard = find_include_guard(self.tokens)
+        self.directives = {}
+        self.definitions = {}
+        self.once = any(self.directive(index) == ('pragma', 'once') for index in directive_indexes(self.tokens))
+
+    def directive(self, index):
+        directive = self.directives.get(index)
+        if directive is None:
+            directive = self.directives[index] = directive_pattern.match(self.tokens.value(index)).groups()
+        return directive
+
+
+# Lexed headers are kept for the lifetime of the process, keyed by path and validated
+# against the file's mtime. A header's include guard and #pragma once are known from the
+# cached entry, so repeated includes are skipped without touching the file.
+cache = {}
+
+statistics = {
+    'header_bytes_included': 0,
+    'header_bytes_lexed': 0,
+    'cache_hits': 0,
+    'cache_misses': 0,
+    'skipped_includes': 0,
+}
+
+
+def directive_indexes(tokens):
+    return (index for index, kind in enumerate(tokens.kinds) if kind == lexer.DIRECTIVE_KIND)
+
+
+def find_include_guard(tokens):
+    # A guarded header is #ifndef X, #define X, ..., #endif with nothing outside the #ifndef
+    # and no #else or #elif of it, which would give the header content once X is defined.
+    count = len(tokens)
+    if count < 3 or tokens.kinds[0] != lexer.DIRECTIVE_KIND or tokens.kinds[1] != lexer.DIRECTIVE_KIND:
+        return None
+    name, argument = directive_pattern.match(tokens.value(0)).groups()
+    if name != 'ifndef':
+        return None
+    guard = argument.split()[0] if argument else None
+    name, argument = directive_pattern.match(tokens.value(1)).groups()
+    if name != 'define' or not argument or argument.split()[0] != guard:
+        return None
+    depth = 0
+    for index in directive_indexes(tokens):
+        name, _ = directive_pattern.match(tokens.value(index)).groups()
+        if name in {'ifdef', 'ifndef', 'if'}:
+            depth += 1
+        elif name in {'else', 'elif'}:
+            if depth == 1:
+                return None
+        elif name == 'endif':
+            depth -= 1
+            if depth == 0:
+                return guard if index == count - 1 else None
+    return None
+
+
+class Preprocessor:
+    def __init__(self, include_dirs=(), macros=None, use_cache=True, symbols=None):
+        self.include_dirs = list(include_dirs)
+        self.symbols = symbols
+        self.macros = {}
+        self.included = set()
+        self.depth = 0
+        self.use_cache = use_cache
+        for name, value in (macros or {}).items():
+            self.macros[name] = [token[:2] for token in lexer.tokenize(value)]
+
+    def preprocess(self, code, path='<input>'):
+        return self.expand(SourceFile(path, code), None)
+
+    def expand(self, source, site):
+        tokens = source.tokens
+        kinds = tokens.kinds
+        macros = self.macros
+        # Each entry is (enclosing region active, condition, #else seen).
+        conditions = []
+        active = True
+        for index in range(len(tokens)):
+            kind = kinds[index]
+            if kind == lexer.DIRECTIVE_KIND:
+                name, argument = source.directive(index)
+                if name in {'ifdef', 'ifndef'}:
+                    defined = self.macro_name(argument, source, index) in macros
+                    condition = defined if name == 'ifdef' else not defined
+                    conditions.append((active, condition, False))
+                    active = active and condition
+                elif name == 'else':
+                    if not conditions or conditions[-1][2]:
+                        raise error('#else without #ifdef', source, index)
+                    enclosing, condition, _ = conditions[-1]
+                    conditions[-1] = (enclosing, condition, True)
+                    active = enclosing and not condition
+                elif name == 'endif':
+                    if not conditions:
+                        raise error('#endif without #ifdef', source, index)
+                    active = conditions.pop()[0]
+                elif name in {'if', 'elif'}:
+                    raise error(f'#{name} is not supported', source, index)
+                elif not active:
+                    continue
+                elif name == 'define':
+                    self.define(argument, source, index)
+                elif name == 'undef':
+                    macros.pop(self.macro_name(argument, source, index), None)
+                elif name == 'include':
+                    yield from self.include(argument, source, index, site)
+                elif name == 'error':
+                    raise error(f'#error {argument}', source, index)
+                elif name not in {'', 'pragma'}:
+                    raise error(f'Unknown directive #{name}', source, index)
+            elif active:
+                type_ = lexer.token_types[kind]
+                value = tokens.value(index)
+                start, end = site or (tokens.starts[index], tokens.ends[index])
+                if kind != lexer.IDENTIFIER_KIND:
+                    yield type_, value, start, end
+                elif value in macros:
+                    yield from self.expand_macro(value, start, end, frozenset())
+                else:
+                    yield type_, self.identifier(value), start, end
+        if conditions:
+            raise SyntaxError(f'Unterminated #ifdef in {source.path}')
+
+    def expand_macro(self, name, start, end, hidden):
+        hidden = hidden | {name}
+        for type_, value in self.macros[name]:
+            if type_ != lexer.IDENTIFIER:
+                yield type_, value, start, end
+            elif value in self.macros and value not in hidden:
+                yield from self.expand_macro(value, start, end, hidden)
+            else:
+                yield type_, self.identifier(value), start, end
+
+    def identifier(self, name):
+        return name if self.symbols is None else self.symbols.intern(name)
+
+    def define(self, argument, source, index):
+        definition = source.definitions.get(index)
+        if definition is None:
+            match = define_pattern.match(argument)
+            if match is None:
+                raise error('Macro name missing in #define', source, index)
+            name, parameters, replacement = match.groups()
+            if parameters:
+                raise error(f'Function-like macro {name} is not supported', source, index)
+            definition = source.definitions[index] = name, [token[:2] for token in lexer.tokenize(replacement)]
+        self.macros[definition[0]] = definition[1]
+
+    def macro_name(self, argument, source, index):
+        match = define_pattern.match(argument)
+        if match is None:
+            raise error('Macro name missing', source, index)
+        return match.group(1)
+
+    def include(self, argument, source, index, site):
+        match = include_pattern.match(argument)
+        if match is None:
+            raise error(f'Unsupported #include {argument}', source, index)
+        path = self.resolve(match.group(1), source, index)
+        if site is None:
+            site = (source.tokens.starts[index], source.tokens.ends[index])
+
+        header = cache.get(path) if self.use_cache else None
+        if header is not None and (header.guard in self.macros or (header.once and path in self.included)):
+            statistics['skipped_includes'] += 1
+            statistics['header_bytes_included'] += header.size
+            return
+        header = self.load(path, header)
+        statistics['header_bytes_included'] += header.size
+        if header.once and path in self.included:
+            return
+        self.included.add(path)
+
+        if self.depth >= MAX_INCLUDE_DEPTH:
+            raise error('#include nested too deeply', source, index)
+        self.depth += 1
+        yield from self.expand(header, site)
+        self.depth -= 1
+
+    def resolve(self, name, source, index):
+        directories = [os.path.dirname(source.path)] + self.include_dirs
+        for directory in directories:
+            path = os.path.normpath(os.path.join(directory, name))
+            if os.path.isfile(path):
+                return path
+        raise error(f'Cannot find include file "{name}"', source, index)
+
+    def load(self, path, header):
+        mtime = os.stat(path).st_mtime_ns
+        if header is not None and header.mtime == mtime:
+            statistics['cache_hits'] += 1
+            return header
+        statistics['cache_misses'] += 1
+        with open(path, 'r') as file:
+            header = SourceFile(path, file.read(), mtime)
+        statistics['header_bytes_lexed'] += header.size
+        if self.use_cache:
+            cache[path] = header
+        return header
+
+
+def error(message, source, index):
+    location = SourceMap(source.code).describe(source.tokens.starts[index])
+    return SyntaxError(f'{message} in {source.path} at {location}')
@@ -39,7 +39,7 @@ def run_invalid_tests(test_type):
     print(f"Total: {total_count}\n")
     return success_count, failure_count, total_count
 
-def run_valid_tests():
+def run_valid_tests(flags=''):
     with open('tests/valid/expected_results.json', 'r') as file:
         data = json.load(file)
         success_count = 0
@@ -51,7 +51,7 @@ def run_valid_tests():
             expected_return_code = attributes['return_code']
 
             try:
-                subprocess.run(f'./compiler.py tests/valid/{filename}.c > {filename}.s', shell=True, check=True)
+                subprocess.run(f'./compiler.py tests/valid/{filename}.c {flags} > {filename}.s', shell=True, check=True)
                 subprocess.run(f'gcc {filename}.s -o {filename}', shell=True, check=True)
                 result = subprocess.run(f'./{filename}', shell=True)
                 actual_return_code = result.returncode
@@ -70,7 +70,7 @@ def run_valid_tests():
             finally:
                 subprocess.run(f'rm -f {filename}.s {filename}', shell=True, check=True)
 
-        print(f"\nValid tests summary:")
+        print(f"\nValid tests summary{f' ({flags})' if flags else ''}:")
         print(f"Successful: {success_count}")
         print(f"Failed: {failure_count}")
         print(f"Total: {total_count}\n")
@@ -87,10 +87,13 @@ if __name__ == "__main__":
         total_failure += failure
         total_tests += total
 
-    success, failure, total = run_valid_tests()
-    total_success += success
-    total_failure += failure
-    total_tests += total
+    # The optimizations are off by default, so the valid tests run once without and once
+    # with all of them.
+    for flags in ['', '--optimize']:
+        success, failure, total = run_valid_tests(flags)
+        total_success += success
+        total_failure += failure
+        total_tests += total
 
     print("\nOverall Test Summary:")
     print(f"Successful: {total_success}")
@@ -0,0 +1,38 @@
+import mmap
+import os
+from array import array
+from bisect import bisect_right
+
+
+class SourceMap:
+    def __init__(self, code):
+        self.code = code
+        self.line_starts = None
+
+    def build(self):
+        newline = '\n' if isinstance(self.code, str) else b'\n'
+        line_starts = array('I', [0])
+        find = self.code.find
+        pos = find(newline)
+        while pos != -1:
+            line_starts.append(pos + 1)
+            pos = find(newline, pos + 1)
+        self.line_starts = line_starts
+        return line_starts
+
+    def location(self, offset):
+        line_starts = self.line_starts
+        if line_starts is None:
+            line_starts = self.build()
+        line = bisect_right(line_starts, offset)
+        return line, offset - line_starts[line - 1] + 1
+
+    def describe(self, offset):
+        line, column = self.location(offset)
+        return f'line {line}, column {column}'
+
+
+def map_file(file):
+    if os.fstat(file.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,30 @@
+class SymbolTable:
+    # Identifiers are interned once and referred to by their index from the lexer onwards.
+    # Generated names (temporaries and labels) are stored as (prefix, suffix) pairs and only
+    # formatted when they are first needed, which is normally at emission.
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol
+
+    def generate(self, prefix, suffix):
+        self.names.append((prefix, suffix))
+        return len(self.names) - 1
+
+    def derive(self, prefix, symbol):
+        return self.generate(prefix, self.name(symbol))
+
+    def name(self, symbol):
+        name = self.names[symbol]
+        if not isinstance(name, str):
+            name = self.names[symbol] = f'{name[0]}{name[1]}'
+        return name
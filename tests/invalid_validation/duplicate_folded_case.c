@@ -0,0 +1,7 @@
+int main(void) {
+    switch(2) {
+        case 2: return 0;
+        case 1 + 1: return 1; // duplicate of previous case once folded
+        default: return 2;
+    }
+}
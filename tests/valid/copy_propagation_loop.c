@@ -0,0 +1,13 @@
+int main(void) {
+    int a = 5;
+    // b = a reaches the loop from before it, but not along the back edge, where both
+    // a and b have been written since.
+    int b = a;
+    int sum = 0;
+    for (int i = 0; i < 3; i = i + 1) {
+        sum = sum + b;
+        a = a + 1;
+        b = sum * 2;
+    }
+    return sum + a;
+}
@@ -0,0 +1,6 @@
+int main(void) {
+    int zero = 0;
+    // The quotient is never used, but the division must still trap.
+    int dead = 10 / zero;
+    return 1;
+}
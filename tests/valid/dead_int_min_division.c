@@ -0,0 +1,7 @@
+int main(void) {
+    int min = -2147483647 - 1;
+    int minus_one = -1;
+    // INT_MIN / -1 overflows and traps even though the quotient is never used.
+    int dead = min / minus_one;
+    return 1;
+}
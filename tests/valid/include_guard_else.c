@@ -0,0 +1,7 @@
+int main(void) {
+    int a = 1;
+    /* The second inclusion takes the #else branch, so the header is not guarded. */
+#include "include_guard_else.h"
+#include "include_guard_else.h"
+    return a;
+}
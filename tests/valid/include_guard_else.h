@@ -0,0 +1,6 @@
+#ifndef INCLUDE_GUARD_ELSE_H
+#define INCLUDE_GUARD_ELSE_H
+a = a + 1;
+#else
+a = a * 10;
+#endif
@@ -0,0 +1,6 @@
+int main(void) {
+    int a = 1;
+#include "include_guarded.h"
+#include "include_guarded.h"
+    return a;
+}
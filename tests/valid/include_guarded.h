@@ -0,0 +1,4 @@
+#ifndef INCLUDE_GUARDED_H
+#define INCLUDE_GUARDED_H
+a = a + 1;
+#endif
@@ -0,0 +1,6 @@
+int main(void) {
+    int a = 1;
+#include "include_unguarded.h"
+#include "include_unguarded.h"
+    return a;
+}
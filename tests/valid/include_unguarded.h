@@ -0,0 +1 @@
+a = a * 3;
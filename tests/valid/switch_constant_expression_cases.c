@@ -0,0 +1,17 @@
+// case labels may be any integer constant expression
+int main(void) {
+    int a = 16;
+    int result = 0;
+    switch (a) {
+        case 1 << 3: result = 1; break;
+        case -(~15): result = 2; break;
+        case 2 * 8 - 1: result = 3; break;
+        case (1 << 4) + 0 * 7 && 0: result = 4; break;
+        case 1 ? 17 : 16: result = 5; break;
+    }
+    switch (a - 1) {
+        case 30 / 2 % 16: result = result * 10 + 6; break;
+        case 15 >> 4: result = 0; break;
+    }
+    return result;
+}
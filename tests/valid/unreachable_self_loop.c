@@ -0,0 +1,7 @@
+int main(void) {
+    int a = 3;
+    return a;
+    // Never reached: a block that only jumps to itself.
+spin:
+    goto spin;
+}
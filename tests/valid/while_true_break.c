@@ -0,0 +1,9 @@
+int main(void) {
+    int i = 0;
+    while (1) {
+        i = i + 1;
+        if (i == 10)
+            break;
+    }
+    return i;
+}
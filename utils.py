@@ -1,14 +1,30 @@
-tmp_count = 0
-label_count = 0
+from collections import Counter
 
-def make_temporary() -> str:
-    global tmp_count
-    tmp = f'tmp.{tmp_count}'
-    tmp_count += 1
-    return tmp
+from symbols import SymbolTable
 
 
-def make_label() -> str:
-    global label_count
-    label_count += 1
-    return f'label_{label_count}'
\ No newline at end of file
+class CompilationContext:
+    # Owns the symbol table and the counters that generated names are numbered from, so a
+    # translation unit gets the same names however many others the process has compiled,
+    # before it or at the same time on other threads. When counts is a Counter, the passes
+    # count the nodes each of their handlers visits in it.
+    def __init__(self, symbols: SymbolTable = None, tmp_count=0, label_count=0, counts: Counter = None):
+        self.symbols = SymbolTable() if symbols is None else symbols
+        self.tmp_count = tmp_count
+        self.label_count = label_count
+        self.unique_label_count = 0
+        self.counts = counts
+
+    def make_temporary(self) -> int:
+        tmp = self.symbols.generate('tmp.', self.tmp_count)
+        self.tmp_count += 1
+        return tmp
+
+    def make_label(self) -> int:
+        self.label_count += 1
+        return self.symbols.generate('label_', self.label_count)
+
+    def make_unique_label(self, prefix) -> int:
+        unique_label = self.symbols.generate(f"{prefix}_", self.unique_label_count)
+        self.unique_label_count += 1
+        return unique_label
@@ -1,11 +1,39 @@
 import parser
-import utils
-from typing import Dict
 from collections import namedtuple
 
-from utils import make_label
+import folding
+from utils import CompilationContext
+from visitor import Visitor
 
-Variable = namedtuple('Variable', 'name from_current_block')
+# A binding of a source name to its unique name. shadowed is the binding of the same name
+# in an enclosing scope, so leaving a scope only has to restore what it declared.
+Variable = namedtuple('Variable', 'name depth shadowed')
+
+
+class ScopeChain:
+    def __init__(self):
+        self.bindings = {}
+        self.declared = [[]]
+
+    def enter(self):
+        self.declared.append([])
+
+    def exit(self):
+        bindings = self.bindings
+        for name in self.declared.pop():
+            shadowed = bindings[name].shadowed
+            if shadowed is None:
+                del bindings[name]
+            else:
+                bindings[name] = shadowed
+
+    def in_current_scope(self, name):
+        variable = self.bindings.get(name)
+        return variable is not None and variable.depth == len(self.declared)
+
+    def declare(self, name, unique_name):
+        self.bindings[name] = Variable(unique_name, len(self.declared), self.bindings.get(name))
+        self.declared[-1].append(name)
 
 
 inc_dec_operators = {parser.UnaryOperator.PRE_INCREMENT,
@@ -14,258 +42,212 @@ inc_dec_operators = {parser.UnaryOperator.PRE_INCREMENT,
                      parser.UnaryOperator.POST_DECREMENT}
 
 
-def run(ast_program: parser.Program):
-    variable_map = {}
-    variable_resolution(ast_program, variable_map)
-    loop_labeling(ast_program)
-
-
-def variable_resolution(ast_program: parser.Program, variable_map: Dict):
-    for function in ast_program.functions:
-        process_function(function, variable_map)
-
-
-def process_function(function: parser.Function, variable_map: Dict):
-    labels = {}
-    function.block = resolve_block(function.block, variable_map, labels)
-    for key in labels:
-        if not labels[key]:
-            raise SyntaxError(f'Use of undeclared label \'{key}\'')
-
-
-def resolve_declaration(declaration: parser.VarDecl, variable_map: Dict):
-    if declaration.name in variable_map and variable_map[declaration.name].from_current_block:
-        raise SyntaxError(f'Variable {declaration.name} already defined in current scope')
-    unique_name = utils.make_temporary()
-    variable_map[declaration.name] = Variable(unique_name, True)
-    init = None
-    if declaration.init is not None:
-        init = resolve_exp(declaration.init, variable_map)
-    return parser.VarDecl(unique_name, init)
-
-
-def resolve_statement(statement: parser.Statement, variable_map: Dict, labels: Dict):
-    if isinstance(statement, parser.Return):
-        return parser.Return(resolve_exp(statement.exp, variable_map))
-    elif isinstance(statement, parser.If):
-        return parser.If(resolve_exp(statement.condition, variable_map),
-                         resolve_statement(statement.then, variable_map, labels),
-                         resolve_statement(statement.else_, variable_map, labels))
-    elif isinstance(statement, parser.Expression):
-        return resolve_exp(statement, variable_map)
-    elif isinstance(statement, parser.Goto):
-        if statement.label not in labels:
-            labels[statement.label] = False
-        return statement
-    elif isinstance(statement, parser.While):
-        return parser.While(resolve_exp(statement.condition, variable_map),
-                            resolve_statement(statement.body, variable_map, labels))
-    elif isinstance(statement, parser.DoWhile):
-        return parser.DoWhile(resolve_exp(statement.condition, variable_map),
-                              resolve_statement(statement.body, variable_map, labels))
-    elif isinstance(statement, parser.For):
-        return resolve_for_statement(statement, variable_map, labels)
-    elif isinstance(statement, parser.Label):
-        if statement.label in labels and labels[statement.label] == True:
-            raise SyntaxError(f'Redefinition of label \'{statement.label}\'')
-        labels[statement.label] = True
-        return parser.Label(statement.label, resolve_statement(statement.statement, variable_map, labels))
-    elif isinstance(statement, parser.Compound):
-        return resolve_compound(statement, variable_map, labels)
-    elif isinstance(statement, parser.Switch):
-        return parser.Switch(resolve_exp(statement.expr, variable_map),
-                             resolve_statement(statement.body, variable_map, labels))
-    elif isinstance(statement, parser.Default):
-        return parser.Default(resolve_statement(statement.statement, variable_map, labels))
-    elif isinstance(statement, parser.Case):
-        return parser.Case(resolve_exp(statement.const, variable_map),
-                           resolve_statement(statement.statement, variable_map, labels))
-    else:
-        return statement
-
-
-def resolve_for_statement(statement: parser.For, variable_map: Dict, labels: Dict):
-    new_variable_map = copy_variable_map(variable_map)
-    for_init = resolve_for_init(statement.for_init, new_variable_map, labels)
-    cond = None
-    if statement.condition is not None:
-        cond = resolve_exp(statement.condition, new_variable_map)
-    post = None
-    if statement.post is not None:
-        post = resolve_exp(statement.post, new_variable_map)
-    body = resolve_statement(statement.body, new_variable_map, labels)
-    return parser.For(for_init, cond, post, body)
-
-
-def resolve_for_init(for_init: parser.ForInit, variable_map: Dict, labels: Dict):
-    if for_init is None:
-        return None
-    elif isinstance(for_init, parser.InitExpression):
-        return parser.InitExpression(resolve_exp(for_init.expression, variable_map))
-    elif isinstance(for_init, parser.InitDeclaration):
-        return parser.InitDeclaration(resolve_declaration(for_init.declaration, variable_map))
-    else:
-        raise SyntaxError(f'Undeclared init expression \'{for_init}\'')
-
-
-def resolve_compound(statement: parser.Compound, variable_map: Dict, labels: Dict):
-    new_variable_map = copy_variable_map(variable_map)
-    block = resolve_block(statement.block, new_variable_map, labels)
-    return parser.Compound(block)
-
-
-def copy_variable_map(variable_map: Dict):
-    new_variable_map = {}
-    for key in variable_map:
-        new_variable_map[key] = Variable(variable_map[key].name, False)
-    return new_variable_map
-
-
-def resolve_block(statement: parser.Block, variable_map: Dict, labels: Dict):
-    block_items = []
-    for item in statement.block_items:
-        if isinstance(item, parser.VarDecl):
-            block_items.append(resolve_declaration(item, variable_map))
-        elif isinstance(item, parser.Statement):
-            block_items.append(resolve_statement(item, variable_map, labels))
-    return parser.Block(block_items)
-
-
-def resolve_exp(exp: parser.Expression, variable_map: Dict):
-    if isinstance(exp, parser.Assignment):
+class Validator(Visitor):
+    # Resolves variables, checks labels and labels loops and switches in one walk over a
+    # program. Variables resolve through scopes, which every function shares; labels,
+    # loop_label, switch_label, has_default and cases belong to the function or switch
+    # being walked.
+    def __init__(self, compilation: CompilationContext):
+        super().__init__(compilation.counts)
+        self.compilation = compilation
+        self.symbols = compilation.symbols
+        self.scopes = ScopeChain()
+        self.labels = {}
+        self.loop_label = None
+        self.switch_label = None
+        self.has_default = False
+        self.cases = set()
+        self.error = None
+        self.statements = self.handlers('validate_')
+        self.expressions = self.handlers('resolve_')
+
+    def run(self, ast_program: parser.Program):
+        for function in ast_program.functions:
+            self.process_function(function)
+        # Loop labeling used to be a second pass, so its errors only count once the whole
+        # program has resolved.
+        if self.error is not None:
+            raise self.error
+
+    def labeling_error(self, message: str):
+        if self.error is None:
+            self.error = SyntaxError(message)
+
+    def process_function(self, function: parser.Function):
+        labels = self.labels = {}
+        self.process_block(function.block)
+        for key in labels:
+            if not labels[key]:
+                raise SyntaxError(f'Use of undeclared label \'{self.symbols.name(key)}\'')
+
+    def process_block(self, block: parser.Block):
+        statements = self.statements
+        for item in block.block_items:
+            statements[type(item)](self, item)
+
+    def process_statement(self, statement: parser.Statement):
+        self.statements[type(statement)](self, statement)
+
+    def resolve(self, exp: parser.Expression):
+        # resolve_* handlers dispatch on their operands directly instead of calling this, so
+        # that each level of an expression costs one Python frame.
+        self.expressions[type(exp)](self, exp)
+
+    def validate_VarDecl(self, declaration: parser.VarDecl):
+        scopes = self.scopes
+        if scopes.in_current_scope(declaration.name):
+            raise SyntaxError(f'Variable {self.symbols.name(declaration.name)} already defined in current scope')
+        unique_name = self.compilation.make_temporary()
+        scopes.declare(declaration.name, unique_name)
+        declaration.name = unique_name
+        if declaration.init is not None:
+            self.resolve(declaration.init)
+
+    def validate_Return(self, statement: parser.Return):
+        self.resolve(statement.exp)
+
+    def validate_If(self, statement: parser.If):
+        self.resolve(statement.condition)
+        self.process_statement(statement.then)
+        self.process_statement(statement.else_)
+
+    def validate_Expression(self, statement: parser.Expression):
+        self.resolve(statement)
+
+    def validate_Goto(self, statement: parser.Goto):
+        if statement.label not in self.labels:
+            self.labels[statement.label] = False
+
+    def validate_While(self, statement: parser.While):
+        self.resolve(statement.condition)
+        self.process_loop(statement)
+
+    validate_DoWhile = validate_While
+
+    def validate_For(self, statement: parser.For):
+        scopes = self.scopes
+        scopes.enter()
+        self.resolve_for_init(statement.for_init)
+        if statement.condition is not None:
+            self.resolve(statement.condition)
+        if statement.post is not None:
+            self.resolve(statement.post)
+        self.process_loop(statement)
+        scopes.exit()
+
+    def validate_Label(self, statement: parser.Label):
+        if statement.label in self.labels and self.labels[statement.label] == True:
+            raise SyntaxError(f'Redefinition of label \'{self.symbols.name(statement.label)}\'')
+        self.labels[statement.label] = True
+        self.process_statement(statement.statement)
+
+    def validate_Compound(self, statement: parser.Compound):
+        self.scopes.enter()
+        self.process_block(statement.block)
+        self.scopes.exit()
+
+    def validate_Switch(self, statement: parser.Switch):
+        self.resolve(statement.expr)
+        old_switch_label = self.switch_label
+        old_has_default = self.has_default
+        old_cases = self.cases
+        statement.label = self.switch_label = self.compilation.make_label()
+        self.has_default = False
+        self.cases = set()
+        self.process_statement(statement.body)
+        self.switch_label = old_switch_label
+        self.has_default = old_has_default
+        self.cases = old_cases
+
+    def validate_Default(self, statement: parser.Default):
+        if self.switch_label is None:
+            self.labeling_error("Default statement not within switch!")
+        elif self.has_default:
+            self.labeling_error("Multiple default labels in one switch!")
+        self.has_default = True
+        self.process_statement(statement.statement)
+
+    def validate_Case(self, statement: parser.Case):
+        self.resolve(statement.const)
+        value = folding.constant_value(statement.const)
+        if value is None:
+            raise SyntaxError("Case label must be constant")
+        if not isinstance(statement.const, parser.Constant):
+            statement.const = parser.Constant(str(value))
+        if self.switch_label is None:
+            self.labeling_error("Case statement not within switch!")
+        self.process_statement(statement.statement)
+        if value in self.cases:
+            self.labeling_error(f'Duplicate case value {value}')
+        self.cases.add(value)
+
+    def validate_Break(self, statement: parser.Break):
+        if self.switch_label is not None:
+            statement.label = self.switch_label
+        elif self.loop_label is not None:
+            statement.label = self.loop_label
+        else:
+            self.labeling_error("Break statement not within loop or switch!")
+
+    def validate_Continue(self, statement: parser.Continue):
+        if self.loop_label is not None:
+            statement.label = self.loop_label
+        else:
+            self.labeling_error("Continue statement not within loop!")
+
+    def validate_generic(self, statement):
+        # Null statements, and the missing else branch of an if.
+        pass
+
+    def process_loop(self, statement: parser.Statement):
+        old_loop_label = self.loop_label
+        statement.label = self.loop_label = self.compilation.make_label()
+        self.process_statement(statement.body)
+        self.loop_label = old_loop_label
+
+    def resolve_for_init(self, for_init: parser.ForInit):
+        if for_init is None:
+            return
+        elif isinstance(for_init, parser.InitExpression):
+            self.resolve(for_init.expression)
+        elif isinstance(for_init, parser.InitDeclaration):
+            self.validate_VarDecl(for_init.declaration)
+        else:
+            raise SyntaxError(f'Undeclared init expression \'{for_init}\'')
+
+    def resolve_Assignment(self, exp: parser.Assignment):
         if not isinstance(exp.left, parser.Var):
             raise SyntaxError("Invalid lvalue!")
-        return parser.Assignment(resolve_exp(exp.left, variable_map),
-                                 resolve_exp(exp.right, variable_map))
-    elif isinstance(exp, parser.Var):
-        if exp.identifier in variable_map:
-            return parser.Var(variable_map[exp.identifier].name)
-        else:
+        self.expressions[type(exp.left)](self, exp.left)
+        self.expressions[type(exp.right)](self, exp.right)
+
+    def resolve_Var(self, exp: parser.Var):
+        variable = self.scopes.bindings.get(exp.identifier)
+        if variable is None:
             raise SyntaxError("Undeclared variable!")
-    elif isinstance(exp, parser.Unary):
+        exp.identifier = variable.name
+
+    def resolve_Unary(self, exp: parser.Unary):
         if exp.operator in inc_dec_operators:
             if not isinstance(exp.inner, parser.Var):
                 raise SyntaxError("Invalid lvalue!")
-        return parser.Unary(exp.operator, resolve_exp(exp.inner, variable_map))
-    elif isinstance(exp, parser.Binary):
-        return parser.Binary(exp.operator,
-                             resolve_exp(exp.left, variable_map),
-                             resolve_exp(exp.right, variable_map))
-    elif isinstance(exp, parser.Constant):
-        return parser.Constant(exp.value)
-    elif isinstance(exp, parser.Conditional):
-        return parser.Conditional(resolve_exp(exp.condition, variable_map),
-                                  resolve_exp(exp.then, variable_map),
-                                  resolve_exp(exp.else_, variable_map))
-    else:
-        raise SyntaxError("Invalid expression!")
+        self.expressions[type(exp.inner)](self, exp.inner)
 
+    def resolve_Binary(self, exp: parser.Binary):
+        self.expressions[type(exp.left)](self, exp.left)
+        self.expressions[type(exp.right)](self, exp.right)
 
-def loop_labeling(ast_program: parser.Program):
-    for function in ast_program.functions:
-        ll_process_function(function)
-
-
-def ll_process_function(function: parser.Function):
-    context = {'loop_label': '', 'switch_label': '', 'has_default': False, 'cases': []}
-    function.block = ll_process_block(function.block, context)
-
-
-def ll_process_block(block: parser.Block, context):
-    block_items = []
-    for item in block.block_items:
-        if isinstance(item, parser.VarDecl):
-            block_items.append(item)
-        elif isinstance(item, parser.Statement):
-            block_items.append(ll_process_statement(item, context))
-    return parser.Block(block_items)
-
-
-def ll_process_statement(statement: parser.Statement, context):
-    if isinstance(statement, parser.Switch):
-        old_switch_label = context.get('switch_label', '')
-        old_has_default = context.get('has_default', False)
-        old_cases = context.get('cases', [])
-        new_switch_label = make_label()
-        context['switch_label'] = new_switch_label
-        context['has_default'] = False
-        context['cases'] = []
-        body = ll_process_statement(statement.body, context)
-        context['switch_label'] = old_switch_label
-        context['has_default'] = old_has_default
-        context['cases'] = old_cases
-        return parser.Switch(statement.expr, body, new_switch_label)
-    elif isinstance(statement, parser.Default):
-        if context.get('switch_label', '') == '':
-            raise SyntaxError("Default statement not within switch!")
-        if context['has_default']:
-            raise SyntaxError("Multiple default labels in one switch!")
-        context['has_default'] = True
-        body = ll_process_statement(statement.statement, context)
-        return parser.Default(body)
-    elif isinstance(statement, parser.Case):
-        if context.get('switch_label', '') == '':
-            raise SyntaxError("Case statement not within switch!")
-        body = ll_process_statement(statement.statement, context)
-        if statement.const in context['cases']:
-            raise SyntaxError(f'Duplicate case value {statement.const}')
-        context['cases'].append(statement.const)
-        return parser.Case(statement.const, body)
-    elif isinstance(statement, parser.If):
-        then = ll_process_statement(statement.then, context)
-        else_ = ll_process_statement(statement.else_, context)
-        return parser.If(statement.condition, then, else_)
-    elif isinstance(statement, parser.While):
-        old_loop_label = context.get('loop_label', '')
-        new_loop_label = make_label()
-        context['loop_label'] = new_loop_label
-        body = ll_process_statement(statement.body, context)
-        context['loop_label'] = old_loop_label
-        return parser.While(statement.condition, body, new_loop_label)
-    elif isinstance(statement, parser.DoWhile):
-        old_loop_label = context.get('loop_label', '')
-        new_loop_label = make_label()
-        context['loop_label'] = new_loop_label
-        body = ll_process_statement(statement.body, context)
-        context['loop_label'] = old_loop_label
-        return parser.DoWhile(statement.condition, body, new_loop_label)
-    elif isinstance(statement, parser.For):
-        old_loop_label = context.get('loop_label', '')
-        new_loop_label = make_label()
-        context['loop_label'] = new_loop_label
-        body = ll_process_statement(statement.body, context)
-        context['loop_label'] = old_loop_label
-        return parser.For(statement.for_init, statement.condition, statement.post, body, new_loop_label)
-    elif isinstance(statement, parser.Break):
-        if context.get('switch_label', '') != '':
-            statement.label = context['switch_label']
-            return statement
-        elif context.get('loop_label', '') != '':
-            statement.label = context['loop_label']
-            return statement
-        else:
-            raise SyntaxError("Break statement not within loop or switch!")
-    elif isinstance(statement, parser.Continue):
-        if context.get('loop_label', '') != '':
-            statement.label = context['loop_label']
-            return statement
-        else:
-            raise SyntaxError("Continue statement not within loop!")
-    elif isinstance(statement, parser.Label):
-        body = ll_process_statement(statement.statement, context)
-        return parser.Label(statement.label, body)
-    elif isinstance(statement, parser.Compound):
-        body = ll_process_block(statement.block, context)
-        return parser.Compound(body)    
-    else:
-        return statement
+    def resolve_Constant(self, exp: parser.Constant):
+        pass
 
+    def resolve_Conditional(self, exp: parser.Conditional):
+        self.expressions[type(exp.condition)](self, exp.condition)
+        self.expressions[type(exp.then)](self, exp.then)
+        self.expressions[type(exp.else_)](self, exp.else_)
 
-def ll_process_for_statement(statement: parser.For, loop_label: str, switch_label: str):
-    body = ll_process_statement(statement.body, loop_label, switch_label)
-    return parser.For(statement.for_init, statement.condition, statement.post, body, loop_label)
+    def resolve_generic(self, exp):
+        raise SyntaxError("Invalid expression!")
 
 
-def ll_process_compound(statement: parser.Compound, loop_label: str, switch_label: str):
-    block = ll_process_block(statement.block, loop_label, switch_label)
-    return parser.Compound(block)
+def run(ast_program: parser.Program, compilation: CompilationContext):
+    Validator(compilation).run(ast_program)
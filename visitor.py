@@ -0,0 +1,72 @@
+from collections import Counter
+
+
+class HandlerTable(dict):
+    # Maps node types to the method of visitor_type that handles them: the one named prefix
+    # followed by the name of the type, or of its nearest base class that has one, or else
+    # prefix followed by 'generic'. Each type is looked up on first use and then cached, so
+    # dispatch is a single dict lookup however many kinds of node the pass handles.
+    def __init__(self, visitor_type, prefix):
+        super().__init__()
+        self.visitor_type = visitor_type
+        self.prefix = prefix
+
+    def __missing__(self, node_type):
+        handler = self[node_type] = self.find(node_type)
+        return handler
+
+    def find(self, node_type):
+        for base in node_type.__mro__:
+            handler = getattr(self.visitor_type, self.prefix + base.__name__, None)
+            if handler is not None:
+                return handler
+        handler = getattr(self.visitor_type, self.prefix + 'generic', None)
+        if handler is None:
+            raise TypeError(f'{self.visitor_type.__name__} has no {self.prefix} handler for {node_type.__name__}')
+        return handler
+
+
+class CountingHandlerTable(HandlerTable):
+    # Like HandlerTable, but counts the calls to each handler in counts, keyed by the module
+    # of the visitor, the prefix and the name of the node type.
+    def __init__(self, visitor_type, prefix, counts: Counter):
+        super().__init__(visitor_type, prefix)
+        self.counts = counts
+
+    def find(self, node_type):
+        handler = super().find(node_type)
+        counts = self.counts
+        key = f'{self.visitor_type.__module__}.{self.prefix}{node_type.__name__}'
+
+        def counted(*args):
+            counts[key] += 1
+            return handler(*args)
+
+        return counted
+
+
+class Visitor:
+    # Base class of the passes over the AST, TACKY and assembly. A pass gets a table for each
+    # family of handlers it has with handlers(prefix) and dispatches a node with
+    # table[type(node)](self, node, ...). Tables are cached per class; counting tables are
+    # cached for the Counter of the latest compilation, which a new one replaces.
+    def __init__(self, counts: Counter = None):
+        self.counts = counts
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.handler_tables = {}
+        cls.counting_tables = {}
+
+    def handlers(self, prefix) -> HandlerTable:
+        cls = type(self)
+        counts = self.counts
+        if counts is not None:
+            table = cls.counting_tables.get(prefix)
+            if table is None or table.counts is not counts:
+                table = cls.counting_tables[prefix] = CountingHandlerTable(cls, prefix, counts)
+            return table
+        table = cls.handler_tables.get(prefix)
+        if table is None:
+            table = cls.handler_tables[prefix] = HandlerTable(cls, prefix)
+        return table